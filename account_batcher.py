@@ -0,0 +1,128 @@
+import struct
+import asyncio
+import logging
+
+from typing import Dict, List, Optional
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.responses import GetAccountInfoResp, RpcResponseContext # type: ignore
+
+MAX_ACCOUNTS_PER_REQUEST = 100
+
+# SPL token Mint: mint_authority COption<Pubkey>, supply u64, decimals u8,
+# is_initialized bool, freeze_authority COption<Pubkey>
+MINT_LAYOUT = struct.Struct('<I32sQBBI32s')
+
+class MintInfo:
+    __slots__ = ('mint_authority', 'supply', 'decimals', 'is_initialized', 'freeze_authority')
+
+    def __init__(self, mint_authority: Optional[Pubkey], supply: int, decimals: int,
+                 is_initialized: bool, freeze_authority: Optional[Pubkey]):
+        self.mint_authority = mint_authority
+        self.supply = supply
+        self.decimals = decimals
+        self.is_initialized = is_initialized
+        self.freeze_authority = freeze_authority
+
+    @property
+    def supply_ui(self) -> float:
+        return self.supply / 10 ** self.decimals
+
+    def __repr__(self):
+        return (f'MintInfo(supply={self.supply}, decimals={self.decimals}, '
+                f'mint_authority={self.mint_authority}, freeze_authority={self.freeze_authority})')
+
+def decode_mint(data: bytes) -> MintInfo:
+    if len(data) < MINT_LAYOUT.size:
+        raise ValueError(f'Not a mint account ({len(data)} bytes)')
+    mint_authority_option, mint_authority, supply, decimals, is_initialized, freeze_authority_option, freeze_authority = \
+        MINT_LAYOUT.unpack_from(data)
+    return MintInfo(
+        mint_authority=Pubkey.from_bytes(mint_authority) if mint_authority_option else None,
+        supply=supply,
+        decimals=decimals,
+        is_initialized=bool(is_initialized),
+        freeze_authority=Pubkey.from_bytes(freeze_authority) if freeze_authority_option else None
+    )
+
+class AccountBatcher:
+    """Collects account lookups for `window` seconds and serves them with one getMultipleAccounts call.
+
+    Lookups issued by concurrently processed pools share a request (up to 100 keys,
+    a full batch is sent straight away), and the same key requested twice in a
+    window is only fetched once.
+    """
+
+    def __init__(self,
+                 client: AsyncClient,
+                 window: float = 0.02,
+                 max_batch: int = MAX_ACCOUNTS_PER_REQUEST,
+                 commitment: Commitment = Confirmed):
+        self.client = client
+        self.window = window
+        self.max_batch = min(max_batch, MAX_ACCOUNTS_PER_REQUEST)
+        self.commitment = commitment
+        self.requests = 0
+        self.accounts = 0
+        self._pending: Dict[Pubkey, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._fetches = set()
+
+    async def get_account(self, pubkey: Pubkey) -> Optional[Account]:
+        future = self._pending.get(pubkey)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[pubkey] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    async def get_account_info(self, pubkey: Pubkey) -> GetAccountInfoResp:
+        """Same response shape as `AsyncClient.get_account_info`, so the batcher can stand in for the client."""
+        account = await self.get_account(pubkey)
+        return GetAccountInfoResp(account, RpcResponseContext(0))
+
+    async def get_mint(self, mint: Pubkey) -> Optional[MintInfo]:
+        account = await self.get_account(mint)
+        return decode_mint(account.data) if account is not None else None
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._fetch(batch))
+        self._fetches.add(task)
+        task.add_done_callback(self._fetches.discard)
+
+    async def _fetch(self, batch: Dict[Pubkey, asyncio.Future]):
+        keys: List[Pubkey] = list(batch)
+        try:
+            resp = await self.client.get_multiple_accounts(keys, commitment=self.commitment)
+            self.requests += 1
+            self.accounts += len(keys)
+            for key, account in zip(keys, resp.value):
+                if not batch[key].done():
+                    batch[key].set_result(account)
+        except Exception as e:
+            logging.warning(f'getMultipleAccounts for {len(keys)} account(s) failed: {e}')
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Waiters may have timed out already, don't warn about unread errors
+                    future.exception()
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'accounts': self.accounts,
+            'accountsPerRequest': round(self.accounts / self.requests, 1) if self.requests else 0.0
+        }
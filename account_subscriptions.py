@@ -0,0 +1,172 @@
+import ssl
+import json
+import asyncio
+import logging
+
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, ProtocolError
+from websockets.legacy.client import WebSocketClientProtocol
+from solana.rpc.commitment import Commitment, Confirmed
+from solana.rpc.websocket_api import SubscriptionError, connect
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.responses import AccountNotification, SubscriptionResult # type: ignore
+
+import metrics
+
+AccountHandler = Callable[[Pubkey, Account, int], None]
+
+class AccountSubscriptions:
+    """accountSubscribe for any number of accounts over one websocket connection.
+
+    Watchers `subscribe` an account with a handler called with (pubkey, account, slot)
+    whenever it changes, and `unsubscribe` it once done. Handlers run on the receive
+    loop, so they must not block. Requests are sent as they come without waiting for
+    confirmation and everything is subscribed again after a reconnect. RPC providers
+    cap subscriptions per connection, past `max_subscriptions` accounts `subscribe`
+    returns False. Unsubscribing leaves the connection open, the `true` the RPC
+    answers with is skipped.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 commitment: Commitment = Confirmed,
+                 max_subscriptions: int = 5000):
+        self.endpoint = endpoint
+        self.commitment = commitment
+        self.max_subscriptions = max_subscriptions
+        self.handlers: Dict[Pubkey, AccountHandler] = {}
+        self.notifications = 0
+        self.rejected = 0
+        self.reconnects = 0
+        # Accounts whose subscription is to be sent or cancelled
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        # Confirmed subscriptions both ways, and request id -> account for those not confirmed yet
+        self._ids: Dict[Pubkey, int] = {}
+        self._accounts: Dict[int, Pubkey] = {}
+        self._requests: Dict[int, Pubkey] = {}
+        self._requested: Set[Pubkey] = set()
+
+    def subscribe(self, pubkey: Pubkey, handler: AccountHandler) -> bool:
+        if pubkey not in self.handlers and len(self.handlers) >= self.max_subscriptions:
+            self.rejected += 1
+            return False
+        self.handlers[pubkey] = handler
+        self._outbox.put_nowait(pubkey)
+        return True
+
+    def unsubscribe(self, pubkey: Pubkey):
+        if self.handlers.pop(pubkey, None) is not None:
+            self._outbox.put_nowait(pubkey)
+
+    def __len__(self) -> int:
+        return len(self.handlers)
+
+    async def run(self):
+        kwargs = {'ssl': ssl.SSLContext(ssl.PROTOCOL_TLS)} if self.endpoint.startswith('wss://') else {}
+        connected_before = False
+        while True:
+            try:
+                async for websocket in connect(self.endpoint, ping_interval=None, **kwargs):
+                    if connected_before:
+                        self.reconnects += 1
+                    connected_before = True
+                    self._reset()
+                    sender = asyncio.create_task(self._send(websocket), name='account-subscriptions')
+                    try:
+                        async for msg in self._messages(websocket):
+                            for item in msg:
+                                self._receive(item)
+                    except (ProtocolError, ConnectionClosed) as err:
+                        logging.error(f'Account subscriptions on {self.endpoint}: {err}')
+                        continue
+                    except SubscriptionError as err:
+                        # Most likely the provider's subscription limit, drop that account and reconnect
+                        pubkey = self._requests.get(err.subscription.id)
+                        if pubkey is not None:
+                            self.handlers.pop(pubkey, None)
+                            self.rejected += 1
+                        logging.error(f'Account subscription to {pubkey} refused by {self.endpoint}: {err.msg}')
+                        continue
+                    finally:
+                        sender.cancel()
+                        await asyncio.gather(sender, return_exceptions=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f'Error on account subscriptions to {self.endpoint}: {e}')
+                await asyncio.sleep(1)
+
+    @staticmethod
+    async def _messages(websocket) -> AsyncIterator[List]:
+        """Parsed messages of the connection. solders can't parse the bare boolean result
+        acknowledging an unsubscribe, which would end the connection, so frames are read
+        raw and those acks dropped before parsing."""
+        while True:
+            try:
+                raw = await WebSocketClientProtocol.recv(websocket)
+            except ConnectionClosedOK:
+                return
+            if len(raw) < 128:
+                message = json.loads(raw)
+                if isinstance(message, dict) and isinstance(message.get('result'), bool):
+                    continue
+            yield websocket._process_rpc_response(raw)
+
+    def _reset(self):
+        # A new connection starts without subscriptions, queue every watched account again
+        self._ids.clear()
+        self._accounts.clear()
+        self._requests.clear()
+        self._requested.clear()
+        while not self._outbox.empty():
+            self._outbox.get_nowait()
+        for pubkey in self.handlers:
+            self._outbox.put_nowait(pubkey)
+
+    async def _send(self, websocket):
+        while True:
+            pubkey = await self._outbox.get()
+            if pubkey in self.handlers:
+                if pubkey in self._ids or pubkey in self._requested:
+                    continue
+                await websocket.account_subscribe(pubkey, self.commitment, 'base64')
+                self._requests[next(reversed(websocket.sent_subscriptions))] = pubkey
+                self._requested.add(pubkey)
+            elif pubkey in self._ids:
+                subscription = self._ids.pop(pubkey)
+                del self._accounts[subscription]
+                await websocket.account_unsubscribe(subscription)
+
+    def _receive(self, item):
+        if isinstance(item, SubscriptionResult) and item.id in self._requests:
+            pubkey = self._requests.pop(item.id)
+            self._requested.discard(pubkey)
+            self._ids[pubkey] = item.result
+            self._accounts[item.result] = pubkey
+            if pubkey not in self.handlers:
+                # Unsubscribed before the subscription was confirmed
+                self._outbox.put_nowait(pubkey)
+            return
+        if not isinstance(item, AccountNotification):
+            return
+        pubkey = self._accounts.get(item.subscription)
+        handler: Optional[AccountHandler] = self.handlers.get(pubkey) if pubkey is not None else None
+        if handler is None:
+            return
+        self.notifications += 1
+        metrics.inc('account_notifications')
+        try:
+            handler(pubkey, item.result.value, item.result.context.slot)
+        except Exception as e:
+            logging.error(f'Account handler for {pubkey} failed: {e}')
+
+    def stats(self) -> dict:
+        return {
+            'subscriptions': len(self.handlers),
+            'notifications': self.notifications,
+            'rejected': self.rejected,
+            'reconnects': self.reconnects
+        }
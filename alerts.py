@@ -0,0 +1,142 @@
+import time
+import asyncio
+import logging
+
+from typing import Dict, List, Optional, Tuple
+
+from clients import http_client
+from rate_limit import TokenBucket, send_with_retry
+import metrics
+from log_config import console
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = '\n\n〰️〰️〰️\n\n'
+
+class TelegramDispatcher:
+    """Queues Telegram alerts and sends them from a background task per chat.
+
+    Messages are POSTed as JSON bodies through the shared HTTP client, each chat
+    paced by its own token bucket (`rate` messages per second, bursts of `burst`)
+    and failures are retried with backoff, so a slow or rate-limited chat never
+    holds up pool processing. With `coalesce_window` > 0, alerts queued within
+    that many seconds of each other are sent as a single message (up to
+    `max_coalesce` of them, within Telegram's length limit).
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 bot_token: str,
+                 chat_id: str,
+                 rate: float = 1.0,
+                 burst: int = 3,
+                 coalesce_window: float = 0.0,
+                 max_coalesce: int = 5,
+                 queue_size: int = 1000,
+                 retries: int = 4):
+        self.url = f'{base_url}/bot{bot_token}/sendMessage'
+        self.chat_id = chat_id
+        self.rate = rate
+        self.burst = burst
+        self.coalesce_window = coalesce_window
+        self.max_coalesce = max_coalesce
+        self.queue_size = queue_size
+        self.retries = retries
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def enqueue(self, text: str, chat_id: Optional[str] = None) -> bool:
+        """Queue `text` for `chat_id` (the default chat if None), False if the queue is full."""
+        chat_id = str(chat_id or self.chat_id)
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue(self.queue_size)
+            self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+            self._workers[chat_id] = asyncio.create_task(self._work(chat_id, queue), name=f'telegram-{chat_id}')
+        try:
+            queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.error(f'Telegram queue for chat {chat_id} is full, dropping alert')
+            return False
+        return True
+
+    async def _next_message(self, queue: asyncio.Queue, held: Optional[str]) -> Tuple[List[str], Optional[str]]:
+        """Texts of the next message and the one held over for the message after it, `held`
+        opening this one if set."""
+        texts = [held if held is not None else await queue.get()]
+        if self.coalesce_window <= 0:
+            return texts, None
+        length = len(texts[0])
+        deadline = time.monotonic() + self.coalesce_window
+        while len(texts) < self.max_coalesce:
+            try:
+                text = await asyncio.wait_for(queue.get(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if length + len(COALESCE_SEPARATOR) + len(text) > TELEGRAM_MAX_MESSAGE_LENGTH:
+                # Doesn't fit, it opens the next message instead, ahead of anything queued after it
+                return texts, text
+            texts.append(text)
+            length += len(COALESCE_SEPARATOR) + len(text)
+        return texts, None
+
+    async def _work(self, chat_id: str, queue: asyncio.Queue):
+        held = None
+        while True:
+            texts, held = await self._next_message(queue, held)
+            try:
+                await self._send(chat_id, COALESCE_SEPARATOR.join(texts)[:TELEGRAM_MAX_MESSAGE_LENGTH], len(texts))
+            finally:
+                for _ in texts:
+                    queue.task_done()
+
+    async def _send(self, chat_id: str, text: str, count: int):
+        payload = {'chat_id': chat_id, 'text': text, 'disable_web_page_preview': True}
+        try:
+            with metrics.timer('telegram.send'):
+                res = await send_with_retry(
+                    lambda: http_client().post(self.url, json=payload),
+                    self._buckets[chat_id],
+                    retries=self.retries,
+                    name=f'Telegram sendMessage to {chat_id}'
+                )
+        except Exception as e:
+            res = None
+            error = repr(e)
+        else:
+            error = f'{res.status_code} {res.text[:200]}'
+        if res is not None and res.status_code == 200:
+            self.sent += count
+            self.coalesced += count - 1
+            metrics.inc('telegram_messages', result='sent')
+            console(f'{count} alert(s) sent to telegram for autobuy!')
+        else:
+            self.failed += count
+            metrics.inc('telegram_messages', result='failed')
+            console('Failed to send token address to telegram for autobuy!', error)
+            logging.error(f'Failed to send {count} alert(s) to telegram chat {chat_id}: {error}')
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        return {'sent': self.sent, 'failed': self.failed, 'dropped': self.dropped,
+                'coalesced': self.coalesced, 'queued': self.depth}
+
+    async def close(self, timeout: float = 10.0):
+        """Send what is still queued (for up to `timeout` seconds), then stop the workers."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f'Dropping {self.depth} unsent telegram alert(s) on shutdown')
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""Backtest filter thresholds against the recorded tokens and their outcomes.
+
+    python backtest.py [--data DIR] [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+                       [--min-fdv GRID] [--max-fdv GRID] [--min-liq GRID] [--min-mc-to-liq GRID]
+                       [--ban-words FILE] [--top N] [--sort precision|alerts|survived] [--output CSV]
+
+Tokens come from the daily token_addresses_unfiltered_*.csv files, outcomes from
+the pool index (rugged/survived, see `pool_index.py mark`) and optionally from
+--outcomes, a CSV with `address` and `outcome` columns. A GRID is a comma
+separated list of values (`0,5000,20000`) or `start:stop:count` for evenly spaced
+ones; by default each threshold is tried at --steps quantiles of the data, and
+0 (no limit). The thresholds currently set in the environment are always part of
+the grid. --ban-words adds the ban list in that file as an on/off dimension.
+
+Unfiltered rows already passed the screening rules in force when they were
+recorded, so only thresholds at least as strict as those can be evaluated.
+"""
+import os
+import re
+import sys
+import glob
+import time
+import sqlite3
+import argparse
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dotenv import load_dotenv
+from tabulate import tabulate
+
+load_dotenv()
+
+FILE_PATTERN = re.compile(r'token_addresses_unfiltered_(\d{4}-\d{2}-\d{2})\.csv$')
+COLUMNS = ['timestamp', 'address', 'symbol', 'name', 'price', 'liquidity', 'fdv']
+
+# Threshold name, environment variable, column, 'min' or 'max'
+THRESHOLDS = [
+    ('min_fdv', 'MIN_FDV', 'fdv', 'min'),
+    ('max_fdv', 'MAX_FDV', 'fdv', 'max'),
+    ('min_liq', 'MIN_LIQ', 'liquidity', 'min'),
+    ('min_mc_to_liq', 'MIN_MC_TO_LIQ', 'mc_to_liq', 'min'),
+]
+
+def load_tokens(directory: str, since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, 'token_addresses_unfiltered_*.csv'))):
+        match = FILE_PATTERN.search(path)
+        if not match or (since and match.group(1) < since) or (until and match.group(1) > until):
+            continue
+        # Files written before the columns were fixed may lack some of them
+        frames.append(pd.read_csv(path, usecols=lambda column: column in COLUMNS, dtype={'symbol': str, 'name': str}))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    tokens = pd.concat(frames, ignore_index=True).reindex(columns=COLUMNS)
+    tokens = tokens.dropna(subset=['address']).drop_duplicates('address')
+    for column in ('price', 'liquidity', 'fdv'):
+        tokens[column] = pd.to_numeric(tokens[column], errors='coerce')
+    tokens['mc_to_liq'] = tokens['fdv'] / tokens['liquidity'].where(tokens['liquidity'] > 0)
+    return tokens.reset_index(drop=True)
+
+def load_outcomes(db: Optional[str], path: Optional[str] = None) -> pd.Series:
+    """address -> 'rugged' or 'survived'."""
+    outcomes = pd.Series(dtype=object)
+    if db and os.path.isfile(db):
+        conn = sqlite3.connect(f'file:{db}?mode=ro', uri=True)
+        try:
+            rows = pd.read_sql_query('SELECT mint AS address, outcome FROM pools WHERE outcome IS NOT NULL', conn)
+        finally:
+            conn.close()
+        outcomes = rows.drop_duplicates('address', keep='last').set_index('address')['outcome']
+    if path:
+        extra = pd.read_csv(path, usecols=['address', 'outcome']).dropna()
+        outcomes = pd.concat([outcomes, extra.drop_duplicates('address', keep='last').set_index('address')['outcome']])
+        outcomes = outcomes[~outcomes.index.duplicated(keep='last')]
+    return outcomes
+
+def parse_grid(spec: Optional[str], values: np.ndarray, steps: int) -> np.ndarray:
+    if spec:
+        if ':' in spec:
+            start, stop, count = spec.split(':')
+            return np.linspace(float(start), float(stop), int(count))
+        return np.array([float(value) for value in spec.split(',')])
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return np.zeros(1)
+    return np.unique(np.concatenate(([0.0], np.quantile(values, np.linspace(0, 1, steps + 1)[1:-1]))))
+
+def threshold_masks(column: np.ndarray, grid: np.ndarray, bound: str) -> np.ndarray:
+    """(len(grid), len(column)) booleans, whether each token passes each threshold. 0 is no limit,
+    a token missing the value only passes then (like a rule on an unavailable field)."""
+    with np.errstate(invalid='ignore'):
+        passes = column[None, :] >= grid[:, None] if bound == 'min' else column[None, :] <= grid[:, None]
+    return passes | (grid[:, None] == 0)
+
+def combine(masks: List[np.ndarray]) -> np.ndarray:
+    """Masks of every combination of the given dimensions, the first one varying slowest."""
+    combined = masks[0]
+    for mask in masks[1:]:
+        combined = (combined[:, None, :] & mask[None, :, :]).reshape(-1, combined.shape[1])
+    return combined
+
+def evaluate(dimensions: List[Tuple[str, np.ndarray, np.ndarray]], survived: np.ndarray, labeled: np.ndarray) -> pd.DataFrame:
+    """Alerts, labeled alerts and survivors for every combination of `dimensions`
+    (name, values, masks). The dimensions are split in two groups whose combined masks
+    are multiplied, so tokens are only scanned once per pair of group combinations."""
+    left: List[int] = []
+    right: List[int] = []
+    sizes = [len(values) for _, values, _ in dimensions]
+    for index in sorted(range(len(dimensions)), key=lambda index: -sizes[index]):
+        group = left if np.prod([sizes[i] for i in left]) <= np.prod([sizes[i] for i in right]) else right
+        group.append(index)
+    left.sort()
+    right.sort()
+    a = combine([dimensions[i][2] for i in left]).astype(np.float32)
+    b = combine([dimensions[i][2] for i in right]).astype(np.float32).T if right else np.ones((a.shape[1], 1), np.float32)
+    alerts = a @ b
+    labeled_alerts = (a * labeled) @ b
+    survived_alerts = (a * survived) @ b
+
+    grid: Dict[str, np.ndarray] = {}
+    for group, repeat in ((left, True), (right, False)):
+        if not group:
+            continue
+        indices = np.indices([sizes[i] for i in group]).reshape(len(group), -1)
+        for i, index in zip(group, indices):
+            values = dimensions[i][1][index]
+            grid[dimensions[i][0]] = np.repeat(values, b.shape[1]) if repeat else np.tile(values, a.shape[0])
+    results = pd.DataFrame({name: grid[name] for name, _, _ in dimensions})
+    results['alerts'] = alerts.ravel().astype(np.int64)
+    results['labeled'] = labeled_alerts.ravel().astype(np.int64)
+    results['survived'] = survived_alerts.ravel().astype(np.int64)
+    results['rugged'] = results['labeled'] - results['survived']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        results['precision'] = results['survived'] / results['labeled'].where(results['labeled'] > 0)
+        results['recall'] = results['survived'] / survived.sum() if survived.sum() else np.nan
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    data = os.environ.get('UNFILTERED_DATA_PATH') or '.'
+    parser.add_argument('--data', default=data, help='directory of the unfiltered files (default: UNFILTERED_DATA_PATH)')
+    parser.add_argument('--db', default=os.environ.get('POOL_INDEX_PATH'), help='pool index path (default: POOL_INDEX_PATH or pools.db in --data)')
+    parser.add_argument('--outcomes', help='CSV of address,outcome (rugged or survived) on top of the pool index')
+    parser.add_argument('--since', help='first day, YYYY-MM-DD')
+    parser.add_argument('--until', help='last day, YYYY-MM-DD')
+    for name, env, _, _ in THRESHOLDS:
+        parser.add_argument(f'--{name.replace("_", "-")}', dest=name, help=f'{env} values to try')
+    parser.add_argument('--steps', type=int, default=10, help='quantiles tried for a threshold without a grid')
+    parser.add_argument('--ban-words', help='ban list to try on top of the thresholds')
+    parser.add_argument('--min-alerts', type=int, default=10, help='hide combinations with fewer labeled alerts')
+    parser.add_argument('--sort', choices=('precision', 'alerts', 'survived'), default='precision')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help='write every combination to this CSV')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    tokens = load_tokens(args.data, args.since, args.until)
+    if tokens.empty:
+        sys.exit(f'No token_addresses_unfiltered_*.csv files in {args.data}')
+    outcomes = load_outcomes(args.db or os.path.join(args.data, 'pools.db'), args.outcomes)
+    outcome = tokens['address'].map(outcomes)
+    labeled = outcome.isin(('rugged', 'survived')).to_numpy(np.float32)
+    survived = (outcome == 'survived').to_numpy(np.float32)
+    loaded = time.perf_counter()
+
+    dimensions = []
+    # The bot's settings, when configured here; an unset threshold is no limit
+    configured = any(os.environ.get(env) for _, env, _, _ in THRESHOLDS)
+    current = {}
+    for name, env, column, bound in THRESHOLDS:
+        values = tokens[column].to_numpy(np.float64)
+        grid = parse_grid(getattr(args, name), values, args.steps)
+        if configured:
+            current[name] = float(os.environ.get(env) or 0)
+            grid = np.unique(np.append(grid, current[name]))
+        dimensions.append((name, grid, threshold_masks(values, grid, bound)))
+    if args.ban_words:
+        from ban_words import BanWordMatcher
+        matcher = BanWordMatcher(args.ban_words)
+        banned = np.fromiter((matcher.match(symbol, name) is not None for symbol, name in
+                              zip(tokens['symbol'].fillna(''), tokens['name'].fillna(''))), dtype=bool, count=len(tokens))
+        dimensions.append(('ban_words', np.array([False, True]), np.stack([np.ones(len(tokens), dtype=bool), ~banned])))
+    results = evaluate(dimensions, survived, labeled)
+    formats = ['.6g'] * len(dimensions) + ['.0f'] * 4 + ['.3f'] * 2
+    evaluated = time.perf_counter()
+
+    print(f'{len(tokens)} tokens ({int(labeled.sum())} with an outcome, {int(survived.sum())} survived), '
+          f'{len(results)} combinations evaluated in {evaluated - loaded:.2f}s (loaded in {loaded - started:.2f}s)')
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f'Every combination written to {args.output}')
+    if current:
+        mask = np.logical_and.reduce([results[name] == value for name, value in current.items()])
+        if args.ban_words:
+            mask &= ~results['ban_words']
+        print('\nCurrent settings')
+        print(tabulate(results[mask], headers='keys', tablefmt='simple', showindex=False, floatfmt=formats))
+    best = results[results['labeled'] >= args.min_alerts].sort_values([args.sort, 'alerts'], ascending=False)
+    print(f'\nTop {args.top} by {args.sort} (at least {args.min_alerts} labeled alerts)')
+    print(tabulate(best.head(args.top), headers='keys', tablefmt='simple', showindex=False, floatfmt=formats))
+
+if __name__ == '__main__':
+    main()
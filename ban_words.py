@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import logging
+import unicodedata
+
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_BAN_WORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ban_words.txt')
+
+# Latin lookalikes used to dodge name filters ("Реpe" with a Cyrillic Р), NFKC already folds fullwidth forms
+HOMOGLYPHS = str.maketrans({
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p',
+    'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'і': 'i', 'ї': 'i', 'ј': 'j', 'ѕ': 's', 'ԁ': 'd',
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+})
+LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '$': 's', '@': 'a'})
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex matching any of `words`, factored on common prefixes so matching cost
+    depends on the input length rather than on the number of words."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        # A shorter term already matches here, longer ones sharing its prefix add nothing
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return '|'.join(re.escape(char) + build(child) for char, child in sorted(trie.items()))
+
+class BanWordMatcher:
+    """Screens token names and symbols against a ban list compiled into a single regex.
+
+    The list is read from `path` (one term per line, `re:` prefix for regular
+    expressions) and reloaded when the file changes, checked at most every
+    `reload_interval` seconds.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = DEFAULT_BAN_WORDS_FILE,
+                 words: Optional[List[str]] = None,
+                 homoglyphs: bool = True,
+                 leet: bool = False,
+                 reload_interval: float = 10.0):
+        self.path = path
+        self.homoglyphs = homoglyphs
+        self.leet = leet
+        self.reload_interval = reload_interval
+        self.checks = 0
+        self.matches = 0
+        self._mtime = None
+        # The file is first read on the first match, not at import time
+        self._last_reload_check = float('-inf')
+        self._pattern: Optional[re.Pattern] = None
+        if words is not None:
+            self.path = None
+            self.compile(words)
+
+    def normalize(self, text: str) -> str:
+        text = unicodedata.normalize('NFKC', text).casefold()
+        if self.homoglyphs:
+            text = text.translate(HOMOGLYPHS)
+        if self.leet:
+            text = text.translate(LEET)
+        return text
+
+    def compile(self, terms: Iterable[str]):
+        words, regexes = set(), []
+        for term in terms:
+            term = term.strip()
+            if not term or term.startswith('#'):
+                continue
+            if term.startswith('re:'):
+                regexes.append(f'(?:{term[3:]})')
+            else:
+                words.add(self.normalize(term))
+        parts = ([_trie_pattern(words)] if words else []) + regexes
+        try:
+            self._pattern = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+        except re.error as e:
+            logging.error(f'Invalid ban list regex ({e}), keeping the current list')
+            return
+        logging.info(f'Ban list compiled: {len(words)} word(s), {len(regexes)} regex(es)')
+
+    def reload(self):
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            logging.error(f'Ban words file {self.path} not found, keeping the current list')
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, encoding='utf-8') as file:
+            self.compile(file.read().splitlines())
+        self._mtime = mtime
+
+    def match(self, *texts: Optional[str]) -> Optional[str]:
+        """The first banned term found in any of `texts`, or None."""
+        now = time.monotonic()
+        if self.path and now - self._last_reload_check >= self.reload_interval:
+            self._last_reload_check = now
+            self.reload()
+        self.checks += 1
+        if self._pattern is None:
+            return None
+        # One pass over every text, \x00 keeps a term from matching across two of them
+        found = self._pattern.search('\x00'.join(self.normalize(text) for text in texts if text))
+        if found is None:
+            return None
+        self.matches += 1
+        return found.group(0)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Cost of a ban-word check as the ban list grows: compiled matcher vs the old per-word loop.
+
+Usage: python benchmarks/bench_ban_words.py [--sizes 36,1000,10000] [--number N]
+"""
+import os
+import sys
+import random
+import string
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ban_words import BanWordMatcher, DEFAULT_BAN_WORDS_FILE
+
+def legacy_contains(words, *texts):
+    # The old utils.contains_word_from_list loop, applied to each text
+    for text in texts:
+        text_lower = text.lower()
+        for word in words:
+            if word.lower() in text_lower:
+                return True
+    return False
+
+def random_words(n: int, rng: random.Random):
+    return [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='36,1000,10000', help='comma separated ban list sizes')
+    parser.add_argument('--number', type=int, default=5, help='passes over the sample names per measurement')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with open(DEFAULT_BAN_WORDS_FILE, encoding='utf-8') as file:
+        base_words = [line.strip() for line in file if line.strip() and not line.startswith('#')]
+    # Mostly clean names, the common case on the hot path
+    samples = [(f'{name.title()} Coin', name[:5].upper()) for name in random_words(500, rng)]
+
+    print(f'{"terms":>8} {"legacy us/check":>16} {"compiled us/check":>18}')
+    for size in (int(size) for size in args.sizes.split(',')):
+        words = (base_words + random_words(max(0, size - len(base_words)), rng))[:size]
+        matcher = BanWordMatcher(words=words, homoglyphs=True)
+        assert [legacy_contains(words, *sample) for sample in samples] == \
+            [matcher.match(*sample) is not None for sample in samples]
+
+        timings = []
+        for check in (lambda: [legacy_contains(words, *sample) for sample in samples],
+                      lambda: [matcher.match(*sample) for sample in samples]):
+            best = min(timeit.repeat(check, number=args.number, repeat=3))
+            timings.append(best / (args.number * len(samples)) * 1e6)
+        print(f'{size:>8} {timings[0]:>16.2f} {timings[1]:>18.2f}')
+
+if __name__ == '__main__':
+    main()
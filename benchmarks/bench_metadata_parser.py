@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Compare metadata_parser.parse_metadata with the old struct.unpack("B"*n) decoding.
+
+Usage: python benchmarks/bench_metadata_parser.py [--blobs DIR] [--number N]
+
+DIR holds raw metadata account blobs (*.bin), e.g. recorded get_account_info
+responses; without it a set of synthetic Metaplex accounts is generated.
+"""
+import os
+import sys
+import glob
+import struct
+import timeit
+import argparse
+
+import base58
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from metadata_parser import parse_metadata
+
+def legacy_unpack(data):
+    # Field decoding of utils.unpack_metadata_account before metadata_parser existed
+    assert(data[0] == 4)
+
+    i = 1
+    source_account = base58.b58encode(bytes(struct.unpack('<' + "B"*32, data[i:i+32])))
+    i += 32
+    mint_account = base58.b58encode(bytes(struct.unpack('<' + "B"*32, data[i:i+32])))
+    i += 32
+    name_len = struct.unpack('<I', data[i:i+4])[0]
+    i += 4
+    name = struct.unpack('<' + "B"*name_len, data[i:i+name_len])
+    i += name_len
+    symbol_len = struct.unpack('<I', data[i:i+4])[0]
+    i += 4
+    symbol = struct.unpack('<' + "B"*symbol_len, data[i:i+symbol_len])
+    i += symbol_len
+    uri_len = struct.unpack('<I', data[i:i+4])[0]
+    i += 4
+    uri = struct.unpack('<' + "B"*uri_len, data[i:i+uri_len])
+    uri = bytes(uri).decode("utf-8").strip("\x00")
+    return (source_account.decode('utf-8'), mint_account.decode('utf-8'),
+            bytes(name).decode("utf-8").strip("\x00"), bytes(symbol).decode("utf-8").strip("\x00"), uri)
+
+def synthetic_blob(n: int) -> bytes:
+    def string(value: str, size: int) -> bytes:
+        raw = value.encode()
+        return struct.pack('<I', size) + raw + b'\x00' * (size - len(raw))
+
+    blob = bytes([4]) + bytes(Pubkey.new_unique()) + bytes(Pubkey.new_unique())
+    blob += string(f'Token number {n}', 32) + string(f'TOK{n % 1000}', 10)
+    blob += string(f'https://ipfs.io/ipfs/Qm{n:044d}', 200)
+    blob += struct.pack('<H', 0)
+    blob += b'\x01' + struct.pack('<I', 1) + bytes(Pubkey.new_unique()) + b'\x01' + bytes([100])
+    blob += b'\x00\x01'      # primary_sale_happened, is_mutable
+    blob += b'\x01\xfe'      # edition_nonce
+    blob += b'\x01\x02'      # token_standard: Fungible
+    blob += b'\x00\x00\x00'  # collection, uses, collection_details
+    return blob + b'\x00' * (679 - len(blob))
+
+def load_blobs(directory):
+    if directory:
+        blobs = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.bin'))):
+            with open(path, 'rb') as file:
+                blobs.append(file.read())
+        return blobs
+    return [synthetic_blob(n) for n in range(200)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blobs', help='directory of recorded metadata account blobs (*.bin)')
+    parser.add_argument('--number', type=int, default=50, help='passes over the blob set per measurement')
+    args = parser.parse_args()
+
+    blobs = load_blobs(args.blobs)
+    if not blobs:
+        sys.exit(f'No *.bin blobs found in {args.blobs}')
+
+    # Both decoders must agree before timing them
+    for blob in blobs:
+        parsed = parse_metadata(blob)
+        assert legacy_unpack(blob) == (str(parsed.update_authority), str(parsed.mint), parsed.name, parsed.symbol, parsed.uri)
+
+    results = {}
+    for name, func in (('legacy struct.unpack', legacy_unpack), ('parse_metadata', parse_metadata)):
+        best = min(timeit.repeat(lambda: [func(blob) for blob in blobs], number=args.number, repeat=5))
+        results[name] = best / (args.number * len(blobs))
+        print(f'{name:<22} {results[name] * 1e6:8.2f} us/account')
+    print(f'speedup: {results["legacy struct.unpack"] / results["parse_metadata"]:.1f}x over {len(blobs)} accounts')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+"""Replay a recording through getTokens against local stubs and report per-stage latency and throughput.
+
+Usage: python benchmarks/bench_pipeline.py RECORDING [--speed S] [--workers N] [--json OUT] [--baseline JSON]
+       python benchmarks/bench_pipeline.py --synthetic 500 [--rate 50] [--save RECORDING] ...
+
+Recordings are written by the bot itself when RECORD_PATH is set. --speed 1
+replays notifications and RPC/API latencies as recorded, 10 ten times faster and
+0 as fast as possible without latencies (raw processing cost). Without a
+recording, --synthetic generates pools with plausible latencies.
+
+Rugcheck requests still go through the bot's rate limit, RUGCHECK_RATE (2/s by
+default) then caps the throughput; to measure the pipeline itself raise it:
+
+    RUGCHECK_RATE=1000 RUGCHECK_BURST=1000 python benchmarks/bench_pipeline.py --synthetic 300 --speed 0
+
+With --baseline (a previous --json output) the run fails if throughput drops or
+the p90 of a stage grows by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import math
+import base64
+import random
+import struct
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import base58
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.signature import Signature  # type: ignore
+
+WSOL = 'So11111111111111111111111111111111111111112'
+RAYDIUM_LP_V4 = '675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8'
+TOKEN_PROGRAM = 'TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA'
+RUG_CHECKER_URL = 'https://rugcheck.invalid/tokens/<token_address>/report'
+PYTH_URL = ('https://hermes.pyth.network/v2/updates/price/latest?ids%5B%5D='
+            '0xef0d8b6fda2ceba41da15d4095d1da392a0d2f8ed0c6c7bc0f4cfac8c280b56d')
+
+def configure(workdir: str):
+    """Point the bot at throwaway paths and dummy endpoints before get_new_pools is imported."""
+    load_dotenv()
+    for name in ('LOG_PATH', 'UNFILTERED_DATA_PATH', 'FILTERED_DATA_PATH'):
+        os.environ[name] = workdir
+    os.makedirs(f'{workdir}/sol-listener', exist_ok=True)
+    os.environ['POOL_INDEX_PATH'] = f'{workdir}/pools.db'
+    os.environ['DEDUP_STATE_FILE'] = ''
+    os.environ['RECORD_PATH'] = ''
+    defaults = {
+        'SOLANA_RPC_CLIENT': 'http://127.0.0.1:1', 'SOLANA_WEBSOCKET_CLIENT': 'ws://127.0.0.1:1',
+        'RAYDIUM_POOL_ADDRESS': RAYDIUM_LP_V4, 'SOL_TOKEN_ADDRESS': WSOL,
+        'DEFINEDFI_API_KEY': 'replay', 'DEFINEDFI_URL': 'https://definedfi.invalid/graphql',
+        'RUG_CHECKER_URL': RUG_CHECKER_URL,
+        'TELEGRAM_BASE_URL': 'https://telegram.invalid', 'TELEGRAM_BOT_TOKEN': 'replay', 'TELEGRAM_CHAT_ID': '0',
+        'MIN_FDV': '1000', 'MAX_FDV': '10000000', 'MIN_LIQ': '1000', 'MIN_MC_TO_LIQ': '0.1',
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+def _metadata_blob(mint: Pubkey, name: str, symbol: str, uri: str) -> bytes:
+    def string(value: str, size: int) -> bytes:
+        raw = value.encode()
+        return struct.pack('<I', size) + raw + b'\x00' * (size - len(raw))
+
+    blob = bytes([4]) + bytes(Pubkey.new_unique()) + bytes(mint)
+    blob += string(name, 32) + string(symbol, 10) + string(uri, 200) + struct.pack('<H', 0)
+    blob += b'\x00\x00\x01\x01\xfe\x01\x02\x00\x00\x00'
+    return blob + b'\x00' * (679 - len(blob))
+
+def synthesize(path: str, pools: int, rate: float, seed: int = 42):
+    """Write a recording of `pools` initialize2 pools arriving at `rate` per second."""
+    from account_batcher import MINT_LAYOUT
+    from ray_log import INIT_LOG_LAYOUT, RAY_LOG_PREFIX
+    from replay import account_to_dict
+    from utils import get_metadata_account
+    from solders.account import Account  # type: ignore
+    from spl.token.instructions import get_associated_token_address
+
+    rng = random.Random(seed)
+    events, t = [], 0.0
+    events.append({'t': 0.0, 'kind': 'http', 'method': 'GET', 'url': PYTH_URL, 'body': '', 'latency': 0.08,
+                   'status': 200, 'headers': {'content-type': 'application/json'},
+                   'content': base64.b64encode(json.dumps({'parsed': [{'price': {'price': '15000000000'}}]}).encode()).decode()})
+    for n in range(pools):
+        t += rng.expovariate(rate)
+        keys = [str(Pubkey.new_unique()) for _ in range(21)]
+        keys[9] = WSOL
+        mint, deployer = keys[8], keys[17]
+        signature = str(Signature.new_unique())
+        quote_amount = rng.randint(5, 500) * 10 ** 9
+        base_amount = rng.randint(100_000_000, 900_000_000) * 10 ** 6
+        open_time = 1_700_000_000 + n
+
+        ray_log = INIT_LOG_LAYOUT.pack(0, open_time, 9, 6, 1, 1, quote_amount, base_amount, bytes(Pubkey.new_unique()))
+        logs = ['Program 675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8 invoke [1]',
+                'Program log: initialize2: InitializeInstruction2 { nonce: 254, open_time: 0, init_pc_amount: 0, init_coin_amount: 0 }',
+                RAY_LOG_PREFIX + base64.b64encode(ray_log).decode(),
+                'Program 675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8 success']
+        events.append({'t': round(t, 6), 'kind': 'ws', 'signature': signature, 'logs': logs, 'err': None})
+
+        def balance(index, mint_address, amount, decimals):
+            return {'accountIndex': index, 'mint': mint_address, 'owner': keys[5], 'programId': TOKEN_PROGRAM,
+                    'uiTokenAmount': {'amount': str(amount), 'decimals': decimals,
+                                      'uiAmount': amount / 10 ** decimals, 'uiAmountString': str(amount / 10 ** decimals)}}
+
+        account_keys = [keys[17], keys[10], keys[11], keys[7], keys[4], keys[9], keys[8], RAYDIUM_LP_V4, TOKEN_PROGRAM]
+        data = struct.pack('<BBQQQ', 1, 254, open_time, quote_amount, base_amount)
+        transaction = {'jsonrpc': '2.0', 'id': 1, 'result': {
+            'slot': 250_000_000 + n, 'blockTime': open_time, 'version': 0,
+            'transaction': {'signatures': [signature], 'message': {
+                'accountKeys': [{'pubkey': key, 'writable': True, 'signer': i == 0, 'source': 'transaction'}
+                                for i, key in enumerate(account_keys)],
+                'recentBlockhash': keys[0],
+                'instructions': [{'programId': RAYDIUM_LP_V4, 'accounts': keys,
+                                  'data': base58.b58encode(data).decode(), 'stackHeight': None}]}},
+            'meta': {'err': None, 'status': {'Ok': None}, 'fee': 5000, 'preBalances': [0] * 9, 'postBalances': [0] * 9,
+                     'innerInstructions': [], 'logMessages': logs, 'preTokenBalances': [],
+                     'postTokenBalances': [balance(1, mint, base_amount, 6), balance(2, WSOL, quote_amount, 9)],
+                     'rewards': [], 'loadedAddresses': {'writable': [], 'readonly': []}, 'computeUnitsConsumed': 1}}}
+        events.append({'t': round(t, 6), 'kind': 'transaction', 'signature': signature,
+                       'latency': rng.uniform(0.08, 0.25), 'response': json.dumps(transaction)})
+
+        uri = f'https://metadata.invalid/{mint}.json'
+        metadata = Account(5_000_000, _metadata_blob(Pubkey.from_string(mint), f'Token {n}', f'TK{n % 1000}', uri),
+                           Pubkey.from_string('metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bt518x1s'), False, 0)
+        mint_account = Account(1_500_000, MINT_LAYOUT.pack(0, bytes(32), 10 ** 15, 6, 1, 0, bytes(32)),
+                               Pubkey.from_string(TOKEN_PROGRAM), False, 0)
+        latency = rng.uniform(0.03, 0.08)
+        events.append({'t': round(t, 6), 'kind': 'account', 'pubkey': str(get_metadata_account(Pubkey.from_string(mint))),
+                       'latency': latency, 'account': account_to_dict(metadata)})
+        events.append({'t': round(t, 6), 'kind': 'account', 'pubkey': mint, 'latency': latency,
+                       'account': account_to_dict(mint_account)})
+
+        # Largest holders: the pool's base vault, the deployer and a few wallets
+        holders = [(keys[10], str(Pubkey.new_unique()), base_amount), (str(Pubkey.new_unique()), deployer, rng.randint(0, 5) * 10 ** 12)]
+        holders += [(str(Pubkey.new_unique()), str(Pubkey.new_unique()), rng.randint(1, 30) * 10 ** 12) for _ in range(rng.randint(1, 19))]
+        holders.sort(key=lambda holder: -holder[2])
+        largest = {'jsonrpc': '2.0', 'id': 1, 'result': {'context': {'slot': 250_000_000 + n}, 'value': [
+            {'address': address, 'amount': str(amount), 'decimals': 6, 'uiAmount': amount / 10 ** 6,
+             'uiAmountString': str(amount / 10 ** 6)} for address, _, amount in holders]}}
+        events.append({'t': round(t, 6), 'kind': 'largest', 'mint': mint, 'latency': rng.uniform(0.05, 0.15),
+                       'response': json.dumps(largest)})
+        for address, owner, amount in holders:
+            token_account = Account(2_039_280, bytes(Pubkey.from_string(mint)) + bytes(Pubkey.from_string(owner))
+                                    + struct.pack('<Q', amount) + bytes(93), Pubkey.from_string(TOKEN_PROGRAM), False, 0)
+            events.append({'t': round(t, 6), 'kind': 'account', 'pubkey': address, 'latency': latency,
+                           'account': account_to_dict(token_account)})
+
+        # LP the watcher follows: the LP mint, the deployer's LP account and the quote vault
+        lp_supply = math.isqrt(base_amount * quote_amount)
+        lp_mint = Account(1_500_000, MINT_LAYOUT.pack(0, bytes(32), lp_supply, 9, 1, 0, bytes(32)),
+                          Pubkey.from_string(TOKEN_PROGRAM), False, 0)
+        for address, account_mint, owner, amount in (
+            (str(get_associated_token_address(Pubkey.from_string(deployer), Pubkey.from_string(keys[7]))), keys[7], deployer, lp_supply),
+            (keys[11], WSOL, keys[5], quote_amount)
+        ):
+            token_account = Account(2_039_280, bytes(Pubkey.from_string(account_mint)) + bytes(Pubkey.from_string(owner))
+                                    + struct.pack('<Q', amount) + bytes(93), Pubkey.from_string(TOKEN_PROGRAM), False, 0)
+            events.append({'t': round(t, 6), 'kind': 'account', 'pubkey': address, 'latency': latency,
+                           'account': account_to_dict(token_account)})
+        events.append({'t': round(t, 6), 'kind': 'account', 'pubkey': keys[7], 'latency': latency,
+                       'account': account_to_dict(lp_mint)})
+
+        for url, content, latency in (
+            (uri, {'description': f'Token {n} https://t.me/token{n} https://x.com/token{n}'}, rng.uniform(0.05, 0.3)),
+            (RUG_CHECKER_URL.replace('<token_address>', mint),
+             {'risks': [{'name': 'Low Liquidity', 'description': 'Low amount of LP Providers'}],
+              'topHolders': [{'owner': deployer, 'pct': rng.uniform(1, 20)}],
+              'markets': [{'lp': {'lpLockedPct': 100}}]}, rng.uniform(0.2, 0.6)),
+        ):
+            events.append({'t': round(t, 6), 'kind': 'http', 'method': 'GET', 'url': url, 'body': '', 'latency': latency,
+                           'status': 200, 'headers': {'content-type': 'application/json'},
+                           'content': base64.b64encode(json.dumps(content).encode()).decode()})
+
+    with open(path, 'w', encoding='utf-8') as file:
+        for event in events:
+            file.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+async def replay(recording, speed: float, workers: int, queue_size: int):
+    import clients
+    import metrics
+    import get_new_pools as bot
+    from pipeline import PoolPipeline
+    from replay import ReplayClient, replay_http_client, replay_notifications
+
+    rpc = ReplayClient(recording, speed)
+    bot.solana_client = rpc
+    bot.account_batcher.client = rpc
+    clients._http_client = replay_http_client(recording, speed)
+    metrics.reset()
+
+    # getTokens rather than getTokensWithBackoff, a transaction missing from the recording fails straight away
+    pipeline = PoolPipeline(bot.getTokens, workers=workers, queue_size=queue_size)
+    pipeline.start()
+    bot.unfiltered_sink.start()
+    bot.filtered_sink.start()
+    await bot.pool_index.start()
+    started = time.perf_counter()
+    await replay_notifications(recording, lambda signature, value: bot.submitSignature(pipeline, signature, value), speed)
+    await pipeline.drain()
+    elapsed = time.perf_counter() - started
+    await bot.telegram_dispatcher.close()
+    await bot.rugcheck_service.close()
+    await bot.unfiltered_sink.close()
+    await bot.filtered_sink.close()
+    await bot.pool_index.close()
+    await clients.close_clients()
+    return {
+        'processed': pipeline.processed,
+        'failed': pipeline.failed,
+        'elapsed': elapsed,
+        'poolsPerSecond': pipeline.processed / elapsed if elapsed else 0.0,
+        'missingResponses': rpc.misses,
+        'stages': metrics.summary()
+    }, metrics.format_summary()
+
+def regressions(result: dict, baseline: dict, tolerance: float):
+    found = []
+    if result['poolsPerSecond'] < baseline['poolsPerSecond'] * (1 - tolerance):
+        found.append(f"throughput {result['poolsPerSecond']:.1f} < {baseline['poolsPerSecond']:.1f} pools/s")
+    for stage, row in result['stages'].items():
+        before = baseline['stages'].get(stage)
+        if before and row['p90'] > before['p90'] * (1 + tolerance):
+            found.append(f"{stage} p90 {row['p90'] * 1e3:.2f}ms > {before['p90'] * 1e3:.2f}ms")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', nargs='?', help='recording written with RECORD_PATH set')
+    parser.add_argument('--synthetic', type=int, help='generate a recording of this many pools instead')
+    parser.add_argument('--rate', type=float, default=50.0, help='synthetic pools per second')
+    parser.add_argument('--save', help='where to keep the synthetic recording')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed, 0 for as fast as possible')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PIPELINE_WORKERS', 4)))
+    parser.add_argument('--queue-size', type=int, default=int(os.environ.get('PIPELINE_QUEUE_SIZE', 100)))
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression against the baseline')
+    args = parser.parse_args()
+    if not args.recording and not args.synthetic:
+        parser.error('a recording or --synthetic N is required')
+
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    configure(workdir)
+    from replay import Recording
+
+    path = args.recording
+    if args.synthetic:
+        path = args.save or os.path.join(workdir, 'synthetic.jsonl')
+        synthesize(path, args.synthetic, args.rate)
+    recording = Recording(path)
+    print(recording)
+
+    # The bot's per-pool prints would dominate the output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result, table = asyncio.run(replay(recording, args.speed, args.workers, args.queue_size))
+
+    speed = f'{args.speed:g}x' if args.speed > 0 else 'max speed'
+    print(f"{speed}, {args.workers} worker(s): {result['processed']} pool(s) processed, {result['failed']} failed "
+          f"in {result['elapsed']:.2f}s ({result['poolsPerSecond']:.1f} pools/s), {result['missingResponses']} response(s) missing")
+    print(table)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(result, json.load(file), args.tolerance)
+        for regression in found:
+            print('REGRESSION:', regression)
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import logging
+
+import httpx
+from solana.rpc.async_api import AsyncClient
+
+# Shared, lazily created network clients so connections (and TLS handshakes)
+# are reused across pools instead of being paid on every call.
+_rpc_client = None
+_http_client = None
+
+rpc_timeout = float(os.environ.get('RPC_TIMEOUT', 10))
+http_timeout = float(os.environ.get('HTTP_TIMEOUT', 10))
+http_max_connections = int(os.environ.get('HTTP_MAX_CONNECTIONS', 100))
+http_max_keepalive = int(os.environ.get('HTTP_MAX_KEEPALIVE', 20))
+
+def rpc_client() -> AsyncClient:
+    global _rpc_client
+    if _rpc_client is None:
+        _rpc_client = AsyncClient(os.environ['SOLANA_RPC_CLIENT'], timeout=rpc_timeout)
+    return _rpc_client
+
+def http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        limits = httpx.Limits(
+            max_connections=http_max_connections,
+            max_keepalive_connections=http_max_keepalive,
+            keepalive_expiry=30
+        )
+        try:
+            _http_client = httpx.AsyncClient(http2=True, limits=limits, timeout=http_timeout)
+        except ImportError:
+            # http2 needs the optional `h2` package, keep-alive pooling still applies without it
+            logging.warning('h2 is not installed, falling back to HTTP/1.1')
+            _http_client = httpx.AsyncClient(limits=limits, timeout=http_timeout)
+    return _http_client
+
+async def close_clients():
+    global _rpc_client, _http_client
+    if _rpc_client is not None:
+        await _rpc_client.close()
+        _rpc_client = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,128 @@
+import os
+import time
+import struct
+import asyncio
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from solders.signature import Signature  # type: ignore
+
+# 64-byte signature followed by the wall clock time it was first seen
+RECORD = struct.Struct('<64sd')
+
+class SignatureDeduper:
+    """Bounded, first-seen ordered window of transaction signatures with TTL expiry.
+
+    Keys are the raw 64 signature bytes rather than `Signature` objects. When
+    `state_file` is set the window is saved every `save_interval` seconds by `run`,
+    off the event loop, and on `close`, and reloaded on start so a restart doesn't
+    re-alert on replayed notifications.
+    """
+
+    def __init__(self,
+                 capacity: int = 100_000,
+                 ttl: float = 24 * 3600,
+                 state_file: Optional[str] = None,
+                 save_interval: float = 60.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.state_file = state_file
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._seen: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._saved_misses = 0
+        self._write_lock = threading.Lock()
+        if state_file:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, signature: Signature) -> bool:
+        seen_at = self._seen.get(bytes(signature))
+        return seen_at is not None and time.time() - seen_at < self.ttl
+
+    def check_and_add(self, signature: Signature) -> bool:
+        """Return True if the signature was already seen, otherwise remember it."""
+        key = bytes(signature)
+        now = time.time()
+        self._expire(now)
+        if key in self._seen:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        self._seen[key] = now
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def _expire(self, now: float):
+        # Entries are kept in first-seen order, so everything after the first live entry is live too
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[key]
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._seen),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def load(self):
+        if not self.state_file or not os.path.isfile(self.state_file):
+            return
+        now = time.time()
+        with open(self.state_file, 'rb') as file:
+            data = file.read()
+        for key, seen_at in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+            if now - seen_at < self.ttl:
+                self._seen[key] = seen_at
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        logging.info(f'Loaded {len(self._seen)} seen signatures from {self.state_file}')
+
+    def _snapshot(self) -> List[Tuple[bytes, float]]:
+        self._saved_misses = self.misses
+        return list(self._seen.items())
+
+    def _write(self, records: List[Tuple[bytes, float]]):
+        # The periodic save may still be writing in its thread when `close` saves
+        with self._write_lock:
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(b''.join(RECORD.pack(key, seen_at) for key, seen_at in records))
+            os.replace(tmp_path, self.state_file)
+
+    def save(self):
+        if not self.state_file:
+            return
+        self._write(self._snapshot())
+
+    async def run(self):
+        """Save the window every `save_interval` seconds when it changed, writing in a thread."""
+        while self.state_file:
+            await asyncio.sleep(self.save_interval)
+            if self.misses == self._saved_misses:
+                continue
+            try:
+                await asyncio.to_thread(self._write, self._snapshot())
+            except OSError as e:
+                logging.error('Failed to save seen signatures to %s: %s', self.state_file, e)
+
+    def close(self):
+        self.save()
+        logging.info(f'Signature dedup stats: {self.stats()}')
@@ -1,7 +1,15 @@
 import os
+import json
+import asyncio
+import logging
 from dotenv import load_dotenv
 
-import requests
+from typing import Dict, Optional, Tuple
+
+from clients import http_client
+from rate_limit import send_with_retry
+from log_config import console
+import metrics
 
 load_dotenv()
 
@@ -11,69 +19,149 @@ solana_network_id = "1399811149"
 token_address = "A6Nb2TqmXizHoz65oL3gxCKL7pCac3hXL4t1RCW3aDR5"
 pair_address = "3toTYDxRoukSy4nJTiW8sYzwj5unJJARWn1jNWzTegBH"
 
-headers = {
-  "content_type":"application/json",
-  "Authorization": api_key
+# Selections of the lookups that can share a document, keyed by lookup kind
+FIELDS = {
+    'token': 'token(input: {{ address: {address}, networkId: {network_id} }}) '
+             '{{ symbol name isScam totalSupply creatorAddress socialLinks {{ website telegram twitter }} }}',
+    'pairMetadata': 'pairMetadata(pairId: {pair_id}, quoteToken: {quote_token}) {{ pairAddress price liquidity }}',
 }
+QUOTE_TOKENS = ('token0', 'token1')
+
+Lookup = Tuple[str, ...]
+
+class DefinedfiClient:
+    """Sends definedfi lookups made within `window` seconds of each other as one aliased GraphQL query.
+
+    Each lookup becomes a field of the document (`l0: token(...)`, `l1: pairMetadata(...)`...),
+    up to `max_batch` per request, and the response is split back by alias. A lookup
+    that definedfi can't resolve gets None without failing the rest of its batch.
+    """
+
+    def __init__(self, url: str, api_key: str, network_id: str = solana_network_id,
+                 window: float = 0.05, max_batch: int = 25):
+        self.url = url
+        self.headers = {"Authorization": api_key}
+        self.network_id = network_id
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.lookups = 0
+        self._pending: Dict[Lookup, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._fetches = set()
+
+    def _field(self, lookup: Lookup) -> str:
+        kind = lookup[0]
+        if kind == 'token':
+            return FIELDS['token'].format(address=json.dumps(lookup[1]), network_id=self.network_id)
+        return FIELDS['pairMetadata'].format(pair_id=json.dumps(f'{lookup[1]}:{self.network_id}'), quote_token=lookup[2])
+
+    def document(self, lookups) -> str:
+        return 'query Batch { ' + ' '.join(f'l{i}: {self._field(lookup)}' for i, lookup in enumerate(lookups)) + ' }'
+
+    async def _lookup(self, lookup: Lookup) -> Optional[dict]:
+        future = self._pending.get(lookup)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[lookup] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    async def token(self, token_address: str) -> Optional[dict]:
+        return await self._lookup(('token', str(token_address)))
 
-def _getTokenInfo(token_address: str):
+    async def pair_metadata(self, pair_address: str, quote_token: str = 'token0') -> Optional[dict]:
+        if quote_token not in QUOTE_TOKENS:
+            raise ValueError(f'quote_token must be one of {QUOTE_TOKENS}, got {quote_token}')
+        return await self._lookup(('pairMetadata', str(pair_address), quote_token))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._fetch(batch))
+        self._fetches.add(task)
+        task.add_done_callback(self._fetches.discard)
+
+    async def _fetch(self, batch: Dict[Lookup, asyncio.Future]):
+        lookups = list(batch)
+        try:
+            query = self.document(lookups)
+            with metrics.timer('api.definedfi'):
+                response = await send_with_retry(
+                    lambda: http_client().post(self.url, headers=self.headers, json={"query": query}),
+                    retries=2,
+                    name=f'definedfi batch of {len(lookups)}'
+                )
+            self.requests += 1
+            self.lookups += len(lookups)
+            body = response.json()
+            if response.status_code != 200:
+                raise Exception(f'Status code: {response.status_code} {body}')
+            data = body.get('data') or {}
+            for error in body.get('errors') or []:
+                logging.warning(f"definedfi error for {error.get('path')}: {error.get('message')}")
+            for i, lookup in enumerate(lookups):
+                if not batch[lookup].done():
+                    batch[lookup].set_result(data.get(f'l{i}'))
+        except Exception as e:
+            logging.warning(f'definedfi batch of {len(lookups)} lookup(s) failed: {e}')
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'lookups': self.lookups,
+            'lookupsPerRequest': round(self.lookups / self.requests, 1) if self.requests else 0.0
+        }
+
+client = DefinedfiClient(
+    url,
+    api_key,
+    window=float(os.environ.get('DEFINEDFI_BATCH_WINDOW', 0.05)),
+    max_batch=int(os.environ.get('DEFINEDFI_BATCH_SIZE', 25))
+)
+
+async def _getTokenInfo(token_address: str):
     try:
-        # getNetworks = """query GetNetworksQuery { getNetworks { name id } }"""
-        getTokenInfo = """query GetTokenQuery { token(input: { address: "<TOKEN_ADDRESS>", networkId: <NETWORK_ID> }) { symbol name isScam totalSupply creatorAddress socialLinks { website telegram twitter } } }"""
-        getTokenInfo = getTokenInfo.replace("<TOKEN_ADDRESS>", token_address)
-        getTokenInfo = getTokenInfo.replace("<NETWORK_ID>", solana_network_id)
-
-        response = requests.post(url, headers=headers, json={"query": getTokenInfo})
-
-        if response.status_code == 200:
-            response_data = response.json().get('data', {}).get('token', {}) if response.json().get('data') else {}    
-        else:
-            print('_getTokenInfo | Status code:', response.status_code)
-            response_data = response.json()
-        
-        # print(response_data)
+        response_data = await client.token(token_address) or {}
+        socials = response_data.get('socialLinks') or {}
         return {
                 'symbol': response_data.get('symbol', ''),
                 'name': response_data.get('name', ''),
                 'isScam': response_data.get('isScam', ''),
                 'totalSupply': response_data.get('totalSupply', ''),
                 'creatorAddress': response_data.get('creatorAddress', ''),
-                'website': response_data.get('socialLinks', {}).get('website', ''),
-                'telegram': response_data.get('socialLinks', {}).get('telegram', ''),
-                'twitter': response_data.get('socialLinks', {}).get('twitter', ''),
+                'website': socials.get('website', ''),
+                'telegram': socials.get('telegram', ''),
+                'twitter': socials.get('twitter', ''),
             }
-        
+
     except Exception as e:
-        print('Error in _getTokenInfo')
-        print(e)
+        logging.error('Error in _getTokenInfo: %s', e)
+        console('Error in _getTokenInfo:', e)
 
-def _getPairMetadata(pair_address: str, quote_token: str):
+async def _getPairMetadata(pair_address: str, quote_token: str):
     try:
-        # getNetworks = """query GetNetworksQuery { getNetworks { name id } }"""
-        getPairMetadata = """query GetPairMetadataQuery { pairMetadata(pairId:"<PAIR_ADDRESS>:<NETWORK_ID>" quoteToken:<QUOTE_TOKEN>) { pairAddress price liquidity } }"""
-        getPairMetadata = getPairMetadata.replace("<PAIR_ADDRESS>", pair_address)
-        getPairMetadata = getPairMetadata.replace("<NETWORK_ID>", solana_network_id)
-        getPairMetadata = getPairMetadata.replace("<QUOTE_TOKEN>", quote_token)
-
-        response = requests.post(url, headers=headers, json={"query": getPairMetadata})
-
-        if response.status_code == 200:
-            response_data = response.json()['data']['pairMetadata'] if response.json().get('data') else {}
-        else:
-            print('_getPairMetadata | Status code:', response.status_code)
-            response_data = response.json()
-        
-        # print(response_data)
-        
+        response_data = await client.pair_metadata(pair_address, quote_token) or {}
         return {
                 'pairAddress': response_data.get('pairAddress', ''),
                 'price': response_data.get('price', ''),
                 'liquidity': response_data.get('liquidity', ''),
             }
-    
+
     except Exception as e:
-        print('Error in _getPairMetadata')
-        print(e)
+        logging.error('Error in _getPairMetadata: %s', e)
+        console('Error in _getPairMetadata:', e)
 
 # _getTokenInfo(token_address)
-# _getPairMetadata(pair_address, "token0")
\ No newline at end of file
+# _getPairMetadata(pair_address, "token0")
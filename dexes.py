@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.responses import GetTransactionResp # type: ignore
+from solders.transaction_status import UiPartiallyDecodedInstruction # type: ignore
+
+from tx_decoder import (
+    DecodedPool, program_instructions, decode_pool, decode_cpmm_pool, decode_clmm_pool,
+    decode_pumpswap_pool, decode_dlmm_pool
+)
+
+Decoder = Callable[[GetTransactionResp, UiPartiallyDecodedInstruction], Optional[DecodedPool]]
+
+@dataclass(frozen=True)
+class Dex:
+    """A launch venue: which logs to subscribe to, which of them announce a new pool and how
+    to decode the pool from the instruction `program_id` executed.
+
+    `mentions` is the address the logs subscription filters on, the program itself unless a
+    quieter account only shows up in pool creations. A log line announces a pool when it
+    equals one of `log_markers`, or contains one if `exact_markers` is False.
+    """
+    name: str
+    program_id: Pubkey
+    log_markers: Tuple[str, ...]
+    decode: Decoder
+    mentions: Optional[Pubkey] = None
+    exact_markers: bool = True
+    # Type passed to utils.get_metadata
+    metadata_type: str = 'raydium'
+    # Only shows up in pool creations, fetched to catch up after a reconnect
+    backfill_address: Optional[Pubkey] = None
+
+    @property
+    def subscription_address(self) -> Pubkey:
+        return self.mentions or self.program_id
+
+    def announces_pool(self, logs: Iterable[str]) -> bool:
+        if self.exact_markers:
+            return any(log in self.log_markers for log in logs)
+        return any(marker in log for log in logs for marker in self.log_markers)
+
+    def find_pool(self, transaction: GetTransactionResp) -> Optional[DecodedPool]:
+        for instruction in program_instructions(transaction, self.program_id):
+            pool = self.decode(transaction, instruction)
+            if pool is not None:
+                return pool
+        return None
+
+DEXES: Dict[str, Dex] = {}
+
+def register(dex: Dex) -> Dex:
+    DEXES[dex.name] = dex
+    return dex
+
+register(Dex(
+    name='raydium',
+    program_id=Pubkey.from_string('675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8'),
+    log_markers=('initialize2',),
+    decode=decode_pool,
+    exact_markers=False,
+    # Raydium's pool creation fee account
+    backfill_address=Pubkey.from_string('7YttLkHDoNj9wyDur5pM1ejNaAvT9X4eqaYcHQqtj2G5')
+))
+register(Dex(
+    name='raydium_cpmm',
+    program_id=Pubkey.from_string('CPMMoo8L3F4NbTegBCKVNunggL7H1ZpdTHKxQB5qKP1C'),
+    log_markers=('Program log: Instruction: Initialize',),
+    decode=decode_cpmm_pool,
+    backfill_address=Pubkey.from_string('DNXgeM9EiiaAbaWvwjHj9fQQLAX5ZsfHyvmYUNRAdNC8')
+))
+register(Dex(
+    name='raydium_clmm',
+    program_id=Pubkey.from_string('CAMMCzo5YL8w4VFF8KVHrK22GGUsp5VTaW7grrKgrWqK'),
+    log_markers=('Program log: Instruction: CreatePool',),
+    decode=decode_clmm_pool
+))
+register(Dex(
+    name='pumpfun',
+    program_id=Pubkey.from_string('pAMMBay6oceH9fJKBRHGP5D4bD4sWpmSwMn52FMfXEA'),
+    log_markers=('Program log: Instruction: Migrate',),
+    decode=decode_pumpswap_pool,
+    # pump.fun's migration account signs every bonding curve migration and nothing else,
+    # unlike PumpSwap itself which logs every swap
+    mentions=Pubkey.from_string('39azUYFWPz3VHgKCf3VChUwbpURdCHRxjWVowf5jUJjg'),
+    metadata_type='pump.fun',
+    backfill_address=Pubkey.from_string('39azUYFWPz3VHgKCf3VChUwbpURdCHRxjWVowf5jUJjg')
+))
+register(Dex(
+    name='meteora_dlmm',
+    program_id=Pubkey.from_string('LBUZKhRxPF3XUpBCjp4YzTKgLccjZhTSDM9YuVaPwxo'),
+    log_markers=('Program log: Instruction: InitializeLbPair',),
+    decode=decode_dlmm_pool
+))
+
+def enabled_dexes(names: str) -> List[Dex]:
+    """The registered DEXes named in a comma separated list."""
+    dexes = []
+    for name in names.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in DEXES:
+            raise ValueError(f'Unknown DEX {name!r}, expected one of {", ".join(DEXES)}')
+        dexes.append(DEXES[name])
+    return dexes
+
+def find_pool(transaction: GetTransactionResp, dexes: Iterable[Dex]) -> Optional[Tuple[Dex, DecodedPool]]:
+    """The first pool created by the transaction on one of `dexes`."""
+    for dex in dexes:
+        pool = dex.find_pool(transaction)
+        if pool is not None:
+            return dex, pool
+    return None
@@ -0,0 +1,85 @@
+import time
+import asyncio
+import inspect
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from log_config import console
+import metrics
+
+class Enrichment:
+    """Runs independent per-token lookups concurrently, each with its own timeout.
+
+    A lookup added as a coroutine starts right away, one added as a function
+    returning a coroutine only once it is first asked for (`get` or `start`), so
+    lookups a token never gets to cost nothing. `get` waits for one result only,
+    so filters can run as soon as the pieces they need have arrived. A lookup
+    that fails or times out resolves to `None` instead of failing the token.
+    """
+
+    def __init__(self, token_address, default_timeout: float = 10.0):
+        self.token_address = token_address
+        self.default_timeout = default_timeout
+        self._lookups: Dict[str, Tuple[Callable[[], Awaitable[Any]], float]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, lookup: Union[Awaitable[Any], Callable[[], Awaitable[Any]]], timeout: Optional[float] = None):
+        timeout = self.default_timeout if timeout is None else timeout
+        if inspect.isawaitable(lookup):
+            self._lookups[name] = (lambda: lookup, timeout)
+            self.start(name)
+        else:
+            self._lookups[name] = (lookup, timeout)
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._lookups
+
+    def started(self, name: str) -> bool:
+        return name in self._tasks
+
+    def start(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is not None:
+            return task
+        lookup, timeout = self._lookups[name]
+        task = asyncio.create_task(asyncio.wait_for(lookup(), timeout), name=f'{name}-{self.token_address}')
+        started = time.perf_counter()
+
+        def observe(task: asyncio.Task):
+            # Only lookups that produced a result, cancelled ones say nothing about latency
+            if not task.cancelled() and task.exception() is None:
+                metrics.observe(f'enrichment.{name}', time.perf_counter() - started)
+
+        task.add_done_callback(observe)
+        self._tasks[name] = task
+        return task
+
+    async def get(self, name: str) -> Any:
+        task = self.start(name)
+        try:
+            return await task
+        except asyncio.TimeoutError:
+            logging.warning('%s lookup timed out for %s', name, self.token_address)
+            console(f'{name} lookup timed out for {self.token_address}')
+        except asyncio.CancelledError:
+            if not self._tasks[name].cancelled():
+                raise
+        except Exception as e:
+            logging.warning('%s lookup failed for %s: %s', name, self.token_address, e)
+            console(f'{name} lookup failed for {self.token_address}:', e)
+        return None
+
+    async def get_all(self) -> Dict[str, Any]:
+        results = await asyncio.gather(*(self.get(name) for name in self._lookups))
+        return dict(zip(self._lookups, results))
+
+    def cancel(self):
+        """Drop lookups whose result is no longer needed (e.g. the token was filtered out)."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Mark unread failures as retrieved so asyncio doesn't warn about them
+                task.exception()
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import inspect
+import logging
+
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from enrichment import Enrichment
+import metrics
+
+STAGES = ('screen', 'alert')
+MISSING = ('reject', 'pass')
+
+# Relative cost of each lookup, a rule waits until the rules needing cheaper data have passed
+DEFAULT_COSTS = {
+    'solPrice': 1,
+    'names': 2,
+    'mint': 2,
+    'holders': 4,
+    'pairMetadata': 5,
+    'metadata': 5,
+    # Waits CONCENTRATED_LIQUIDITY_DELAY before reading the vaults
+    'reserves': 8,
+    'rugcheck': 10
+}
+
+class Field:
+    """A value rules can test. `needs` names the lookups and other fields it is computed
+    from (or is a function of the pool returning them), `compute(facts, *values)` gets
+    their values in that order and may be a coroutine. The field is None whenever one
+    of them is, unless `optional`."""
+    __slots__ = ('name', 'needs', 'compute', 'optional')
+
+    def __init__(self,
+                 name: str,
+                 needs: Union[Tuple[str, ...], Callable[[Any], Tuple[str, ...]]],
+                 compute: Callable[..., Any],
+                 optional: bool = False):
+        self.name = name
+        self.needs = needs
+        self.compute = compute
+        self.optional = optional
+
+class Facts:
+    """Field values of one pool, each computed once from the pool's lookups."""
+
+    def __init__(self, fields: Dict[str, Field], pool, enrichment: Enrichment):
+        self.fields = fields
+        self.pool = pool
+        self.enrichment = enrichment
+        self._values: Dict[str, Any] = {}
+
+    def needs(self, name: str) -> Tuple[str, ...]:
+        needs = self.fields[name].needs
+        return needs(self.pool) if callable(needs) else needs
+
+    def lookups(self, name: str) -> List[str]:
+        """Every lookup field `name` depends on, directly or through other fields."""
+        found = []
+        for need in self.needs(name):
+            for lookup in (self.lookups(need) if need in self.fields else [need]):
+                if lookup not in found:
+                    found.append(lookup)
+        return found
+
+    async def get(self, name: str) -> Any:
+        if name in self._values:
+            return self._values[name]
+        field = self.fields[name]
+        # Start every lookup the field depends on before waiting for any of them
+        for lookup in self.lookups(name):
+            if lookup in self.enrichment:
+                self.enrichment.start(lookup)
+        values = []
+        for need in self.needs(name):
+            if need in self.fields:
+                values.append(await self.get(need))
+            else:
+                values.append(await self.enrichment.get(need) if need in self.enrichment else None)
+        if not field.optional and any(value is None for value in values):
+            value = None
+        else:
+            value = field.compute(self, *values)
+            if inspect.isawaitable(value):
+                value = await value
+        self._values[name] = value
+        return value
+
+class Rule:
+    """Passes when its field is >= `min`, <= `max` and == `equals` (each when set).
+
+    A rule whose field can't be computed rejects the token unless `missing` is 'pass'.
+    Rules of the 'screen' stage decide whether a token is saved as unfiltered, those
+    of the 'alert' stage whether it is then alerted.
+    """
+    __slots__ = ('name', 'field', 'min', 'max', 'equals', 'stage', 'missing', 'position')
+
+    def __init__(self, name: str, field: str, min: Optional[float] = None, max: Optional[float] = None,
+                 equals: Any = None, stage: str = 'screen', missing: str = 'reject', position: int = 0):
+        if stage not in STAGES:
+            raise ValueError(f'Rule {name}: stage must be one of {STAGES}, not {stage!r}')
+        if missing not in MISSING:
+            raise ValueError(f'Rule {name}: missing must be one of {MISSING}, not {missing!r}')
+        self.name = name
+        self.field = field
+        self.min = min
+        self.max = max
+        self.equals = equals
+        self.stage = stage
+        self.missing = missing
+        self.position = position
+
+    @classmethod
+    def from_dict(cls, data: dict, position: int = 0) -> 'Rule':
+        data = dict(data)
+        data.setdefault('name', data.get('field'))
+        unknown = set(data) - {'name', 'field', 'min', 'max', 'equals', 'stage', 'missing', 'enabled'}
+        if unknown:
+            raise ValueError(f'Rule {data["name"]}: unknown key(s) {", ".join(sorted(unknown))}')
+        data.pop('enabled', None)
+        return cls(position=position, **data)
+
+    def check(self, value) -> bool:
+        if self.min is not None and value < self.min:
+            return False
+        if self.max is not None and value > self.max:
+            return False
+        return self.equals is None or value == self.equals
+
+    def describe(self, value) -> str:
+        if value is None:
+            return f'{self.field} is unavailable'
+        limits = [f'{bound} {limit}' for bound, limit in (('min', self.min), ('max', self.max), ('==', self.equals))
+                  if limit is not None]
+        return f'{self.field}={value} (rule {self.name}: {", ".join(limits)})'
+
+class Rejection:
+    __slots__ = ('rule', 'value')
+
+    def __init__(self, rule: Rule, value):
+        self.rule = rule
+        self.value = value
+
+    @property
+    def reason(self) -> str:
+        return f'{self.rule.name}_unavailable' if self.value is None else self.rule.name
+
+    def describe(self) -> str:
+        return self.rule.describe(self.value)
+
+class FilterEngine:
+    """Evaluates declarative rules against a pool, cheapest data first.
+
+    Rules come from `default_rules` or, when `path` is set, from that JSON file
+    (`{"rules": [...], "costs": {...}}`), reloaded when it changes (checked at most
+    every `reload_interval` seconds); a file that fails to load keeps the current
+    rules. Within a stage the next rule to run is the one whose lookups not yet
+    started cost the least (ties in declaration order), so a token rejected by a
+    cheap rule never triggers the expensive lookups. Lookups costing no more than
+    `prefetch_cost` (account reads sharing one batched request) start together
+    when the stage begins.
+    """
+
+    def __init__(self,
+                 fields: Iterable[Field],
+                 default_rules: Iterable[dict],
+                 path: Optional[str] = None,
+                 costs: Optional[Dict[str, float]] = None,
+                 prefetch_cost: float = 2,
+                 reload_interval: float = 10.0):
+        self.fields = {field.name: field for field in fields}
+        self.path = path
+        self.default_costs = dict(DEFAULT_COSTS if costs is None else costs)
+        self.costs = dict(self.default_costs)
+        self.prefetch_cost = prefetch_cost
+        self.reload_interval = reload_interval
+        self.hits: Counter = Counter()
+        self._mtime = None
+        self._last_reload_check = float('-inf')
+        self.rules: List[Rule] = self.compile(default_rules)
+        if path:
+            self._last_reload_check = time.monotonic()
+            self.reload()
+
+    def compile(self, rules: Iterable[dict]) -> List[Rule]:
+        compiled = []
+        for position, data in enumerate(rules):
+            if not data.get('enabled', True):
+                continue
+            rule = Rule.from_dict(data, position)
+            if rule.field not in self.fields:
+                raise ValueError(f'Rule {rule.name}: unknown field {rule.field!r}, expected one of {", ".join(self.fields)}')
+            compiled.append(rule)
+        return compiled
+
+    def reload(self):
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            logging.error(f'Filters file {self.path} not found, keeping the current rules')
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                config = json.load(file)
+            if isinstance(config, list):
+                config = {'rules': config}
+            rules = self.compile(config.get('rules', []))
+            costs = {**self.default_costs, **config.get('costs', {})}
+        except (OSError, ValueError, TypeError) as e:
+            logging.error(f'Invalid filters file {self.path} ({e}), keeping the current rules')
+            return
+        self.rules, self.costs = rules, costs
+        logging.info(f'Filters loaded from {self.path}: {", ".join(rule.name for rule in rules)}')
+
+    def stage(self, stage: str) -> List[Rule]:
+        now = time.monotonic()
+        if self.path and now - self._last_reload_check >= self.reload_interval:
+            self._last_reload_check = now
+            self.reload()
+        return [rule for rule in self.rules if rule.stage == stage]
+
+    def cost(self, rule: Rule, facts: Facts) -> float:
+        return sum(self.costs.get(lookup, 1) for lookup in facts.lookups(rule.field)
+                   if lookup in facts.enrichment and not facts.enrichment.started(lookup))
+
+    async def evaluate(self, facts: Facts, stage: str = 'screen') -> Optional[Rejection]:
+        """The first rule of `stage` the pool fails, None if it passes them all."""
+        pending = self.stage(stage)
+        for rule in pending:
+            for lookup in facts.lookups(rule.field):
+                if lookup in facts.enrichment and self.costs.get(lookup, 1) <= self.prefetch_cost:
+                    facts.enrichment.start(lookup)
+        while pending:
+            rule = min(pending, key=lambda rule: (self.cost(rule, facts), rule.position))
+            pending.remove(rule)
+            value = await facts.get(rule.field)
+            if value is None:
+                result = 'unavailable'
+                passed = rule.missing == 'pass'
+            else:
+                passed = rule.check(value)
+                result = 'pass' if passed else 'reject'
+            self.hits[(rule.name, result)] += 1
+            metrics.inc('filter_rule', rule=rule.name, result=result)
+            if not passed:
+                return Rejection(rule, value)
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        for (name, result), count in sorted(self.hits.items()):
+            stats.setdefault(name, {})[result] = count
+        return stats
@@ -2,135 +2,279 @@
 
 import os
 import asyncio
-from websockets.exceptions import ConnectionClosedError, ProtocolError, ConnectionClosed
+import time
+import logging
 
-from solana.rpc.api import Client
-from solana.rpc.websocket_api import connect
-from solana.rpc.commitment import Finalized
+from dotenv import load_dotenv
 
-from solders.pubkey import Pubkey  # type: ignore
-from solders.signature import Signature  # type: ignore
-from solders.rpc.config import RpcTransactionLogsFilterMentions # type: ignore
-from solders.rpc.responses import GetTransactionResp # type: ignore
+load_dotenv()
 
-from tabulate import tabulate
-from datetime import datetime
-from utils import contains_word_from_list, save_token_address, subscribe_to_logs, get_metadata, process_messages, instructions_with_program_id, get_pyth_solana_price
-from definedfi import _getTokenInfo, _getPairMetadata
-import requests
-import ssl
+from log_config import setup_logging, console
 
-import logging
+log_path = os.environ['LOG_PATH']
+# A new file is started every day, written from a background thread. Configured before
+# the bot's modules are imported so nothing they log while loading is lost
+setup_logging(
+    f"{log_path}/sol-listener/get_new_pool_{{date}}.log",
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    json_format=os.environ.get('LOG_FORMAT', 'text').lower() == 'json',
+    # LOG_QUIET=true leaves the log file as the only output
+    quiet=os.environ.get('LOG_QUIET', 'false').lower() == 'true'
+)
 logger = logging.getLogger('websockets')
 logger.setLevel(logging.ERROR)
 logger.addHandler(logging.StreamHandler())
 
-log_path = os.environ['LOG_PATH']
-log_file_path = f"{log_path}/sol-listener/get_new_pool_{datetime.now().strftime('%Y-%m-%d')}.log"
+from solana.rpc.commitment import Commitment, Confirmed, Finalized, Processed
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.signature import Signature  # type: ignore
+from solders.rpc.responses import RpcLogsResponse # type: ignore
+
+from tabulate import tabulate
+from dataclasses import replace
+from datetime import datetime
+from typing import Optional
+from utils import contains_word_from_list, get_metadata, get_onchain_metadata, get_pyth_solana_price
+from definedfi import _getPairMetadata
+import definedfi
+import metrics
+from pipeline import PoolPipeline
+from enrichment import Enrichment
+from filters import Facts, Field, FilterEngine, Rejection
+from tx_decoder import DecodedPool, WSOL_MINT
+from dexes import DEXES, enabled_dexes, find_pool
+from ray_log import find_init_log
+from dedup import SignatureDeduper
+from ingestion import MultiEndpointListener
+from clients import rpc_client, http_client, close_clients
+from storage import TokenSink
+from pool_index import PoolIndex
+from rugcheck_service import RugcheckService, lp_locked, lp_locked_pct
+from alerts import TelegramDispatcher
+from account_batcher import AccountBatcher
+from holders import HolderAnalyzer
+from account_subscriptions import AccountSubscriptions
+from lp_watcher import LpLockWatcher, LpWatch, token_account_amount
+from pool_tracker import PoolTracker, TrackedPool, LIQUIDITY_REMOVED
+from replay import Recorder
+
 unfiltered_data_path = os.environ['UNFILTERED_DATA_PATH']
 filtered_data_path = os.environ['FILTERED_DATA_PATH']
+storage_flush_size = int(os.environ.get('STORAGE_FLUSH_SIZE', 100))
+storage_flush_interval = float(os.environ.get('STORAGE_FLUSH_INTERVAL', 5))
+storage_parquet = os.environ.get('STORAGE_PARQUET', 'false').lower() == 'true'
+unfiltered_sink = TokenSink(unfiltered_data_path, 'token_addresses_unfiltered', storage_flush_size, storage_flush_interval, storage_parquet)
+filtered_sink = TokenSink(filtered_data_path, 'token_addresses_filtered', storage_flush_size, storage_flush_interval, storage_parquet)
+pool_index = PoolIndex(
+    os.environ.get('POOL_INDEX_PATH') or f'{unfiltered_data_path}/pools.db',
+    batch_size=int(os.environ.get('POOL_INDEX_BATCH_SIZE', 50)),
+    flush_interval=float(os.environ.get('POOL_INDEX_FLUSH_INTERVAL', 2)),
+    deployer_window=float(os.environ.get('DEPLOYER_WINDOW_DAYS', 30)) * 24 * 3600
+)
+# Pools from deployers with at least this many rugs in the window are dropped before any lookup, 0 disables
+max_deployer_rugs = int(os.environ.get('MAX_DEPLOYER_RUGS', 1))
 
-RaydiumLPV4 = os.environ['RAYDIUM_POOL_ADDRESS']
+RaydiumLPV4 = os.environ.get('RAYDIUM_POOL_ADDRESS') or str(DEXES['raydium'].program_id)
 TOKEN_PROGRAM_ID = Pubkey.from_string('TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA')
 sol_address = os.environ['SOL_TOKEN_ADDRESS']
-solana_client = Client(os.environ['SOLANA_RPC_CLIENT'])
+solana_client = rpc_client()
+# Capture notifications and RPC/API responses for benchmarks/bench_pipeline.py to replay
+record_path = os.environ.get('RECORD_PATH')
+recorder = Recorder(record_path) if record_path else None
+if recorder:
+    solana_client = recorder.wrap_rpc(solana_client)
+    recorder.install_http(http_client())
 websocket_client = os.environ['SOLANA_WEBSOCKET_CLIENT']
-seen_signatures = set()
+# Extra endpoints are raced against each other, whichever delivers a pool first wins
+websocket_clients = [websocket_client] + [
+    endpoint.strip() for endpoint in os.environ.get('SOLANA_WEBSOCKET_CLIENTS', '').split(',')
+    if endpoint.strip() and endpoint.strip() != websocket_client
+]
+# Raydium's pool creation fee account only shows up in initialize2 transactions
+backfill_address = os.environ.get('BACKFILL_ADDRESS', str(DEXES['raydium'].backfill_address))
+# Launch venues watched over each websocket connection, one logs subscription each:
+# raydium, raydium_cpmm, raydium_clmm, pumpfun (migrations to PumpSwap), meteora_dlmm
+dexes = [
+    replace(dex, program_id=Pubkey.from_string(RaydiumLPV4),
+            backfill_address=Pubkey.from_string(backfill_address) if backfill_address else None)
+    if dex.name == 'raydium' else dex
+    for dex in enabled_dexes(os.environ.get('DEXES', 'raydium'))
+]
+seen_signatures = SignatureDeduper(
+    capacity=int(os.environ.get('DEDUP_CAPACITY', 100_000)),
+    ttl=float(os.environ.get('DEDUP_TTL', 24 * 3600)),
+    state_file=os.environ.get('DEDUP_STATE_FILE') or None
+)
+
+logs_commitment = Commitment(os.environ.get('LOGS_COMMITMENT', Finalized).lower())
+if logs_commitment not in (Processed, Confirmed, Finalized):
+    raise ValueError(f'Invalid LOGS_COMMITMENT: {logs_commitment}')
+# get_transaction only serves confirmed or finalized transactions
+tx_commitment = Finalized if logs_commitment == Finalized else Confirmed
+fast_path = os.environ.get('FAST_PATH', 'false').lower() == 'true'
+# Metadata and mint lookups of concurrently processed pools share getMultipleAccounts requests
+account_batcher = AccountBatcher(
+    solana_client,
+    window=float(os.environ.get('ACCOUNT_BATCH_WINDOW', 0.02)),
+    max_batch=int(os.environ.get('ACCOUNT_BATCH_SIZE', 100)),
+    commitment=tx_commitment
+)
+# Holder concentration from getTokenLargestAccounts, the owners share the batcher's requests
+holder_analyzer = HolderAnalyzer(
+    solana_client,
+    account_batcher,
+    top_n=int(os.environ.get('HOLDERS_TOP_N', 10)),
+    # Owners that don't count as holders (exchanges, lockers...), on top of burn addresses
+    exclude=[Pubkey.from_string(owner.strip()) for owner in os.environ.get('HOLDERS_EXCLUDE', '').split(',') if owner.strip()],
+    commitment=tx_commitment
+)
+# Candidates surfaced from ray_log, waiting for their transaction to confirm: signature -> (detected at, InitLog)
+candidates = {}
 
 min_fdv = int(os.environ['MIN_FDV'])
-max_fdv = int(os.environ['MAX_FDV'])
+# 0 leaves the FDV uncapped
+max_fdv = int(os.environ.get('MAX_FDV') or 0)
 min_liq = int(os.environ['MIN_LIQ'])
 min_mc_to_liq = float(os.environ['MIN_MC_TO_LIQ'])
+# Largest share of supply the HOLDERS_TOP_N biggest holders may own, 0 disables
+max_top_holders_pct = float(os.environ.get('MAX_TOP_HOLDERS_PCT', 0))
+# Rules applied when FILTERS_FILE is unset, see filters.example.json for the file format.
+# Rules of the 'screen' stage decide which tokens are saved as unfiltered, the 'alert'
+# stage which of those are alerted
+default_filter_rules = [
+    {'name': 'serial_rugger', 'field': 'deployer_rugs', 'max': max_deployer_rugs - 1, 'enabled': max_deployer_rugs > 0},
+    {'name': 'ban_word', 'field': 'banned_word', 'equals': False},
+    {'name': 'fdv', 'field': 'fdv', 'min': min_fdv, 'max': max_fdv or None},
+    {'name': 'liquidity', 'field': 'liquidity', 'min': min_liq},
+    {'name': 'mc_to_liq', 'field': 'mc_to_liq', 'min': min_mc_to_liq},
+    {'name': 'top_holders', 'field': 'top_holders_pct', 'max': max_top_holders_pct, 'enabled': max_top_holders_pct > 0},
+    {'name': 'rugcheck', 'field': 'rugcheck_passed', 'equals': True, 'stage': 'alert'}
+]
+# Edits to the file are picked up without restarting, checked every FILTERS_RELOAD_INTERVAL seconds
+filters_file = os.environ.get('FILTERS_FILE') or None
+filters_reload_interval = float(os.environ.get('FILTERS_RELOAD_INTERVAL', 10))
+
+pipeline_workers = int(os.environ.get('PIPELINE_WORKERS', 4))
+pipeline_queue_size = int(os.environ.get('PIPELINE_QUEUE_SIZE', 100))
+pipeline_drain_timeout = float(os.environ.get('PIPELINE_DRAIN_TIMEOUT', 60))
+enrichment_timeout = float(os.environ.get('ENRICHMENT_TIMEOUT', 10))
+# Concentrated liquidity pools (raydium_clmm, meteora_dlmm) are created empty and funded by later
+# transactions, their vaults are read this many seconds after detection to value the liquidity
+concentrated_liquidity_delay = float(os.environ.get('CONCENTRATED_LIQUIDITY_DELAY', 10))
+definedfi_cross_check = os.environ.get('DEFINEDFI_CROSS_CHECK', 'false').lower() == 'true'
 
 rug_checker_url = os.environ['RUG_CHECKER_URL']
+rugcheck_service = RugcheckService(
+    rug_checker_url,
+    rate=float(os.environ.get('RUGCHECK_RATE', 2)),
+    burst=int(os.environ.get('RUGCHECK_BURST', 5)),
+    cache_ttl=float(os.environ.get('RUGCHECK_CACHE_TTL', 60)),
+    poll_interval=float(os.environ.get('RUGCHECK_POLL_INTERVAL', 5)),
+    poll_timeout=float(os.environ.get('RUGCHECK_POLL_TIMEOUT', 300)),
+    on_eligible=lambda *args: onTokenEligible(*args),
+    on_expired=lambda *args: onTokenExpired(*args)
+)
+# Hold alerts back until rugcheck reports the LP as locked, polled in the background
+wait_for_lp_lock = os.environ.get('WAIT_FOR_LP_LOCK', 'false').lower() == 'true'
+lp_lock_threshold = float(os.environ.get('LP_LOCK_THRESHOLD', 98.9))
+# Account updates are pushed over their own connection to SOLANA_WEBSOCKET_CLIENT, RPC
+# providers cap how many accounts one connection may subscribe to
+account_subscriptions = AccountSubscriptions(
+    websocket_client,
+    commitment=tx_commitment,
+    max_subscriptions=int(os.environ.get('ACCOUNT_SUBSCRIPTIONS_MAX', 5000))
+)
+# The LP of every new pool is followed on-chain until it is burnt/locked, withdrawn or
+# LP_WATCH_TIMEOUT passes; concentrated liquidity pools have no LP token and fall back to rugcheck
+lp_watch = os.environ.get('LP_WATCH', 'true').lower() == 'true'
+lp_watcher = LpLockWatcher(
+    account_subscriptions,
+    account_batcher,
+    threshold=lp_lock_threshold,
+    timeout=float(os.environ.get('LP_WATCH_TIMEOUT', 1800)),
+    # LP sent out of the deployer's account counts as locked, not only burnt LP. The destination
+    # isn't checked, a transfer to the deployer's own wallet passes too
+    count_transfers=os.environ.get('LP_COUNT_TRANSFERS', 'false').lower() == 'true',
+    on_locked=lambda watch: onLpLocked(watch),
+    on_removed=lambda watch: onLpRemoved(watch),
+    on_expired=lambda watch: onLpExpired(watch)
+) if lp_watch else None
+# Alerted pools stay followed for POOL_TRACKER_TTL seconds over the same connection, a follow-up
+# alert goes out if their liquidity is pulled or their price collapses
+pool_tracker = PoolTracker(
+    account_subscriptions,
+    account_batcher,
+    # Memory is preallocated: about 16 bytes per pool and sample
+    max_pools=int(os.environ.get('POOL_TRACKER_MAX_POOLS', 2000)),
+    history=int(os.environ.get('POOL_TRACKER_HISTORY', 256)),
+    ttl=float(os.environ.get('POOL_TRACKER_TTL', 3600)),
+    liquidity_drop_pct=float(os.environ.get('POOL_TRACKER_LIQUIDITY_DROP_PCT', 80)),
+    price_drop_pct=float(os.environ.get('POOL_TRACKER_PRICE_DROP_PCT', 90)),
+    on_event=lambda tracked, event, details: onPoolEvent(tracked, event, details)
+) if os.environ.get('POOL_TRACKER', 'true').lower() == 'true' else None
+# Follow-ups go to the alert chat unless set, keep them apart if a bot buys what is posted there
+pool_tracker_chat_id = os.environ.get('POOL_TRACKER_CHAT_ID') or None
+background_tasks = set()
 
 telegram_base_url = os.environ['TELEGRAM_BASE_URL']
 telegram_bot_token = os.environ['TELEGRAM_BOT_TOKEN']
 telegram_chat_id = os.environ['TELEGRAM_CHAT_ID']
-
-log_instruction = "initialize2"
-    
-logging.basicConfig(
-    filename=log_file_path, 
-    filemode='a', 
-    datefmt='%Y-%m-%d %I:%M:%S %p',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+telegram_dispatcher = TelegramDispatcher(
+    telegram_base_url,
+    telegram_bot_token,
+    telegram_chat_id,
+    rate=float(os.environ.get('TELEGRAM_RATE', 1)),
+    burst=int(os.environ.get('TELEGRAM_BURST', 3)),
+    coalesce_window=float(os.environ.get('TELEGRAM_COALESCE_WINDOW', 0)),
+    max_coalesce=int(os.environ.get('TELEGRAM_MAX_COALESCE', 5))
 )
 
-def get_token_supply(
-        transaction: GetTransactionResp
-) -> int:
-    
-    inner_instructions = transaction \
-        .value \
-        .transaction \
-        .meta \
-        .inner_instructions
-    
-    for instruction in inner_instructions:
-        filtered_instructions = instructions_with_program_id(instruction.instructions, TOKEN_PROGRAM_ID)
-        for filtered_instruction in filtered_instructions:
-            if filtered_instruction.parsed['type'] == 'mintTo':
-                return filtered_instruction.parsed['info']['amount']
-    return 0        
-
-def rugcheck(token_address: Pubkey):
-    print('Inside rugcheck')
-    url = rug_checker_url.replace('<token_address>', str(token_address))
+metrics_host = os.environ.get('METRICS_HOST', '127.0.0.1')
+# Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables it
+metrics_port = int(os.environ.get('METRICS_PORT', 9108))
+
+async def rugcheck(token_address: Pubkey):
+    console('Inside rugcheck')
     try:
-        res = requests.get(url=url)
-        if res.status_code == 200:
-            data: dict = res.json()
-            if data and ('error' not in data.keys()):
-                if ('risks' in data.keys()) and ('topHolders' in data.keys()):
-                    # lp_locked_perc = data['markets'][0]['lp']['lpLockedPct']
-                    # lp_locked = lp_locked_perc > 95
-                    # print(f'lpLocked percentage for {token_address}: {lp_locked_perc}%')
-                    # logging.info(f'lpLocked percentage for {token_address}: {lp_locked_perc}%')
-
-                    risks = [risk['name'] for risk in data['risks']]
-                    descriptions = [risk['description'] for risk in data['risks']]
-                    mint_authorithy = True if 'Mint Authority still enabled' in risks else False
-                    print(f'Risks for {token_address}: {descriptions}')
-
-                    top_holders = data['topHolders']
-                    top_holders_supply_pct = 0
-                    top_holders_addresses_with_supply = []
-                    for i in range(len(top_holders)):
-                        top_holders_addresses_with_supply.append(f"{top_holders[i]['owner']} - {top_holders[i]['pct']} %")
-                        if top_holders[i]['owner'] not in ['5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1', '11111111111111111111111111111111']:
-                            top_holders_supply_pct += top_holders[i]['pct']
-                    
-                    descriptions_to_str = ', '.join(descriptions)
-
-                    # if mint_authorithy:
-                    #     return False, '', None, ''
-
-                    return True, descriptions_to_str, top_holders_supply_pct, ', '.join(top_holders_addresses_with_supply)
-                else:
-                    print(f'Risks/top holders information unavailable for {token_address}, skipping...')
-                    logging.warning(f'Risks/top holders information unavailable for {token_address}, skipping...')
-                    return False, '', None, ''
-            else:
-                print(f'Failed to find metadata for {token_address}, skipping...')
-                logging.warning(f'Failed to find metadata for {token_address}, skipping...')
-                return False, '', None
-        else:
-            print(f'Rugcheck API call failed for {token_address} | code: {res.status_code}')
-            logging.warning(f'Rugcheck API call failed for {token_address} | code: {res.status_code}')
-            return False, '', None
+        data = await rugcheck_service.report(token_address)
     except Exception as e:
-        print(data)
-        print(f'Rugcheck error:', e)
+        console(f'Rugcheck error:', e)
+        logging.warning('Rugcheck error for %s: %s', token_address, e)
+        return False, '', None, ''
+    if not data:
+        console(f'Failed to find rugcheck report for {token_address}, skipping...')
+        return False, '', None, ''
+    if ('risks' in data.keys()) and ('topHolders' in data.keys()):
+        risks = [risk['name'] for risk in data['risks']]
+        descriptions = [risk['description'] for risk in data['risks']]
+        mint_authorithy = True if 'Mint Authority still enabled' in risks else False
+        console(f'Risks for {token_address}: {descriptions}')
+
+        top_holders = data['topHolders']
+        top_holders_supply_pct = 0
+        top_holders_addresses_with_supply = []
+        for i in range(len(top_holders)):
+            top_holders_addresses_with_supply.append(f"{top_holders[i]['owner']} - {top_holders[i]['pct']} %")
+            if top_holders[i]['owner'] not in ['5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1', '11111111111111111111111111111111']:
+                top_holders_supply_pct += top_holders[i]['pct']
+        
+        descriptions_to_str = ', '.join(descriptions)
+
+        # if mint_authorithy:
+        #     return False, '', None, ''
+
+        return True, descriptions_to_str, top_holders_supply_pct, ', '.join(top_holders_addresses_with_supply)
+    else:
+        console(f'Risks/top holders information unavailable for {token_address}, skipping...')
+        logging.warning('Risks/top holders information unavailable for %s, skipping...', token_address)
+        return False, '', None, ''
 
 # Sending contract address to a Telegram Channel
 # The channel is continuously scraped by a trading bot
 # The bot will parse the contract address and auto buy the token
 # Or just retrieve information about the token if auto buy is not activated
-def send_contract_to_tg(token_address: Pubkey, data: dict):
-    bot_token = telegram_bot_token
-    chat_id = telegram_chat_id
+async def send_contract_to_tg(token_address: Pubkey, data: dict):
     text = f"""
         ⏱️ timestamp: {data['timestamp']}
         📝 token_address: {token_address}
@@ -144,145 +288,414 @@ def send_contract_to_tg(token_address: Pubkey, data: dict):
         🗃️ top20 holders supply (excluding pool): {data['topHoldersSupplyPct']}
         👥 top20 holders: {data['topHolders']}
     """
-    url = f'{telegram_base_url}/bot{bot_token}/sendMessage?chat_id={chat_id}&text={text}'
-
-    res = requests.post(url=url)
-
-    if res.status_code == 200:
-        print('Token address sent to telegram for autobuy!')
-    else:
-        print('Failed to send token address to telegram for autobuy!', res.status_code)
+    # Sent in the background, the pool's processing doesn't wait for Telegram
+    if telegram_dispatcher.enqueue(text):
+        console('Token address queued for telegram for autobuy!')
 
 async def getTokensWithBackoff(signature: Signature):
     retries = 6  # Maximum number of retries
-    for i in range(retries):
-        try:
-            return await getTokens(signature)
-        except Exception as e:
-            print(f"Error: {e}. Retrying in {2**i} seconds...")
-            await asyncio.sleep(2**i)
-    raise Exception("Exceeded maximum retries. Unable to get tokens.")
+    started = time.perf_counter()
+    try:
+        for i in range(retries):
+            attempt_started = time.perf_counter()
+            try:
+                result = await getTokens(signature)
+                # Mostly the wait for the transaction to reach tx_commitment
+                metrics.observe('backoff_wait', attempt_started - started)
+                return result
+            except Exception as e:
+                metrics.inc('backoff_retries')
+                console(f"Error: {e}. Retrying in {2**i} seconds...")
+                await asyncio.sleep(2**i)
+        metrics.inc('backoff_exhausted')
+        raise Exception("Exceeded maximum retries. Unable to get tokens.")
+    finally:
+        candidates.pop(signature, None)
+
+def surfaceCandidate(value: RpcLogsResponse):
+    # Fast path: the ray_log line already carries the pool's opening amounts and decimals,
+    # so the pool is known before its transaction can be fetched
+    init_log = find_init_log(value.logs)
+    if init_log is None:
+        return
+    candidates[value.signature] = (time.monotonic(), init_log)
+    console(f"{datetime.now().strftime('%I:%M:%S %p')} - CANDIDATE POOL ({logs_commitment}) {value.signature}: {init_log}, price={init_log.price}")
+    logging.info('Candidate pool (%s) %s: %s, price=%s', logs_commitment, value.signature, init_log, init_log.price,
+                 extra={'signature': str(value.signature)})
 
 async def getTokens(signature: Signature):
     # signature = Signature.from_string(str_signature)
-    transaction = solana_client.get_transaction(
-        signature, encoding="jsonParsed", max_supported_transaction_version=0)
-    instruction_list = transaction.value.transaction.transaction.message.instructions
-    for instructions in instruction_list:
-        if instructions.program_id == Pubkey.from_string(RaydiumLPV4):
-            print("==================== NEW POOL DETECTED ====================")
-            PairId = instructions.accounts[4]
-            Token0 = instructions.accounts[8]
-            Token1 = instructions.accounts[9]
-            deployer = instructions.accounts[17]
-            
-            data = {'Token_Index': ['Token0', 'Token1', 'PairId'],
-                    'Account Public Key': [Token0, Token1, PairId]}
-
-            table = tabulate(data, headers='keys', tablefmt='fancy_grid')
-            print(table)
-            token_address = Token0 if str(Token0) not in sol_address else Token1
-
-            token_info = get_metadata(solana_client, token_address, 'raydium')
-            # total_supply = get_token_supply(transaction)
-            total_supply = solana_client.get_token_supply(token_address).value.ui_amount_string
-            token_info['totalSupply'] = total_supply
-            token_info['creatorAddress'] = str(deployer)
-            # token_info['pairAddress'] = str(PairId)
-            # sol_price = get_pyth_solana_price()
-            # token_info = _getTokenInfo(token_address=str(token_address))
-            print(f"{datetime.now().strftime('%I:%M:%S %p')} - Token Info for {token_address}: {token_info}")
-            logging.info(f'Token Info for {token_address}: {token_info}')
-            name_checks_out = contains_word_from_list(token_info['symbol'], token_info['name'])
-
-            if not name_checks_out and len(token_info) > 0:
-                now = datetime.now()
-                today = now.strftime('%Y-%m-%d')
-                result = {'timestamp': now, 'address': str(token_address)}
-                result.update(token_info)
-                quote_token = 'token0' if Token0 != RaydiumLPV4 else 'token1'
-                token_metadata = _getPairMetadata(pair_address=str(PairId), quote_token=quote_token)
-                price = float(token_metadata['price']) if token_metadata['price'] else 0.0
-                total_supply =  float(token_info['totalSupply']) if token_info['totalSupply'] else 0.0
-                token_metadata['fdv'] = price * total_supply
-                liquidity = float(token_metadata['liquidity']) if token_metadata['liquidity'] else 0.0
-                result.update(token_metadata)
-
-                print(f"{now.strftime('%I:%M:%S %p')} - Token Metadata for {token_address}: {token_metadata}")
-                logging.info(f'Token Metadata for {token_address}: {token_metadata}')
-                
-                if (min_fdv <= token_metadata['fdv']):
-                    if (liquidity >= min_liq):
-                        mc_to_liq = result['fdv'] / liquidity
-                        if mc_to_liq >= min_mc_to_liq:
-                            file_path = f'{unfiltered_data_path}/token_addresses_unfiltered_{today}.csv'
-                            # await asyncio.sleep(2)
-                            save_token_address(result, file_path)
-                            logging.info(f"Token address {token_address} created at {now} and saved to token_address_unfiltered_{today}.csv")
-                            print(f"Token address {token_address} created at {now} and saved to token_address_unfiltered_{today}.csv")
-
-                            check, risks, top_holders_supply_pct, top_holders_addresses_with_supply = rugcheck(token_address=token_address)
-                            if check:
-                                result.update({'risks': risks, 'topHoldersSupplyPct': f'{top_holders_supply_pct}%', 'topHolders': top_holders_addresses_with_supply})
-                                send_contract_to_tg(token_address=token_address, data=result)
-                                file_path = f'{filtered_data_path}/token_addresses_filtered_{today}.csv'
-                                save_token_address(result, file_path)
-                                logging.info(f"Token address {token_address} created at {now} and saved to token_address_filtered_{today}.csv")
-                                print(f"Token address {token_address} created at {now} and saved to token_address_filtered_{today}.csv")
-                            else:
-                                logging.warning(f'Skipping {token_address} because rugcheck failed')
-                                print(f'Skipping {token_address} because rugcheck failed')
-                        else:
-                            logging.warning(f"Skipping {token_address} because mc_to_liq={mc_to_liq} is too LOW")
-                            print(f"Skipping {token_address} because mc_to_liq={mc_to_liq} is too LOW")
-                    else:
-                        logging.warning(f"Skipping {token_address} because liquidity={liquidity} is too LOW")
-                        print(f"Skipping {token_address} because liquidity={liquidity} is too LOW")
-                else:
-                    # less_than_2000 = min_fdv >= token_metadata['fdv']
-                    logging.warning(f"Skipping {token_address} because FDV={token_metadata['fdv']} is too LOW")
-                    print(f"Skipping {token_address} because FDV={token_metadata['fdv']} is too LOW")
-
-            break
-
-async def run():
-    while True:
-        try:
-            async for websocket in connect(websocket_client, ping_interval=None, ssl=ssl.SSLContext(ssl.PROTOCOL_TLS)):
-                subscription_id = await subscribe_to_logs(
-                    websocket,
-                    RpcTransactionLogsFilterMentions(Pubkey.from_string(RaydiumLPV4)),
-                    Finalized
-                )
-                print("Subscription successful. Subscription ID:", subscription_id)
-                logging.info(f"Subscription successful. Subscription ID: {subscription_id}")
-
-                async for signature in process_messages(websocket, log_instruction):  # type: ignore
-                    if signature not in seen_signatures:
-                        seen_signatures.add(signature)
-                        logging.info(f"{datetime.now()} - Tx: https://solscan.io/tx/{signature}")
-                        print(f"{datetime.now()} - Tx: https://solscan.io/tx/{signature}")
-                        await getTokensWithBackoff(signature)
-                    else:
-                        pass
-        except (ProtocolError, ConnectionClosedError, ConnectionClosed) as err:
-            # Restart socket connection if ProtocolError: invalid status code
-            logging.error(err)  
-            print(f"Danger!", err)
-            continue
-
-        except KeyboardInterrupt:
-            print('User exited the program bye!')
-            if websocket:
-                await websocket.logs_unsubscribe(subscription_id)
-                exit()
-            
-        except Exception as e:
-            logging.error(f'Error exception triggered')
-            print(e)
+    with metrics.timer('rpc.get_transaction'):
+        transaction = await solana_client.get_transaction(
+            signature, encoding="jsonParsed", commitment=tx_commitment, max_supported_transaction_version=0)
+    if transaction.value is None:
+        raise Exception(f'Transaction {signature} is not {tx_commitment} yet')
+    if signature in candidates:
+        detected_at, _ = candidates[signature]
+        logging.info('Candidate %s %s %.2fs after being surfaced', signature, tx_commitment, time.monotonic() - detected_at)
+    with metrics.timer('decode'):
+        found = find_pool(transaction, dexes)
+    if found is None:
+        return
+    dex, pool = found
+    console("==================== NEW POOL DETECTED ====================")
+    metrics.inc('pools_detected', dex=dex.name)
+
+    data = {'Token_Index': ['Dex', 'Token', 'Quote', 'PairId'],
+            'Account Public Key': [dex.name, pool.base_mint, pool.quote_mint, pool.pair]}
+
+    table = tabulate(data, headers='keys', tablefmt='fancy_grid')
+    console(table)
+    token_address = pool.base_mint
+    pool_index.record_pool(pool, signature, dex=dex.name)
+    if lp_watcher:
+        # Every pool is followed, whatever the filters decide its lock time goes to the deployer's record
+        runInBackground(lp_watcher.watch(pool))
+
+    # Nothing is fetched yet: a lookup starts when the first rule needing it runs, and the
+    # cheapest rules run first, so a token rejected early never costs the expensive calls
+    enrichment = Enrichment(token_address, default_timeout=enrichment_timeout)
+    enrichment.add('names', lambda: get_onchain_metadata(account_batcher, token_address))
+    enrichment.add('metadata', lambda: get_metadata(account_batcher, token_address, dex.metadata_type))
+    enrichment.add('mint', lambda: account_batcher.get_mint(token_address))
+    enrichment.add('holders', lambda: holder_analyzer.analyze(pool))
+    enrichment.add('solPrice', get_pyth_solana_price)
+    enrichment.add('pairMetadata', lambda: _getPairMetadata(pair_address=str(pool.pair), quote_token='token0'))
+    enrichment.add('rugcheck', lambda: rugcheck(token_address=token_address))
+    if pool.initial_price is not None:
+        enrichment.add('reserves', lambda: readReserves(pool), timeout=concentrated_liquidity_delay + enrichment_timeout)
+    try:
+        with metrics.timer('filter'):
+            await filterToken(Facts(filter_engine.fields, pool, enrichment))
+    finally:
+        enrichment.cancel()
+
+async def readReserves(pool: DecodedPool) -> Optional[DecodedPool]:
+    """The pool with the reserves its vaults hold once liquidity had time to be added."""
+    await asyncio.sleep(concentrated_liquidity_delay)
+    base_vault, quote_vault = await asyncio.gather(account_batcher.get_account(pool.base_vault),
+                                                   account_batcher.get_account(pool.quote_vault))
+    if base_vault is None or quote_vault is None:
+        return None
+    return replace(pool, base_reserve=token_account_amount(base_vault) or 0, quote_reserve=token_account_amount(quote_vault) or 0)
+
+async def poolMetadata(enrichment: Enrichment, pool: DecodedPool):
+    """Price and liquidity in USD, valued from the decoded reserves when the pool is quoted in SOL."""
+    decoded = None
+    if pool.initial_price is not None:
+        # Concentrated liquidity: the creation transaction holds no reserves, the vaults do later
+        pool = await enrichment.get('reserves')
+        if pool is None:
+            return None
+    if pool.quote_mint == WSOL_MINT:
+        sol_price = await enrichment.get('solPrice')
+        if sol_price:
+            decoded = {
+                'pairAddress': str(pool.pair),
+                'price': pool.price * sol_price,
+                'liquidity': pool.liquidity * sol_price,
+            }
+
+    if definedfi_cross_check or decoded is None:
+        defined = await enrichment.get('pairMetadata')
+        if decoded is None:
+            return defined
+        if defined:
+            logging.info('definedfi cross-check for %s: decoded=%s definedfi=%s', pool.base_mint, decoded, defined)
+    return decoded
+
+def marketLookups(pool: DecodedPool):
+    # definedfi is only a fallback for SOL pools, unless cross-checking
+    reserves = ('reserves',) if pool.initial_price is not None else ()
+    if pool.quote_mint != WSOL_MINT:
+        return reserves + ('pairMetadata',)
+    return reserves + (('solPrice', 'pairMetadata') if definedfi_cross_check else ('solPrice',))
+
+def deployerRugs(facts: Facts):
+    deployer = pool_index.deployer(facts.pool.deployer)
+    return deployer.rugs if deployer else 0
+
+def tokenSupply(facts: Facts, *mint):
+    if facts.pool.base_supply_ui is not None:
+        return facts.pool.base_supply_ui
+    return mint[0].supply_ui
+
+# What rules can test, and the lookups (or other fields) each is computed from
+filter_fields = [
+    Field('deployer_rugs', (), deployerRugs),
+    Field('banned_word', ('names',), lambda facts, names: contains_word_from_list(names.symbol, names.name)),
+    Field('market', marketLookups, lambda facts, *_: poolMetadata(facts.enrichment, facts.pool), optional=True),
+    Field('price', ('market',), lambda facts, market: float(market['price']) if market['price'] else 0.0),
+    Field('liquidity', ('market',), lambda facts, market: float(market['liquidity']) if market['liquidity'] else 0.0),
+    Field('supply', lambda pool: () if pool.base_supply_ui is not None else ('mint',), tokenSupply),
+    Field('fdv', ('price', 'supply'), lambda facts, price, supply: price * supply),
+    Field('mc_to_liq', ('fdv', 'liquidity'), lambda facts, fdv, liquidity: fdv / liquidity if liquidity else None),
+    Field('mint_authority', ('mint',), lambda facts, mint: mint.mint_authority is not None),
+    Field('freeze_authority', ('mint',), lambda facts, mint: mint.freeze_authority is not None),
+    Field('rugcheck_passed', ('rugcheck',), lambda facts, result: result[0]),
+    Field('top_holders_pct', ('holders',), lambda facts, holders: holders.top_n_pct),
+    Field('holders_gini', ('holders',), lambda facts, holders: holders.gini),
+    Field('holders_hhi', ('holders',), lambda facts, holders: holders.hhi),
+    Field('deployer_pct', ('holders',), lambda facts, holders: holders.deployer_pct),
+    Field('rugcheck_top_holders_pct', ('rugcheck',), lambda facts, result: result[2])
+]
+filter_engine = FilterEngine(filter_fields, default_filter_rules, path=filters_file, reload_interval=filters_reload_interval)
+
+def skipToken(pool: DecodedPool, rejection: Rejection):
+    pool_index.update(pool.pair, status=rejection.reason)
+    metrics.inc('filtered', reason=rejection.reason)
+    logging.warning('Skipping %s because %s', pool.base_mint, rejection.describe())
+    console(f'Skipping {pool.base_mint} because {rejection.describe()}')
+
+async def filterToken(facts: Facts):
+    pool, enrichment = facts.pool, facts.enrichment
+    token_address = pool.base_mint
+    rejection = await filter_engine.evaluate(facts, 'screen')
+    if rejection:
+        return skipToken(pool, rejection)
+    # Whatever the alert stage decides, a token that made it here is saved and its alert
+    # shows holders and risks, fetch the rest at once
+    for name in ('metadata', 'mint', 'holders', 'rugcheck'):
+        enrichment.start(name)
+
+    token_info = await enrichment.get('metadata')
+    if not token_info:
+        metrics.inc('filtered', reason='metadata_unavailable')
+        logging.warning('Skipping %s because token metadata is unavailable', token_address)
+        console(f'Skipping {token_address} because token metadata is unavailable')
+        return
+
+    mint = await enrichment.get('mint')
+    if mint and (mint.mint_authority or mint.freeze_authority):
+        logging.warning('%s still has mint authority=%s, freeze authority=%s', token_address, mint.mint_authority, mint.freeze_authority)
+    total_supply = await facts.get('supply')
+    token_info['totalSupply'] = str(total_supply) if total_supply is not None else ''
+    token_info['creatorAddress'] = str(pool.deployer)
+    # The dict is only turned into text if it is printed / logged
+    console(f"{datetime.now().strftime('%I:%M:%S %p')} - Token Info for {token_address}:", token_info)
+    logging.info('Token Info for %s: %s', token_address, token_info, extra={'token': str(token_address), 'token_info': token_info})
+
+    market = await facts.get('market')
+    if not market:
+        metrics.inc('filtered', reason='pair_metadata_unavailable')
+        logging.warning('Skipping %s because pair metadata is unavailable', token_address)
+        console(f'Skipping {token_address} because pair metadata is unavailable')
+        return
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    result = {'timestamp': now, 'address': str(token_address)}
+    result.update(token_info)
+    token_metadata = dict(market, fdv=await facts.get('fdv') or 0.0)
+    result.update(token_metadata)
+    console(f"{now.strftime('%I:%M:%S %p')} - Token Metadata for {token_address}:", token_metadata)
+    logging.info('Token Metadata for %s: %s', token_address, token_metadata,
+                 extra={'token': str(token_address), 'token_metadata': token_metadata})
+
+    unfiltered_sink.add(result)
+    metrics.inc('passed_filters')
+    pool_index.update(pool.pair, symbol=result['symbol'], name=result['name'], price=await facts.get('price'),
+                      liquidity=await facts.get('liquidity'), fdv=result['fdv'], status='unfiltered')
+    logging.info('Token address %s created at %s and saved to token_address_unfiltered_%s.csv', token_address, now, today)
+    console(f"Token address {token_address} created at {now} and saved to token_address_unfiltered_{today}.csv")
+
+    rejection = await filter_engine.evaluate(facts, 'alert')
+    if rejection:
+        return skipToken(pool, rejection)
+    # The alert carries the rugcheck findings even when no rule looks at them
+    _, risks, top_holders_supply_pct, top_holders_addresses_with_supply = await enrichment.get('rugcheck') or (False, '', None, '')
+    holders = await enrichment.get('holders')
+    if holders:
+        # On-chain holders, rugcheck's only serve when they couldn't be read
+        top_holders_supply_pct = round(holders.top_pct, 2)
+        top_holders_addresses_with_supply = ', '.join(f'{owner} - {pct:.2f} %' for owner, pct in holders.top_holders)
+    result.update({'risks': risks, 'topHoldersSupplyPct': f'{top_holders_supply_pct}%', 'topHolders': top_holders_addresses_with_supply})
+    watch = await lp_watcher.watch(pool) if wait_for_lp_lock and lp_watcher else None
+    if watch is not None:
+        if watch.outcome is None:
+            # Alerted from onLpLocked, the worker moves on meanwhile
+            watch.context = (pool, result)
+            pool_index.update(pool.pair, status='waiting_lp_lock')
+            logging.info('Waiting for %s LP to be locked (burnt %.1f%%, moved %.1f%%)', token_address, watch.burned_pct, watch.moved_pct)
+            console(f'Waiting for {token_address} LP to be locked (burnt {watch.burned_pct:.1f}%, moved {watch.moved_pct:.1f}%)')
+        elif watch.outcome == 'locked':
+            await alertToken(pool, result)
+        else:
+            pool_index.update(pool.pair, status=f'lp_{watch.outcome}')
+            metrics.inc('filtered', reason=f'lp_{watch.outcome}')
+            logging.warning('Skipping %s because its LP was %s', token_address, watch.outcome)
+            console(f'Skipping {token_address} because its LP was {watch.outcome}')
+        return
+    # No LP token to follow, rugcheck tells whether the LP is locked
+    report = await rugcheck_service.report(token_address) if wait_for_lp_lock else None
+    if wait_for_lp_lock and not (report and lp_locked(lp_lock_threshold)(report)):
+        # Alerted from onTokenEligible once the LP is locked, the worker moves on meanwhile
+        rugcheck_service.watch(token_address, lp_locked(lp_lock_threshold), context=(pool, result))
+        pool_index.update(pool.pair, status='waiting_lp_lock')
+        logging.info('Waiting for %s LP to be locked (currently %s%%)', token_address, lp_locked_pct(report))
+        console(f'Waiting for {token_address} LP to be locked (currently {lp_locked_pct(report)}%)')
+    else:
+        await alertToken(pool, result)
+
+async def alertToken(pool: DecodedPool, result: dict):
+    token_address = pool.base_mint
+    today = result['timestamp'].strftime('%Y-%m-%d')
+    await send_contract_to_tg(token_address=token_address, data=result)
+    metrics.inc('alerted')
+    filtered_sink.add(result)
+    pool_index.update(pool.pair, status='alerted')
+    if pool_tracker:
+        runInBackground(pool_tracker.track(pool, context=result))
+    logging.info('Token address %s created at %s and saved to token_address_filtered_%s.csv', token_address, result['timestamp'], today)
+    console(f"Token address {token_address} created at {result['timestamp']} and saved to token_address_filtered_{today}.csv")
+
+async def onTokenEligible(token_address: str, report: dict, waited: float, context):
+    pool, result = context
+    logging.info('LP of %s locked (%s%%) %.1fs after the pool passed the filters', token_address, lp_locked_pct(report), waited)
+    console(f'LP of {token_address} locked ({lp_locked_pct(report)}%) {waited:.1f}s after the pool passed the filters')
+    await alertToken(pool, result)
+
+def onTokenExpired(token_address: str, context):
+    pool, _ = context
+    pool_index.update(pool.pair, status='lp_unlocked')
+    metrics.inc('filtered', reason='lp_unlocked')
+    logging.warning('Skipping %s because its LP was not locked within %ss', token_address, rugcheck_service.poll_timeout)
+    console(f'Skipping {token_address} because its LP was not locked within {rugcheck_service.poll_timeout}s')
+
+async def onLpLocked(watch: LpWatch):
+    pool = watch.pool
+    pool_index.update(pool.pair, lp_locked_after=round(watch.waited, 1), lp_locked_pct=round(watch.burned_pct + watch.moved_pct, 1))
+    logging.info('LP of %s locked (burnt %.1f%%, moved %.1f%%) %.1fs after the pool was detected',
+                 pool.base_mint, watch.burned_pct, watch.moved_pct, watch.waited)
+    if watch.context:
+        console(f'LP of {pool.base_mint} locked (burnt {watch.burned_pct:.1f}%, moved {watch.moved_pct:.1f}%) {watch.waited:.1f}s after the pool was detected')
+        await alertToken(*watch.context)
+
+def onLpRemoved(watch: LpWatch):
+    pool = watch.pool
+    pool_index.update(pool.pair, status='lp_removed')
+    pool_index.mark_outcome(pool.pair, 'rugged', deployer=pool.deployer)
+    logging.warning('Liquidity of %s removed %.1fs after the pool was detected, deployer %s', pool.base_mint, watch.waited, pool.deployer)
+    if watch.context:
+        metrics.inc('filtered', reason='lp_removed')
+        console(f'Skipping {pool.base_mint} because its liquidity was removed')
+
+def onLpExpired(watch: LpWatch):
+    if not watch.context:
+        return
+    pool = watch.pool
+    pool_index.update(pool.pair, status='lp_unlocked')
+    metrics.inc('filtered', reason='lp_unlocked')
+    logging.warning('Skipping %s because its LP was not locked within %ss', pool.base_mint, lp_watcher.timeout)
+    console(f'Skipping {pool.base_mint} because its LP was not locked within {lp_watcher.timeout}s')
+
+def onPoolEvent(tracked: TrackedPool, event: str, details: dict):
+    pool = tracked.pool
+    if event == LIQUIDITY_REMOVED:
+        pool_index.update(pool.pair, status='lp_removed')
+        pool_index.mark_outcome(pool.pair, 'rugged', deployer=pool.deployer)
+    text = f"""
+        🚨 {event.replace('_', ' ')}: {pool.base_mint}
+        💠 symbol: {tracked.context['symbol'] if tracked.context else ''}
+        📉 drop from peak: {details['drop_pct']}%
+        ⏱️ after: {details['after']:.0f}s
+        💲 price change since alert: {details['price_change_pct']}%
+        💰 liquidity left: {details['liquidity']:.2f} (quote)
+    """
+    telegram_dispatcher.enqueue(text, chat_id=pool_tracker_chat_id)
+    logging.warning('%s %s %.0fs after the alert (%s%% from peak)', pool.base_mint, event, details['after'], details['drop_pct'])
+    console(f"{pool.base_mint} {event.replace('_', ' ')} {details['after']:.0f}s after the alert ({details['drop_pct']}% from peak)")
+
+def runInBackground(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def submitSignature(pipeline: PoolPipeline, signature: Signature, value: Optional[RpcLogsResponse]):
+    logging.info('Tx: https://solscan.io/tx/%s', signature, extra={'signature': str(signature)})
+    console(f"{datetime.now()} - Tx: https://solscan.io/tx/{signature}")
+    if recorder:
+        recorder.record_ws(signature, value)
+    if fast_path and value is not None:
+        surfaceCandidate(value)
+    # Blocks while the queue is full so a burst can't outrun the workers
+    await pipeline.submit(signature)
+
+async def run(pipeline: PoolPipeline):
+    async def on_signature(signature: Signature, value: Optional[RpcLogsResponse]):
+        await submitSignature(pipeline, signature, value)
+
+    listener = MultiEndpointListener(
+        websocket_clients,
+        dexes,
+        logs_commitment,
+        seen_signatures,
+        on_signature,
+        rpc_client=solana_client
+    )
+    await listener.run()
 
 async def main():
-    await run()
+    pipeline = PoolPipeline(
+        getTokensWithBackoff,
+        workers=pipeline_workers,
+        queue_size=pipeline_queue_size
+    )
+    pipeline.start()
+    unfiltered_sink.start()
+    filtered_sink.start()
+    await pool_index.start()
+    metrics.gauge('pipeline_queue_depth', lambda: pipeline.depth)
+    metrics.gauge('rugcheck_pending', lambda: rugcheck_service.pending)
+    metrics.gauge('telegram_queued', lambda: telegram_dispatcher.depth)
+    metrics.gauge('lp_watch_pending', lambda: lp_watcher.pending if lp_watcher else 0)
+    metrics.gauge('account_subscriptions', lambda: len(account_subscriptions))
+    metrics.gauge('pools_tracked', lambda: len(pool_tracker) if pool_tracker else 0)
+    subscriptions = asyncio.create_task(account_subscriptions.run(), name='account-subscriptions') if lp_watcher or pool_tracker else None
+    tracker_sweeper = asyncio.create_task(pool_tracker.run(), name='pool-tracker') if pool_tracker else None
+    dedup_saver = asyncio.create_task(seen_signatures.run(), name='dedup-saver') if seen_signatures.state_file else None
+    if pool_tracker:
+        logging.info(f'Pool tracker: up to {pool_tracker.max_pools} pools, {pool_tracker.nbytes / 2 ** 20:.1f} MiB')
+    metrics_server = await metrics.start_server(metrics_host, metrics_port) if metrics_port else None
+    try:
+        await run(pipeline)
+    finally:
+        if metrics_server:
+            metrics_server.close()
+        console(f'Shutting down, draining {pipeline.depth} queued pool(s)...')
+        await pipeline.drain(timeout=pipeline_drain_timeout)
+        for task in (subscriptions, tracker_sweeper, dedup_saver):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if lp_watcher:
+            await lp_watcher.close()
+        if pool_tracker:
+            await pool_tracker.close()
+        await unfiltered_sink.close()
+        await filtered_sink.close()
+        await rugcheck_service.close()
+        await telegram_dispatcher.close()
+        await pool_index.close()
+        await close_clients()
+        seen_signatures.close()
+        if recorder:
+            recorder.close()
+        logging.info(f'Account batcher stats: {account_batcher.stats()}')
+        logging.info(f'Rugcheck stats: {rugcheck_service.stats()}')
+        logging.info(f'definedfi stats: {definedfi.client.stats()}')
+        logging.info(f'Telegram stats: {telegram_dispatcher.stats()}')
+        if lp_watcher:
+            logging.info(f'LP watch stats: {lp_watcher.stats()}, account subscriptions: {account_subscriptions.stats()}')
+        if pool_tracker:
+            logging.info(f'Pool tracker stats: {pool_tracker.stats()}')
+        logging.info(f'Filter stats: {filter_engine.stats()}')
+        logging.info('Stage latencies:\n' + metrics.format_summary())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        console('User exited the program bye!')
@@ -0,0 +1,130 @@
+import struct
+import asyncio
+
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from solana.rpc.commitment import Commitment, Confirmed
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from account_batcher import AccountBatcher
+from tx_decoder import DecodedPool
+import metrics
+
+# SPL token account: mint, owner, amount (Token-2022 accounts start the same way)
+TOKEN_ACCOUNT_LAYOUT = struct.Struct('<32s32sQ')
+
+# Tokens sent to these owners can never be sold
+BURN_OWNERS = frozenset(Pubkey.from_string(address) for address in (
+    '11111111111111111111111111111111',
+    '1nc1nerator11111111111111111111111111111111'
+))
+
+def token_account_owner(data: bytes) -> Optional[Pubkey]:
+    if len(data) < TOKEN_ACCOUNT_LAYOUT.size:
+        return None
+    _, owner, _ = TOKEN_ACCOUNT_LAYOUT.unpack_from(data)
+    return Pubkey.from_bytes(owner)
+
+def concentration(amounts: np.ndarray, supply: float, top_n: int = 10) -> Tuple[float, float, float, float]:
+    """Share of `supply` held by all of `amounts` and by the `top_n` largest (in %), the Gini
+    coefficient of `amounts` and the Herfindahl-Hirschman index of their shares of supply."""
+    total = float(amounts.sum())
+    if amounts.size == 0 or total <= 0 or supply <= 0:
+        return 0.0, 0.0, 0.0, 0.0
+    ascending = np.sort(amounts)
+    shares = ascending[::-1] / supply
+    n = ascending.size
+    gini = float(2 * (np.arange(1, n + 1) @ ascending) / (n * total) - (n + 1) / n)
+    return float(shares.sum() * 100), float(shares[:top_n].sum() * 100), gini, float(shares @ shares)
+
+class HolderStats:
+    __slots__ = ('holders', 'top_pct', 'top_n_pct', 'gini', 'hhi', 'deployer_pct', 'excluded_pct', 'top_holders')
+
+    def __init__(self, holders: int, top_pct: float, top_n_pct: float, gini: float, hhi: float,
+                 deployer_pct: float, excluded_pct: float, top_holders: List[Tuple[str, float]]):
+        self.holders = holders
+        self.top_pct = top_pct
+        self.top_n_pct = top_n_pct
+        self.gini = gini
+        self.hhi = hhi
+        self.deployer_pct = deployer_pct
+        self.excluded_pct = excluded_pct
+        # (owner, % of supply), largest first
+        self.top_holders = top_holders
+
+    def __repr__(self):
+        return (f'HolderStats(holders={self.holders}, top_pct={self.top_pct:.2f}, top_n_pct={self.top_n_pct:.2f}, '
+                f'gini={self.gini:.3f}, hhi={self.hhi:.4f}, deployer_pct={self.deployer_pct:.2f}, '
+                f'excluded_pct={self.excluded_pct:.2f})')
+
+class HolderAnalyzer:
+    """Holder concentration of a new token, from on-chain data only.
+
+    getTokenLargestAccounts gives the (up to 20) largest token accounts; their owners,
+    and the mint's supply when the pool doesn't carry it, are read through the account
+    batcher in a single getMultipleAccounts. The pool's vaults and accounts owned by a
+    burn address or one of `exclude` are left out, the rest is aggregated per owner
+    and measured with `concentration`. Accounts owned by the pool's deployer make up
+    `deployer_pct`.
+    """
+
+    def __init__(self,
+                 client,
+                 batcher: AccountBatcher,
+                 top_n: int = 10,
+                 exclude: Iterable[Pubkey] = (),
+                 commitment: Commitment = Confirmed):
+        self.client = client
+        self.batcher = batcher
+        self.top_n = top_n
+        self.exclude = BURN_OWNERS | frozenset(exclude)
+        self.commitment = commitment
+
+    async def _supply(self, pool: DecodedPool) -> Optional[int]:
+        if pool.base_supply is not None:
+            return pool.base_supply
+        mint = await self.batcher.get_mint(pool.base_mint)
+        return mint.supply if mint else None
+
+    async def analyze(self, pool: DecodedPool) -> Optional[HolderStats]:
+        with metrics.timer('rpc.largest_accounts'):
+            resp = await self.client.get_token_largest_accounts(pool.base_mint, commitment=self.commitment)
+        balances = resp.value
+        if not balances:
+            return None
+        addresses = [balance.address for balance in balances]
+        accounts, supply = await asyncio.gather(
+            asyncio.gather(*(self.batcher.get_account(address) for address in addresses)),
+            self._supply(pool)
+        )
+        if not supply:
+            return None
+
+        # A closed account has no owner left, count it as its own holder
+        owners = [token_account_owner(account.data) if account is not None else None for account in accounts]
+        owners = [owner or address for owner, address in zip(owners, addresses)]
+        amounts = np.fromiter((int(balance.amount.amount) for balance in balances), dtype=np.float64, count=len(balances))
+        vaults = {pool.base_vault, pool.quote_vault}
+        excluded = np.fromiter((address in vaults or owner in self.exclude for address, owner in zip(addresses, owners)),
+                               dtype=bool, count=len(owners))
+        deployer = np.fromiter((owner == pool.deployer for owner in owners), dtype=bool, count=len(owners))
+
+        kept = ~excluded
+        owner_ids, per_account = np.unique([str(owner) for owner in owners], return_inverse=True)
+        per_owner = np.bincount(per_account[kept], weights=amounts[kept], minlength=owner_ids.size)
+        held = per_owner > 0
+        top_pct, top_n_pct, gini, hhi = concentration(per_owner[held], supply, self.top_n)
+        order = np.argsort(per_owner)[::-1][:held.sum()]
+        return HolderStats(
+            holders=int(held.sum()),
+            top_pct=top_pct,
+            top_n_pct=top_n_pct,
+            gini=gini,
+            hhi=hhi,
+            deployer_pct=float(amounts[deployer & kept].sum() / supply * 100),
+            excluded_pct=float(amounts[excluded].sum() / supply * 100),
+            top_holders=[(str(owner_ids[i]), float(per_owner[i] / supply * 100)) for i in order]
+        )
@@ -0,0 +1,210 @@
+import ssl
+import time
+import asyncio
+import logging
+import statistics
+
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from websockets.exceptions import ConnectionClosed, ProtocolError
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed, Finalized
+from solana.rpc.websocket_api import connect
+
+from solders.signature import Signature  # type: ignore
+from solders.rpc.config import RpcTransactionLogsFilterMentions # type: ignore
+from solders.rpc.responses import LogsNotification, RpcLogsResponse, SubscriptionResult # type: ignore
+
+from dedup import SignatureDeduper
+from dexes import Dex
+from log_config import console
+import metrics
+
+SignatureHandler = Callable[[Signature, Optional[RpcLogsResponse]], Awaitable[None]]
+
+class EndpointStats:
+    def __init__(self, endpoint: str, window: int = 1000):
+        self.endpoint = endpoint
+        # Endpoint URLs often carry an API key, metrics only get the host
+        self.label = urlsplit(endpoint).hostname or endpoint
+        self.notifications = 0
+        self.first_arrivals = 0
+        self.reconnects = 0
+        # How far behind the first endpoint each notification arrived, in seconds
+        self.lags = deque(maxlen=window)
+
+    def summary(self) -> dict:
+        lags = sorted(self.lags)
+        return {
+            'endpoint': self.endpoint,
+            'notifications': self.notifications,
+            'firstArrivals': self.first_arrivals,
+            'firstArrivalPct': round(100 * self.first_arrivals / self.notifications, 1) if self.notifications else 0.0,
+            'lagMeanMs': round(1000 * statistics.fmean(lags), 1) if lags else None,
+            'lagP95Ms': round(1000 * lags[int(0.95 * (len(lags) - 1))], 1) if lags else None,
+            'reconnects': self.reconnects
+        }
+
+class MultiEndpointListener:
+    """Subscribes to the logs of every DEX in `dexes` on several websocket endpoints at once.
+
+    Each connection carries one logs subscription per DEX and notifications are routed
+    to their DEX by subscription id, to be checked against its log markers. Each
+    signature is handed to `on_signature` once, by whichever endpoint delivers it first.
+    When an endpoint reconnects, signatures of the DEXes' backfill addresses from the
+    last slot seen on are fetched and fed through the same deduplication.
+    """
+
+    def __init__(self,
+                 endpoints: List[str],
+                 dexes: List[Dex],
+                 commitment: Commitment,
+                 deduper: SignatureDeduper,
+                 on_signature: SignatureHandler,
+                 rpc_client: Optional[AsyncClient] = None,
+                 backfill_limit: int = 1000,
+                 stats_interval: float = 300.0):
+        self.endpoints = endpoints
+        self.dexes = dexes
+        self.commitment = commitment
+        self.deduper = deduper
+        self.on_signature = on_signature
+        self.rpc_client = rpc_client
+        self.backfill_limit = backfill_limit
+        self.stats_interval = stats_interval
+        self.stats: Dict[str, EndpointStats] = {endpoint: EndpointStats(endpoint) for endpoint in endpoints}
+        self.last_slot = 0
+        # First arrival time of recent signatures, to measure how far behind the other endpoints are
+        self._first_seen: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._backfill_lock = asyncio.Lock()
+        self._backfill_tasks = set()
+
+    async def run(self):
+        tasks = [asyncio.create_task(self._listen(endpoint), name=f'ws-{endpoint}') for endpoint in self.endpoints]
+        tasks.append(asyncio.create_task(self._report_stats(), name='ws-stats'))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.log_stats()
+
+    async def _listen(self, endpoint: str):
+        stats = self.stats[endpoint]
+        connected_before = False
+        kwargs = {'ssl': ssl.SSLContext(ssl.PROTOCOL_TLS)} if endpoint.startswith('wss://') else {}
+        while True:
+            try:
+                async for websocket in connect(endpoint, ping_interval=None, **kwargs):
+                    try:
+                        requests = await self._subscribe(websocket)
+                        if connected_before:
+                            stats.reconnects += 1
+                            metrics.inc('ws_reconnects', endpoint=stats.label)
+                            task = asyncio.create_task(self.backfill(self.last_slot))
+                            self._backfill_tasks.add(task)
+                            task.add_done_callback(self._backfill_tasks.discard)
+                        connected_before = True
+
+                        # subscription id -> DEX, filled in as the subscriptions are confirmed
+                        routes: Dict[int, Dex] = {}
+                        async for msg in websocket:
+                            for item in msg:
+                                if isinstance(item, SubscriptionResult) and item.id in requests:
+                                    dex = routes[item.result] = requests[item.id]
+                                    console(f"Subscription to {dex.name} successful on {endpoint}. Subscription ID:", item.result)
+                                    logging.info('Subscription to %s successful on %s. Subscription ID: %s', dex.name, endpoint, item.result)
+                                    continue
+                                if not isinstance(item, LogsNotification) or item.subscription not in routes:
+                                    continue
+                                dex = routes[item.subscription]
+                                self.last_slot = max(self.last_slot, item.result.context.slot)
+                                value = item.result.value
+                                if value.err is not None or not dex.announces_pool(value.logs):
+                                    continue
+                                await self._arrive(stats, value.signature, value, dex)
+                    except (ProtocolError, ConnectionClosed) as err:
+                        logging.error('%s: %s', endpoint, err)
+                        console(f"Danger! {endpoint}:", err)
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error('Error on %s: %s', endpoint, e)
+                console(f'Error on {endpoint}:', e)
+                await asyncio.sleep(1)
+
+    async def _subscribe(self, websocket) -> Dict[int, Dex]:
+        """Send one logs subscription per DEX without waiting for each to be confirmed: request id -> DEX."""
+        requests = {}
+        for dex in self.dexes:
+            await websocket.logs_subscribe(RpcTransactionLogsFilterMentions(dex.subscription_address), self.commitment)
+            requests[next(reversed(websocket.sent_subscriptions))] = dex
+        return requests
+
+    async def _arrive(self, stats: Optional[EndpointStats], signature: Signature, value: Optional[RpcLogsResponse], dex: Dex):
+        now = time.monotonic()
+        key = bytes(signature)
+        if stats is not None:
+            stats.notifications += 1
+            metrics.inc('ws_notifications', endpoint=stats.label, dex=dex.name)
+
+        if self.deduper.check_and_add(signature):
+            if stats is not None and key in self._first_seen:
+                stats.lags.append(now - self._first_seen[key])
+            return
+
+        if stats is not None:
+            stats.first_arrivals += 1
+            stats.lags.append(0.0)
+            self._first_seen[key] = now
+            if len(self._first_seen) > 10_000:
+                self._first_seen.popitem(last=False)
+        await self.on_signature(signature, value)
+
+    async def backfill(self, since_slot: int):
+        """Feed signatures of the DEXes' backfill addresses from `since_slot` on through deduplication."""
+        if self.rpc_client is None or not since_slot:
+            return
+        async with self._backfill_lock:
+            for dex in self.dexes:
+                if dex.backfill_address is not None:
+                    await self._backfill_dex(dex, since_slot)
+
+    async def _backfill_dex(self, dex: Dex, since_slot: int):
+        commitment = Finalized if self.commitment == Finalized else Confirmed
+        missed = []
+        before = None
+        try:
+            while True:
+                resp = await self.rpc_client.get_signatures_for_address(
+                    dex.backfill_address, before=before, limit=self.backfill_limit, commitment=commitment)
+                page = resp.value
+                # The last slot seen may hold more transactions than were seen, the deduper drops those that were
+                newer = [status for status in page if status.slot >= since_slot]
+                missed.extend(status for status in newer if status.err is None)
+                if len(newer) < len(page) or len(page) < self.backfill_limit:
+                    break
+                before = page[-1].signature
+        except Exception as e:
+            logging.error('%s backfill since slot %s failed: %s', dex.name, since_slot, e)
+            console(f'{dex.name} backfill since slot {since_slot} failed:', e)
+
+        # Oldest first, the same order the websocket would have delivered them in
+        missed.reverse()
+        logging.info('%s backfill since slot %s: %s signature(s) to check', dex.name, since_slot, len(missed))
+        console(f'{dex.name} backfill since slot {since_slot}: {len(missed)} signature(s) to check')
+        for status in missed:
+            await self._arrive(None, status.signature, None, dex)
+
+    def log_stats(self):
+        for stats in self.stats.values():
+            logging.info(f'Websocket endpoint stats: {stats.summary()}')
+
+    async def _report_stats(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.log_stats()
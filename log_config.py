@@ -0,0 +1,102 @@
+import os
+import json
+import atexit
+import logging
+
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+TEXT_DATEFMT = '%Y-%m-%d %I:%M:%S %p'
+# Attributes every LogRecord has, anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+_quiet = False
+_listener: Optional[QueueListener] = None
+
+class DailyFileHandler(logging.FileHandler):
+    """Appends to `path_template` formatted with today's date, switching files at midnight."""
+
+    def __init__(self, path_template: str, encoding: str = 'utf-8'):
+        self.path_template = path_template
+        self.day = datetime.now().strftime('%Y-%m-%d')
+        os.makedirs(os.path.dirname(self._path()) or '.', exist_ok=True)
+        super().__init__(self._path(), mode='a', encoding=encoding, delay=True)
+
+    def _path(self) -> str:
+        return self.path_template.format(date=self.day)
+
+    def emit(self, record: logging.LogRecord):
+        # The day the record was made, not when the listener gets to it
+        today = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+        if today != self.day:
+            self.day = today
+            self.close()
+            self.baseFilename = os.path.abspath(self._path())
+        super().emit(record)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class _DeferredQueueHandler(QueueHandler):
+    # QueueHandler.prepare formats the message on the caller's thread; leave that
+    # (and the str() of any dict arguments) to the listener thread instead
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def setup_logging(path_template: str,
+                  level: str = 'INFO',
+                  json_format: bool = False,
+                  quiet: bool = False) -> QueueListener:
+    """Route the root logger through a queue to a daily file written by a background thread.
+
+    `path_template` is formatted with `date` (YYYY-MM-DD) and reopened when the day
+    changes. With `quiet`, `console` stops echoing to stdout.
+    """
+    global _quiet, _listener
+    _quiet = quiet
+    handler = DailyFileHandler(path_template)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT, TEXT_DATEFMT))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    queue = SimpleQueue()
+    root.addHandler(_DeferredQueueHandler(queue))
+    root.setLevel(level.upper())
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Write out what is still queued and close the log file."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def console(*args, **kwargs):
+    """print, unless console output was silenced. Arguments are only converted to text when printed."""
+    if not _quiet:
+        print(*args, **kwargs)
+
@@ -0,0 +1,311 @@
+import math
+import time
+import asyncio
+import inspect
+import logging
+
+from typing import Any, Callable, Dict, Optional
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from spl.token.instructions import get_associated_token_address
+
+from account_batcher import AccountBatcher, decode_mint
+from account_subscriptions import AccountSubscriptions
+from holders import TOKEN_ACCOUNT_LAYOUT
+from tx_decoder import DecodedPool
+import metrics
+
+LP_LOCKED_THRESHOLD = 98.9
+
+def token_account_amount(account: Optional[Account]) -> Optional[int]:
+    if account is None or len(account.data) < TOKEN_ACCOUNT_LAYOUT.size:
+        return None
+    return TOKEN_ACCOUNT_LAYOUT.unpack_from(account.data)[2]
+
+class LpWatch:
+    """LP tokens of one pool since it was created.
+
+    `minted` LP went to the deployer's account. LP that has left that account was
+    either destroyed (the LP mint's supply went down), which is a burn or a
+    withdrawal of liquidity, or moved elsewhere, usually to a locker.
+    """
+    __slots__ = ('pool', 'lp_account', 'context', 'started', 'minted', 'initial_supply', 'supply', 'balance',
+                 'reserves', 'withdrawn', 'outcome', 'finished', 'future', 'expiry', 'refreshing', 'dirty', 'ready')
+
+    def __init__(self, pool: DecodedPool, lp_account: Pubkey, context: Any, future: asyncio.Future):
+        self.pool = pool
+        self.lp_account = lp_account
+        self.context = context
+        self.started = time.monotonic()
+        self.minted = 0
+        self.initial_supply = 0
+        self.supply = 0
+        # None when the deployer's account can't be followed, only burns count then
+        self.balance: Optional[int] = None
+        # sqrt(base * quote) of the vaults, swaps keep it (about) constant, withdrawals shrink it
+        self.reserves: Optional[float] = None
+        self.withdrawn = 0
+        # 'locked', 'removed' or 'expired' once settled
+        self.outcome: Optional[str] = None
+        self.finished: Optional[float] = None
+        self.future = future
+        self.expiry: Optional[asyncio.TimerHandle] = None
+        self.refreshing = False
+        self.dirty = False
+        # Set once the first read is done, whether or not it succeeded
+        self.ready = asyncio.Event()
+
+    @property
+    def burned(self) -> int:
+        return max(0, self.initial_supply - self.supply - self.withdrawn)
+
+    @property
+    def moved(self) -> int:
+        if self.balance is None:
+            return 0
+        return max(0, self.minted - self.balance - (self.initial_supply - self.supply))
+
+    @property
+    def burned_pct(self) -> float:
+        return 100 * self.burned / self.minted if self.minted else 0.0
+
+    @property
+    def moved_pct(self) -> float:
+        return 100 * self.moved / self.minted if self.minted else 0.0
+
+    @property
+    def waited(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+class LpLockWatcher:
+    """Follows the LP of new pools over account subscriptions until it is burnt or locked.
+
+    `watch` reads the pool's LP mint, the deployer's LP token account (the associated
+    token account the LP is minted to) and both vaults with one batched request, then
+    subscribes to the first two. Nothing is polled: each update of either account is
+    followed by one batched read of all four, so burns, transfers and withdrawals are
+    judged on a consistent state whatever order the notifications came in. LP burnt,
+    plus LP moved out of the deployer's account when `count_transfers`, past `threshold`
+    % of what was minted makes the pool 'locked'; LP destroyed while the reserves shrink
+    with it makes it 'removed'; a pool still unlocked after `timeout` seconds is
+    'expired'. Where moved LP went isn't checked: a transfer to another wallet of the
+    deployer looks the same as one to a locker and is never followed, so
+    `count_transfers` can be spoofed and is off by default. The subscriptions and the
+    batcher must use the same commitment. `on_locked`, `on_removed` and `on_expired`
+    are called with the LpWatch and may be coroutines.
+    Pools without an LP token (concentrated liquidity) can't be watched.
+    """
+
+    def __init__(self,
+                 subscriptions: AccountSubscriptions,
+                 batcher: AccountBatcher,
+                 threshold: float = LP_LOCKED_THRESHOLD,
+                 timeout: float = 1800.0,
+                 count_transfers: bool = False,
+                 on_locked: Optional[Callable] = None,
+                 on_removed: Optional[Callable] = None,
+                 on_expired: Optional[Callable] = None):
+        self.subscriptions = subscriptions
+        self.batcher = batcher
+        self.threshold = threshold
+        self.timeout = timeout
+        self.count_transfers = count_transfers
+        self.on_locked = on_locked
+        self.on_removed = on_removed
+        self.on_expired = on_expired
+        self.watches: Dict[Pubkey, LpWatch] = {}
+        # Settled watches are kept for `timeout` seconds, watching the pool again returns them
+        # rather than starting over from the state the outcome left behind
+        self.settled: Dict[Pubkey, LpWatch] = {}
+        self._forget: Dict[Pubkey, asyncio.TimerHandle] = {}
+        self.outcomes = {'locked': 0, 'removed': 0, 'expired': 0}
+        self._tasks = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self.watches)
+
+    def get(self, pool: DecodedPool) -> Optional[LpWatch]:
+        return self.watches.get(pool.pair) or self.settled.get(pool.pair)
+
+    async def watch(self, pool: DecodedPool, context: Any = None) -> Optional[LpWatch]:
+        """Start following the pool's LP, None if it has no LP token or there is no room left.
+        The LpWatch's future resolves to itself once it has an outcome."""
+        if pool.lp_mint is None:
+            return None
+        if pool.pair in self.settled:
+            return self.settled[pool.pair]
+        if pool.pair in self.watches:
+            watch = self.watches[pool.pair]
+            await watch.ready.wait()
+            return watch if watch.outcome is not None or pool.pair in self.watches else None
+        if len(self.subscriptions) + 2 > self.subscriptions.max_subscriptions:
+            metrics.inc('lp_watch_rejected')
+            return None
+        lp_account = get_associated_token_address(pool.deployer, pool.lp_mint)
+        watch = LpWatch(pool, lp_account, context, asyncio.get_running_loop().create_future())
+        self.watches[pool.pair] = watch
+        try:
+            return await self._start(watch)
+        finally:
+            watch.ready.set()
+
+    async def _start(self, watch: LpWatch) -> Optional[LpWatch]:
+        pool = watch.pool
+        try:
+            lp_mint, account, base_vault, quote_vault = await self._read(watch)
+        except Exception as e:
+            del self.watches[pool.pair]
+            logging.warning(f'Failed to read the LP accounts of {pool.pair}: {e}')
+            return None
+        if lp_mint is None:
+            del self.watches[pool.pair]
+            return None
+        watch.supply = decode_mint(lp_mint.data).supply
+        # LP burnt by the creation transaction itself (pump.fun migrations) was minted by it too
+        watch.initial_supply = max(watch.supply, pool.lp_supply or 0)
+        watch.balance = token_account_amount(account)
+        if watch.balance:
+            watch.minted = max(watch.balance, pool.lp_supply or 0)
+        else:
+            # Not in the deployer's associated account, only a burn can be seen
+            watch.balance = None
+            watch.minted = watch.initial_supply
+        watch.reserves = self._reserves(base_vault, quote_vault)
+
+        if self._settle(watch):
+            return watch
+        self.subscriptions.subscribe(pool.lp_mint, lambda *_: self._on_update(watch))
+        if watch.balance is not None:
+            self.subscriptions.subscribe(watch.lp_account, lambda *_: self._on_update(watch))
+        watch.expiry = asyncio.get_running_loop().call_later(self.timeout, self._expire, watch)
+        return watch
+
+    async def _read(self, watch: LpWatch):
+        pool = watch.pool
+        return await asyncio.gather(*(
+            self.batcher.get_account(pubkey) for pubkey in (pool.lp_mint, watch.lp_account, pool.base_vault, pool.quote_vault)
+        ))
+
+    @staticmethod
+    def _reserves(base_vault: Optional[Account], quote_vault: Optional[Account]) -> float:
+        # A closed vault holds nothing
+        return math.sqrt((token_account_amount(base_vault) or 0) * (token_account_amount(quote_vault) or 0))
+
+    def _on_update(self, watch: LpWatch):
+        if watch.refreshing:
+            # Read again once the running read is done
+            watch.dirty = True
+            return
+        watch.refreshing = True
+        task = asyncio.create_task(self._refresh(watch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, watch: LpWatch):
+        try:
+            while watch.outcome is None:
+                watch.dirty = False
+                try:
+                    lp_mint, account, base_vault, quote_vault = await self._read(watch)
+                except Exception as e:
+                    logging.warning(f'Failed to read the LP accounts of {watch.pool.pair}: {e}')
+                    return
+                if lp_mint is None or watch.outcome is not None:
+                    return
+                supply = decode_mint(lp_mint.data).supply
+                reserves = self._reserves(base_vault, quote_vault)
+                destroyed = watch.supply - supply
+                if destroyed > 0 and self._withdrawal(watch, destroyed, reserves):
+                    watch.withdrawn += destroyed
+                watch.supply = supply
+                watch.reserves = reserves
+                if watch.balance is not None:
+                    watch.balance = token_account_amount(account) or 0
+                if self._settle(watch) or not watch.dirty:
+                    return
+        finally:
+            watch.refreshing = False
+
+    @staticmethod
+    def _withdrawal(watch: LpWatch, destroyed: int, reserves: float) -> bool:
+        if not watch.reserves:
+            return False
+        # Withdrawing a fraction f of the LP takes f of the reserves with it, burning it
+        # leaves them alone: split the difference
+        fraction = destroyed / (watch.supply or destroyed)
+        return reserves / watch.reserves < 1 - fraction / 2
+
+    def _settle(self, watch: LpWatch) -> bool:
+        if watch.outcome is not None:
+            return True
+        if watch.withdrawn > 0:
+            self._finish(watch, 'removed', self.on_removed)
+        elif watch.burned_pct + (watch.moved_pct if self.count_transfers else 0.0) > self.threshold:
+            self._finish(watch, 'locked', self.on_locked)
+        else:
+            return False
+        return True
+
+    def _expire(self, watch: LpWatch):
+        if watch.outcome is None:
+            self._finish(watch, 'expired', self.on_expired)
+
+    def _finish(self, watch: LpWatch, outcome: str, callback: Optional[Callable]):
+        watch.outcome = outcome
+        watch.finished = time.monotonic()
+        if watch.expiry is not None:
+            watch.expiry.cancel()
+        self.watches.pop(watch.pool.pair, None)
+        self.settled[watch.pool.pair] = watch
+        self._forget[watch.pool.pair] = asyncio.get_running_loop().call_later(self.timeout, self._drop_settled, watch.pool.pair)
+        self.subscriptions.unsubscribe(watch.pool.lp_mint)
+        self.subscriptions.unsubscribe(watch.lp_account)
+        self.outcomes[outcome] += 1
+        metrics.inc('lp_watch', outcome=outcome)
+        if outcome == 'locked':
+            metrics.observe('lp.time_to_lock', watch.waited)
+        logging.info(f'LP of {watch.pool.pair} {outcome} after {watch.waited:.1f}s '
+                     f'(burnt {watch.burned_pct:.1f}%, moved {watch.moved_pct:.1f}%)')
+        if not watch.future.done():
+            watch.future.set_result(watch)
+        self._emit(callback, watch)
+
+    def _emit(self, callback: Optional[Callable], watch: LpWatch):
+        if callback is None:
+            return
+        try:
+            result = callback(watch)
+        except Exception as e:
+            logging.error(f'LP watch handler failed for {watch.pool.pair}: {e}')
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f'LP watch handler failed: {task.exception()}')
+
+    def stats(self) -> dict:
+        return {'pending': self.pending, **self.outcomes}
+
+    def _drop_settled(self, pair: Pubkey):
+        self.settled.pop(pair, None)
+        self._forget.pop(pair, None)
+
+    async def close(self):
+        for handle in self._forget.values():
+            handle.cancel()
+        self._forget.clear()
+        self.settled.clear()
+        for watch in list(self.watches.values()):
+            if watch.expiry is not None:
+                watch.expiry.cancel()
+            if not watch.future.done():
+                watch.future.cancel()
+        self.watches.clear()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,129 @@
+import struct
+
+from typing import List, Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+METADATA_V1_KEY = 4
+
+TOKEN_STANDARDS = {
+    0: 'NonFungible',
+    1: 'FungibleAsset',
+    2: 'Fungible',
+    3: 'NonFungibleEdition',
+    4: 'ProgrammableNonFungible',
+    5: 'ProgrammableNonFungibleEdition',
+}
+
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+class Creator:
+    __slots__ = ('address', 'verified', 'share')
+
+    def __init__(self, address: Pubkey, verified: bool, share: int):
+        self.address = address
+        self.verified = verified
+        self.share = share
+
+    def __repr__(self):
+        return f'Creator(address={self.address}, verified={self.verified}, share={self.share})'
+
+class Metadata:
+    """Decoded Metaplex token metadata account.
+
+    Fields added by later versions of the program (edition nonce onwards) are `None`
+    on accounts created before they existed.
+    """
+    __slots__ = ('update_authority', 'mint', 'name', 'symbol', 'uri', 'seller_fee_basis_points',
+                 'creators', 'primary_sale_happened', 'is_mutable', 'edition_nonce', 'token_standard',
+                 'collection', 'uses')
+
+    def __init__(self, update_authority: Pubkey, mint: Pubkey, name: str, symbol: str, uri: str,
+                 seller_fee_basis_points: int, creators: Optional[List[Creator]],
+                 primary_sale_happened: bool, is_mutable: bool, edition_nonce: Optional[int] = None,
+                 token_standard: Optional[str] = None, collection: Optional[tuple] = None,
+                 uses: Optional[tuple] = None):
+        self.update_authority = update_authority
+        self.mint = mint
+        self.name = name
+        self.symbol = symbol
+        self.uri = uri
+        self.seller_fee_basis_points = seller_fee_basis_points
+        self.creators = creators
+        self.primary_sale_happened = primary_sale_happened
+        self.is_mutable = is_mutable
+        self.edition_nonce = edition_nonce
+        self.token_standard = token_standard
+        self.collection = collection
+        self.uses = uses
+
+    def __repr__(self):
+        return (f'Metadata(mint={self.mint}, name={self.name!r}, symbol={self.symbol!r}, uri={self.uri!r}, '
+                f'update_authority={self.update_authority}, is_mutable={self.is_mutable}, '
+                f'token_standard={self.token_standard}, creators={self.creators})')
+
+def _pubkey(view: memoryview, i: int) -> Pubkey:
+    return Pubkey.from_bytes(view[i:i + 32].tobytes())
+
+def _string(view: memoryview, i: int):
+    length = _U32.unpack_from(view, i)[0]
+    i += 4
+    # Strings are zero-padded to their maximum length
+    return str(view[i:i + length], 'utf-8', 'replace').strip('\x00'), i + length
+
+def parse_metadata(data) -> Metadata:
+    """Parse a Metaplex metadata account straight from the account bytes, without copying them."""
+    view = memoryview(data)
+    if view[0] != METADATA_V1_KEY:
+        raise ValueError(f'Not a metadata account (key={view[0]})')
+
+    update_authority = _pubkey(view, 1)
+    mint = _pubkey(view, 33)
+    name, i = _string(view, 65)
+    symbol, i = _string(view, i)
+    uri, i = _string(view, i)
+    seller_fee_basis_points = _U16.unpack_from(view, i)[0]
+    i += 2
+
+    creators = None
+    if view[i]:
+        count = _U32.unpack_from(view, i + 1)[0]
+        i += 5
+        creators = []
+        for _ in range(count):
+            creators.append(Creator(_pubkey(view, i), bool(view[i + 32]), view[i + 33]))
+            i += 34
+    else:
+        i += 1
+
+    primary_sale_happened = bool(view[i])
+    is_mutable = bool(view[i + 1])
+    i += 2
+    metadata = Metadata(update_authority, mint, name, symbol, uri, seller_fee_basis_points,
+                        creators, primary_sale_happened, is_mutable)
+
+    # Optional trailing fields, each one absent on accounts older than the program version adding it
+    try:
+        if view[i]:
+            metadata.edition_nonce = view[i + 1]
+            i += 2
+        else:
+            i += 1
+        if view[i]:
+            metadata.token_standard = TOKEN_STANDARDS.get(view[i + 1], str(view[i + 1]))
+            i += 2
+        else:
+            i += 1
+        if view[i]:
+            metadata.collection = (bool(view[i + 1]), _pubkey(view, i + 2))
+            i += 34
+        else:
+            i += 1
+        if view[i]:
+            metadata.uses = (view[i + 1], _U64.unpack_from(view, i + 2)[0], _U64.unpack_from(view, i + 10)[0])
+    except (IndexError, struct.error):
+        pass
+
+    return metadata
@@ -0,0 +1,152 @@
+import time
+import bisect
+import asyncio
+import logging
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+PREFIX = 'sol_listener'
+# Latency buckets in seconds, from a cached lookup to a transaction that needed retries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Bucketed counts of observed durations plus the latest `window` samples for percentiles."""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS, window: int = 10_000):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+
+    def percentiles(self, qs: Iterable[float] = (50, 90, 99)) -> List[float]:
+        if not self.samples:
+            return [0.0 for _ in qs]
+        return np.percentile(np.fromiter(self.samples, dtype=np.float64), list(qs)).tolist()
+
+    def summary(self) -> dict:
+        p50, p90, p99 = self.percentiles()
+        return {
+            'count': self.count,
+            'p50': p50,
+            'p90': p90,
+            'p99': p99,
+            'max': max(self.samples) if self.samples else 0.0,
+            'mean': self.sum / self.count if self.count else 0.0
+        }
+
+Labels = Tuple[Tuple[str, str], ...]
+
+stages: Dict[str, Histogram] = {}
+counters: Dict[Tuple[str, Labels], float] = {}
+# Read when scraped rather than kept up to date on the hot path
+gauges: Dict[str, Callable[[], float]] = {}
+
+def observe(stage: str, seconds: float):
+    histogram = stages.get(stage)
+    if histogram is None:
+        histogram = stages[stage] = Histogram()
+    histogram.observe(seconds)
+
+@contextmanager
+def timer(stage: str):
+    """Time the block (awaits included) as one observation of `stage`, failed attempts too."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+def inc(name: str, amount: float = 1, **labels: str):
+    key = (name, tuple(sorted(labels.items())))
+    counters[key] = counters.get(key, 0) + amount
+
+def gauge(name: str, read: Callable[[], float]):
+    gauges[name] = read
+
+def summary(prefix: Optional[str] = None) -> Dict[str, dict]:
+    return {stage: histogram.summary() for stage, histogram in sorted(stages.items())
+            if prefix is None or stage.startswith(prefix)}
+
+def format_summary(prefix: Optional[str] = None) -> str:
+    lines = [f'{"stage":<28} {"count":>7} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"max ms":>9}']
+    for stage, row in summary(prefix).items():
+        lines.append(f'{stage:<28} {row["count"]:>7} {row["p50"] * 1e3:>9.2f} {row["p90"] * 1e3:>9.2f} '
+                     f'{row["p99"] * 1e3:>9.2f} {row["max"] * 1e3:>9.2f}')
+    return '\n'.join(lines)
+
+def _labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = [f'# TYPE {PREFIX}_stage_seconds histogram']
+    for stage, histogram in sorted(stages.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{PREFIX}_stage_seconds_bucket{_labels([("stage", stage), ("le", le)])} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{_labels([("stage", stage)])} {histogram.sum}')
+        lines.append(f'{PREFIX}_stage_seconds_count{_labels([("stage", stage)])} {histogram.count}')
+
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+        lines.append(f'{PREFIX}_{name}_total{_labels(labels)} {value:g}')
+
+    for name, read in sorted(gauges.items()):
+        try:
+            value = read()
+        except Exception as e:
+            logging.warning(f'Failed to read gauge {name}: {e}')
+            continue
+        lines.append(f'# TYPE {PREFIX}_{name} gauge')
+        lines.append(f'{PREFIX}_{name} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        # The headers aren't needed, read them so the client isn't reset
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/metrics', '/'):
+            status, body, content_type = '200 OK', render().encode(), 'text/plain; version=0.0.4'
+        else:
+            status, body, content_type = '404 Not Found', b'Not found\n', 'text/plain'
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_server(host: str = '127.0.0.1', port: int = 9108) -> asyncio.AbstractServer:
+    """Serve `render()` on http://host:port/metrics; rendering happens per scrape, off the hot path."""
+    server = await asyncio.start_server(_serve, host, port)
+    logging.info(f'Metrics available on http://{host}:{port}/metrics')
+    return server
+
+def reset():
+    stages.clear()
+    counters.clear()
+    gauges.clear()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, List, Optional
+
+from log_config import console
+import metrics
+
+class PoolPipeline:
+    """Bounded queue of pending work items processed by N concurrent workers.
+
+    The websocket reader calls `submit`, which blocks once `queue_size` items are
+    pending (backpressure) instead of buffering without limit.
+    """
+
+    def __init__(self,
+                 handler: Callable[[Any], Awaitable[Any]],
+                 workers: int = 4,
+                 queue_size: int = 100,
+                 depth_log_interval: float = 30.0):
+        self.handler = handler
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.depth_log_interval = depth_log_interval
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._tasks: List[asyncio.Task] = []
+        self._last_depth_log = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i), name=f'pool-worker-{i}') for i in range(self.workers)]
+        logging.info('Pipeline started with %s workers (queue size: %s)', self.workers, self.queue.maxsize)
+
+    async def submit(self, item: Any):
+        await self.queue.put((item, time.perf_counter()))
+        depth = self.depth
+        self.max_depth = max(self.max_depth, depth)
+        now = time.monotonic()
+        if now - self._last_depth_log >= self.depth_log_interval:
+            self._last_depth_log = now
+            logging.info('Pipeline queue depth: %s (max: %s, processed: %s, failed: %s)', depth, self.max_depth, self.processed, self.failed)
+        if self.queue.full():
+            logging.warning('Pipeline queue full (%s items), websocket reader is waiting on workers', depth)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            item, submitted = await self.queue.get()
+            metrics.observe('pipeline.queue_wait', time.perf_counter() - submitted)
+            try:
+                with metrics.timer('pipeline.handle'):
+                    await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.error('Pipeline worker %s failed on %s: %s', worker_id, item, e)
+                console(f'Pipeline worker {worker_id} failed on {item}:', e)
+            finally:
+                self.queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for queued items to finish (up to `timeout` seconds), then stop the workers."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning('Pipeline drain timed out with %s items still queued', self.depth)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            logging.info('Pipeline stopped (processed: %s, failed: %s)', self.processed, self.failed)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+"""SQLite index of detected pools, their deployers and outcomes.
+
+Query it while the bot runs (WAL mode lets readers and the writer coexist):
+
+    python pool_index.py recent [--limit N]
+    python pool_index.py mint <mint address>
+    python pool_index.py pair <pair address>
+    python pool_index.py deployer <deployer address>
+    python pool_index.py deployers [--min-launches N] [--limit N]
+    python pool_index.py mark <pair or mint address> rugged|survived
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import sqlite3
+import argparse
+import threading
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from log_config import console
+
+DEFAULT_POOL_INDEX_PATH = os.environ.get('POOL_INDEX_PATH') or 'pools.db'
+
+OUTCOMES = ('rugged', 'survived')
+POOL_FIELDS = [
+    'pair', 'mint', 'quote_mint', 'lp_mint', 'deployer', 'signature', 'timestamp', 'open_time',
+    'symbol', 'name', 'price', 'liquidity', 'fdv', 'status', 'outcome', 'outcome_at', 'dex',
+    'lp_locked_after', 'lp_locked_pct'
+]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pools (
+    pair TEXT PRIMARY KEY,
+    mint TEXT,
+    quote_mint TEXT,
+    lp_mint TEXT,
+    deployer TEXT,
+    signature TEXT,
+    timestamp REAL,
+    open_time INTEGER,
+    symbol TEXT,
+    name TEXT,
+    price REAL,
+    liquidity REAL,
+    fdv REAL,
+    status TEXT,
+    outcome TEXT,
+    outcome_at REAL,
+    dex TEXT,
+    lp_locked_after REAL,
+    lp_locked_pct REAL
+);
+CREATE INDEX IF NOT EXISTS pools_mint ON pools (mint);
+CREATE INDEX IF NOT EXISTS pools_deployer ON pools (deployer, timestamp);
+CREATE INDEX IF NOT EXISTS pools_timestamp ON pools (timestamp);
+'''
+
+# Later writes for a pair fill in its columns, a NULL never overwrites what is already known
+UPSERT = 'INSERT INTO pools ({columns}) VALUES ({placeholders}) ON CONFLICT (pair) DO UPDATE SET {updates}'.format(
+    columns=', '.join(POOL_FIELDS),
+    placeholders=', '.join('?' * len(POOL_FIELDS)),
+    updates=', '.join(f'{field} = COALESCE(excluded.{field}, {field})' for field in POOL_FIELDS[1:])
+)
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    # Databases created before a column was added get it empty
+    existing = {row['name'] for row in conn.execute('PRAGMA table_info(pools)')}
+    for field in POOL_FIELDS:
+        if field not in existing:
+            conn.execute(f'ALTER TABLE pools ADD COLUMN {field}')
+    return conn
+
+class DeployerRecord:
+    __slots__ = ('launches', 'rugs', 'last_launch')
+
+    def __init__(self, launches: int = 0, rugs: int = 0, last_launch: float = 0.0):
+        self.launches = launches
+        self.rugs = rugs
+        self.last_launch = last_launch
+
+    def __repr__(self):
+        return f'DeployerRecord(launches={self.launches}, rugs={self.rugs})'
+
+class PoolIndex:
+    """Pools seen by the listener, written to SQLite in batches off the event loop.
+
+    Launch and rug counts of deployers active in the last `deployer_window`
+    seconds are kept in memory (up to `deployer_capacity` of them) so the filter
+    stage can check a deployer without touching the database. Outcomes marked
+    from the CLI are picked up every `refresh_interval` seconds.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_POOL_INDEX_PATH,
+                 batch_size: int = 50,
+                 flush_interval: float = 2.0,
+                 deployer_window: float = 30 * 24 * 3600,
+                 deployer_capacity: int = 100_000,
+                 refresh_interval: float = 300.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.deployer_window = deployer_window
+        self.deployer_capacity = deployer_capacity
+        self.refresh_interval = refresh_interval
+        self.deployers: 'OrderedDict[str, DeployerRecord]' = OrderedDict()
+        # Pairs marked rugged since start, a pool marked again isn't another rug of its deployer
+        self._rugged: 'OrderedDict[str, None]' = OrderedDict()
+        self.rows_written = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # pair -> pending column values, merged until the next flush
+        self._pending: Dict[str, dict] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._flushes = set()
+        self._last_refresh = 0.0
+
+    def open(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self.load_deployers()
+
+    async def start(self):
+        await asyncio.to_thread(self.open)
+        logging.info(f'Pool index {self.path}: {len(self.deployers)} deployer(s) active in the last '
+                     f'{self.deployer_window / 86400:g} day(s), {self.serial_ruggers()} with a rug')
+        self._tasks.append(asyncio.create_task(self._flush_periodically(), name='pool-index'))
+
+    def load_deployers(self):
+        since = time.time() - self.deployer_window
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT deployer, COUNT(*), SUM(outcome = 'rugged'), MAX(timestamp) FROM pools "
+                'WHERE deployer IS NOT NULL AND timestamp >= ? GROUP BY deployer ORDER BY MAX(timestamp)',
+                (since,)
+            ).fetchall()
+        deployers = OrderedDict((row[0], DeployerRecord(row[1], row[2] or 0, row[3])) for row in rows)
+        while len(deployers) > self.deployer_capacity:
+            deployers.popitem(last=False)
+        self.deployers = deployers
+        self._last_refresh = time.monotonic()
+
+    def deployer(self, deployer) -> Optional[DeployerRecord]:
+        return self.deployers.get(str(deployer))
+
+    def serial_ruggers(self, min_rugs: int = 1) -> int:
+        return sum(1 for record in self.deployers.values() if record.rugs >= min_rugs)
+
+    def record_pool(self, pool, signature=None, dex: Optional[str] = None):
+        """Index a freshly decoded pool (a tx_decoder.DecodedPool) and count the launch for its deployer."""
+        now = time.time()
+        deployer = str(pool.deployer)
+        record = self.deployers.pop(deployer, None) or DeployerRecord()
+        record.launches += 1
+        record.last_launch = now
+        self.deployers[deployer] = record
+        if len(self.deployers) > self.deployer_capacity:
+            self.deployers.popitem(last=False)
+        self.update(
+            pool.pair,
+            mint=str(pool.base_mint),
+            quote_mint=str(pool.quote_mint),
+            lp_mint=str(pool.lp_mint) if pool.lp_mint is not None else None,
+            deployer=deployer,
+            signature=str(signature) if signature is not None else None,
+            timestamp=now,
+            open_time=pool.open_time,
+            status='detected',
+            dex=dex
+        )
+
+    def update(self, pair, **fields):
+        pending = self._pending.setdefault(str(pair), {})
+        pending.update({field: value for field, value in fields.items() if value is not None})
+        if len(self._pending) >= self.batch_size:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def mark_outcome(self, pair, outcome: str, deployer=None):
+        if outcome not in OUTCOMES:
+            raise ValueError(f'Unknown outcome {outcome}, expected one of {OUTCOMES}')
+        pair = str(pair)
+        if outcome != 'rugged':
+            self._rugged.pop(pair, None)
+        elif pair not in self._rugged:
+            self._rugged[pair] = None
+            if len(self._rugged) > self.deployer_capacity:
+                self._rugged.popitem(last=False)
+            if deployer is not None and str(deployer) in self.deployers:
+                self.deployers[str(deployer)].rugs += 1
+        self.update(pair, outcome=outcome, outcome_at=time.time())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                await self._refresh_deployers()
+
+    async def _refresh_deployers(self):
+        try:
+            await asyncio.to_thread(self.load_deployers)
+        except Exception as e:
+            logging.error(f'Failed to refresh deployers from {self.path}: {e}')
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, pending)
+            self.rows_written += len(pending)
+        except Exception as e:
+            logging.error('Failed to write %s pool(s) to %s: %s', len(pending), self.path, e)
+            console(f'Failed to write {len(pending)} pool(s) to {self.path}:', e)
+            for pair, fields in pending.items():
+                self._pending[pair] = {**fields, **self._pending.get(pair, {})}
+
+    def _write(self, pending: Dict[str, dict]):
+        rows = [tuple([pair] + [fields.get(field) for field in POOL_FIELDS[1:]]) for pair, fields in pending.items()]
+        with self._db_lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._flushes, return_exceptions=True)
+        self._tasks.clear()
+        if self._conn is not None:
+            await self.flush()
+            self._conn.close()
+            self._conn = None
+
+def _format_time(timestamp: Optional[float]) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else ''
+
+def _print_rows(rows: List[sqlite3.Row], columns: List[str]):
+    if not rows:
+        print('No pools found')
+        return
+    table = [[_format_time(row[column]) if column in ('timestamp', 'outcome_at') else row[column]
+              for column in columns] for row in rows]
+    widths = [max(len(str(value)) for value in [column] + [row[i] for row in table]) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in table:
+        print('  '.join(str('' if value is None else value).ljust(width) for value, width in zip(row, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DEFAULT_POOL_INDEX_PATH, help='index path (default: POOL_INDEX_PATH or pools.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    recent = commands.add_parser('recent', help='latest detected pools')
+    recent.add_argument('--limit', type=int, default=20)
+    for name in ('mint', 'pair', 'deployer'):
+        commands.add_parser(name, help=f'pools by {name}').add_argument('address')
+    deployers = commands.add_parser('deployers', help='deployers by number of launches')
+    deployers.add_argument('--min-launches', type=int, default=2)
+    deployers.add_argument('--limit', type=int, default=20)
+    mark = commands.add_parser('mark', help='record the outcome of a pool')
+    mark.add_argument('address', help='pair or mint address')
+    mark.add_argument('outcome', choices=OUTCOMES)
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.db):
+        sys.exit(f'Pool index {args.db} not found')
+    conn = connect(args.db)
+    columns = ['timestamp', 'dex', 'mint', 'symbol', 'deployer', 'liquidity', 'fdv', 'status', 'outcome']
+    if args.command == 'recent':
+        rows = conn.execute('SELECT * FROM pools ORDER BY timestamp DESC LIMIT ?', (args.limit,)).fetchall()
+        _print_rows(rows, columns)
+    elif args.command in ('mint', 'pair', 'deployer'):
+        rows = conn.execute(f'SELECT * FROM pools WHERE {args.command} = ? ORDER BY timestamp', (args.address,)).fetchall()
+        columns += ['lp_locked_after']
+        _print_rows(rows, ['pair'] + columns if args.command != 'pair' else columns)
+    elif args.command == 'deployers':
+        rows = conn.execute(
+            "SELECT deployer, COUNT(*) AS launches, SUM(outcome = 'rugged') AS rugs, "
+            "SUM(outcome = 'survived') AS survived, COUNT(lp_locked_after) AS locks, "
+            'ROUND(AVG(lp_locked_after), 1) AS avg_lock_after, MAX(timestamp) AS timestamp FROM pools '
+            'WHERE deployer IS NOT NULL GROUP BY deployer HAVING COUNT(*) >= ? '
+            'ORDER BY launches DESC, rugs DESC LIMIT ?',
+            (args.min_launches, args.limit)
+        ).fetchall()
+        _print_rows(rows, ['deployer', 'launches', 'rugs', 'survived', 'locks', 'avg_lock_after', 'timestamp'])
+    elif args.command == 'mark':
+        with conn:
+            updated = conn.execute(
+                'UPDATE pools SET outcome = ?, outcome_at = ? WHERE pair = ? OR mint = ?',
+                (args.outcome, time.time(), args.address, args.address)
+            ).rowcount
+        print(f'Marked {updated} pool(s) as {args.outcome}')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+import math
+import time
+import asyncio
+import inspect
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+
+from account_batcher import AccountBatcher
+from account_subscriptions import AccountSubscriptions
+from lp_watcher import token_account_amount
+from tx_decoder import DecodedPool
+import metrics
+
+LIQUIDITY_REMOVED = 'liquidity_removed'
+PRICE_COLLAPSED = 'price_collapsed'
+EVENTS = (LIQUIDITY_REMOVED, PRICE_COLLAPSED)
+
+class TrackedPool:
+    """Latest vault balances of one tracked pool, its history lives in the tracker's arrays at `row`."""
+    __slots__ = ('pool', 'row', 'context', 'started', 'base_amount', 'quote_amount', 'base_slot', 'quote_slot')
+
+    def __init__(self, pool: DecodedPool, row: int, context: Any):
+        self.pool = pool
+        self.row = row
+        self.context = context
+        self.started = time.time()
+        self.base_amount = 0
+        self.quote_amount = 0
+        # Slot of the last update of each vault, a sample is taken once both are at the same slot
+        self.base_slot = -1
+        self.quote_slot = -1
+
+    @property
+    def base_ui(self) -> float:
+        return self.base_amount / 10 ** (self.pool.base_decimals or 0)
+
+    @property
+    def quote_ui(self) -> float:
+        return self.quote_amount / 10 ** (self.pool.quote_decimals or 0)
+
+    @property
+    def price(self) -> float:
+        """Quote tokens per base token."""
+        return self.quote_ui / self.base_ui if self.base_amount else 0.0
+
+    @property
+    def liquidity(self) -> float:
+        """Both sides of the pool, in quote tokens."""
+        return 2 * self.quote_ui
+
+    @property
+    def depth(self) -> float:
+        # Swaps keep sqrt(base * quote) (about) constant, only withdrawals shrink it
+        return math.sqrt(self.base_ui * self.quote_ui)
+
+class PoolTracker:
+    """Follows the vaults of alerted pools over account subscriptions.
+
+    Price and liquidity samples of every pool go to preallocated arrays holding
+    `history` samples per pool, each pool's row being a ring buffer, so at most
+    `max_pools` pools take a fixed `nbytes` whatever their activity; when all rows are
+    taken the pool closest to expiry makes room. A pool is dropped `ttl` seconds after
+    it started being tracked. `on_event(tracked, event, details)` is called once per
+    pool and event, and may be a coroutine:
+
+    - 'liquidity_removed' when the pool's depth (sqrt(base * quote), which swaps
+      don't change) falls `liquidity_drop_pct` % below its peak, the pool is dropped;
+    - 'price_collapsed' when the price falls `price_drop_pct` % below its peak.
+
+    Concentrated liquidity pools are not tracked, their vaults don't give the price.
+    """
+
+    def __init__(self,
+                 subscriptions: AccountSubscriptions,
+                 batcher: AccountBatcher,
+                 max_pools: int = 2000,
+                 history: int = 256,
+                 ttl: float = 3600.0,
+                 liquidity_drop_pct: float = 80.0,
+                 price_drop_pct: float = 90.0,
+                 sweep_interval: float = 5.0,
+                 on_event: Optional[Callable] = None):
+        self.subscriptions = subscriptions
+        self.batcher = batcher
+        self.max_pools = max_pools
+        self.history = history
+        self.ttl = ttl
+        self.liquidity_drop_pct = liquidity_drop_pct
+        self.price_drop_pct = price_drop_pct
+        self.sweep_interval = sweep_interval
+        self.on_event = on_event
+        self.times = np.zeros((max_pools, history), dtype=np.float64)
+        self.prices = np.zeros((max_pools, history), dtype=np.float32)
+        self.liquidities = np.zeros((max_pools, history), dtype=np.float32)
+        # Next write position and number of samples of each row
+        self.heads = np.zeros(max_pools, dtype=np.int32)
+        self.counts = np.zeros(max_pools, dtype=np.int32)
+        self.expires = np.full(max_pools, np.inf)
+        # Price when tracking started and peaks since
+        self.first_prices = np.zeros(max_pools, dtype=np.float64)
+        self.peak_prices = np.zeros(max_pools, dtype=np.float64)
+        self.peak_depths = np.zeros(max_pools, dtype=np.float64)
+        # One bit per event of EVENTS already fired
+        self.fired = np.zeros(max_pools, dtype=np.uint8)
+        self.pools: List[Optional[TrackedPool]] = [None] * max_pools
+        self.rows: Dict[Pubkey, int] = {}
+        self._free = list(range(max_pools - 1, -1, -1))
+        self.events = {event: 0 for event in EVENTS}
+        self.evicted = 0
+        self.expired = 0
+        self._tasks = set()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.times, self.prices, self.liquidities, self.heads, self.counts,
+                                              self.expires, self.first_prices, self.peak_prices, self.peak_depths, self.fired))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, pair: Pubkey) -> Optional[TrackedPool]:
+        row = self.rows.get(pair)
+        return self.pools[row] if row is not None else None
+
+    async def track(self, pool: DecodedPool, context: Any = None) -> Optional[TrackedPool]:
+        """Start following the pool from its current vault balances, None if it can't be tracked."""
+        if pool.initial_price is not None:
+            return None
+        if pool.pair in self.rows:
+            return self.get(pool.pair)
+        try:
+            base_vault, quote_vault = await asyncio.gather(self.batcher.get_account(pool.base_vault),
+                                                           self.batcher.get_account(pool.quote_vault))
+        except Exception as e:
+            logging.warning(f'Failed to read the vaults of {pool.pair}: {e}')
+            return None
+        if pool.pair in self.rows:
+            return self.get(pool.pair)
+        if not self._free:
+            self._evict()
+        tracked = TrackedPool(pool, self._free.pop(), context)
+        row = tracked.row
+        self.pools[row] = tracked
+        self.rows[pool.pair] = row
+        self.heads[row] = self.counts[row] = 0
+        self.peak_prices[row] = self.peak_depths[row] = 0.0
+        self.fired[row] = 0
+        self.expires[row] = time.monotonic() + self.ttl
+        tracked.base_amount = token_account_amount(base_vault) or 0
+        tracked.quote_amount = token_account_amount(quote_vault) or 0
+        self.first_prices[row] = tracked.price
+        self._sample(tracked)
+
+        subscribed = (self.subscriptions.subscribe(pool.base_vault, lambda _, account, slot: self._on_vault(tracked, True, account, slot))
+                      and self.subscriptions.subscribe(pool.quote_vault, lambda _, account, slot: self._on_vault(tracked, False, account, slot)))
+        if not subscribed:
+            metrics.inc('pool_tracker_rejected')
+            self.untrack(pool.pair)
+            return None
+        return tracked
+
+    def untrack(self, pair: Pubkey):
+        row = self.rows.pop(pair, None)
+        if row is None:
+            return
+        tracked = self.pools[row]
+        self.pools[row] = None
+        self.expires[row] = np.inf
+        self._free.append(row)
+        self.subscriptions.unsubscribe(tracked.pool.base_vault)
+        self.subscriptions.unsubscribe(tracked.pool.quote_vault)
+
+    def _evict(self):
+        row = int(np.argmin(self.expires))
+        self.evicted += 1
+        metrics.inc('pool_tracker_evicted')
+        self.untrack(self.pools[row].pool.pair)
+
+    def series(self, pair: Pubkey) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(times, prices, liquidities) of the pool's samples still in its ring, oldest first."""
+        row = self.rows[pair]
+        count = self.counts[row]
+        order = (self.heads[row] - count + np.arange(count)) % self.history
+        return self.times[row, order], self.prices[row, order], self.liquidities[row, order]
+
+    def _on_vault(self, tracked: TrackedPool, base: bool, account: Account, slot: int):
+        if self.pools[tracked.row] is not tracked:
+            return
+        # A closed vault holds nothing
+        amount = token_account_amount(account) or 0
+        if base:
+            tracked.base_amount, tracked.base_slot = amount, slot
+        else:
+            tracked.quote_amount, tracked.quote_slot = amount, slot
+        if tracked.base_slot == tracked.quote_slot:
+            self._sample(tracked)
+
+    def _sample(self, tracked: TrackedPool):
+        row = tracked.row
+        price, depth = tracked.price, tracked.depth
+        head = self.heads[row]
+        self.times[row, head] = time.time()
+        self.prices[row, head] = price
+        self.liquidities[row, head] = tracked.liquidity
+        self.heads[row] = (head + 1) % self.history
+        self.counts[row] = min(self.counts[row] + 1, self.history)
+        self.peak_prices[row] = max(self.peak_prices[row], price)
+        self.peak_depths[row] = max(self.peak_depths[row], depth)
+
+        if depth < self.peak_depths[row] * (1 - self.liquidity_drop_pct / 100):
+            self._fire(tracked, LIQUIDITY_REMOVED, 1 - depth / self.peak_depths[row])
+            self.untrack(tracked.pool.pair)
+        elif price < self.peak_prices[row] * (1 - self.price_drop_pct / 100):
+            self._fire(tracked, PRICE_COLLAPSED, 1 - price / self.peak_prices[row])
+
+    def _fire(self, tracked: TrackedPool, event: str, drop: float):
+        row = tracked.row
+        bit = 1 << EVENTS.index(event)
+        if self.fired[row] & bit:
+            return
+        self.fired[row] |= bit
+        self.events[event] += 1
+        metrics.inc('pool_tracker', event=event)
+        first = self.first_prices[row]
+        details = {
+            'drop_pct': round(drop * 100, 1),
+            'after': round(time.time() - tracked.started, 1),
+            'price': tracked.price,
+            'price_change_pct': round((tracked.price / first - 1) * 100, 1) if first else None,
+            'liquidity': tracked.liquidity,
+            'peak_price': float(self.peak_prices[row]),
+            'samples': int(self.counts[row])
+        }
+        logging.info(f'{tracked.pool.base_mint} {event}: {details}')
+        if self.on_event is None:
+            return
+        try:
+            result = self.on_event(tracked, event, details)
+        except Exception as e:
+            logging.error(f'Pool tracker handler failed for {tracked.pool.pair}: {e}')
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._event_done)
+
+    def _event_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f'Pool tracker handler failed: {task.exception()}')
+
+    def sweep(self):
+        """Drop the pools tracked for longer than `ttl`."""
+        for row in np.flatnonzero(self.expires <= time.monotonic()):
+            self.expired += 1
+            self.untrack(self.pools[row].pool.pair)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def stats(self) -> dict:
+        return {'tracked': len(self), **self.events, 'evicted': self.evicted, 'expired': self.expired}
+
+    async def close(self):
+        for pair in list(self.rows):
+            self.untrack(pair)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
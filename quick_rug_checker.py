@@ -1,58 +1,111 @@
 #!usr/bin/env python3
 import os
 import sys
-import requests
-from datetime import datetime
 import time
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from solana.rpc.commitment import Confirmed
+from solders.signature import Signature  # type: ignore
+
+from clients import rpc_client, close_clients
+from dexes import DEXES, find_pool
+from pool_index import connect
+from account_batcher import AccountBatcher
+from account_subscriptions import AccountSubscriptions
+from lp_watcher import LpLockWatcher
+from rugcheck_service import RugcheckService, lp_locked, lp_locked_pct
+
 rug_checker_url = os.environ['RUG_CHECKER_URL']
-token_address = sys.argv[1]
+websocket_client = os.environ['SOLANA_WEBSOCKET_CLIENT']
+token_addresses = sys.argv[1:]
+# Same index the bot writes to
+pool_index_path = os.environ.get('POOL_INDEX_PATH') or f"{os.environ.get('UNFILTERED_DATA_PATH') or '.'}/pools.db"
 retry_interval = 5
+max_wait = 300
+
+def find_signature(token_address: str):
+    """Signature of the transaction that created the token's pool, from the pool index."""
+    if not os.path.exists(pool_index_path):
+        return None
+    conn = connect(pool_index_path)
+    try:
+        row = conn.execute('SELECT signature FROM pools WHERE mint = ? AND signature IS NOT NULL ORDER BY timestamp DESC LIMIT 1',
+                           (token_address,)).fetchone()
+    finally:
+        conn.close()
+    return Signature.from_string(row['signature']) if row else None
+
+async def find_token_pool(token_address: str):
+    signature = find_signature(token_address)
+    if signature is None:
+        return None
+    transaction = await rpc_client().get_transaction(
+        signature, encoding="jsonParsed", commitment=Confirmed, max_supported_transaction_version=0)
+    if transaction.value is None:
+        return None
+    found = find_pool(transaction, DEXES.values())
+    return found[1] if found else None
 
-def main():
-    url = rug_checker_url.replace('<token_address>', token_address)
-    lp = None
+async def check_onchain(watcher: LpLockWatcher, token_address: str):
+    """None when the token's LP can't be followed on-chain."""
+    pool = await find_token_pool(token_address)
+    if pool is None:
+        return None
+    watch = await watcher.watch(pool)
+    if watch is None:
+        return None
+    try:
+        await asyncio.wait_for(asyncio.shield(watch.future), max_wait)
+    except asyncio.TimeoutError:
+        pass
+    if watch.outcome == 'locked':
+        return f'Deployer locked lp ({watch.burned_pct + watch.moved_pct:.1f}%) for {token_address}, seen {watch.waited:.0f} seconds after we started watching.'
+    if watch.outcome == 'removed':
+        return f'Deployer removed liquidity of {token_address} after {watch.waited:.0f} seconds.'
+    return f'LP of {token_address} still not locked after ~{max_wait / 60:g} minutes (burnt {watch.burned_pct:.1f}%, moved {watch.moved_pct:.1f}%).'
+
+async def check_rugcheck(service: RugcheckService, token_address: str):
     start_time = time.time()
-    tries = 0
-
-    while not lp or tries <= 300:
-        try:
-            tries += 1
-            res = requests.get(url)
-
-            if res.status_code == 200:
-                data = res.json()
-
-                if 'markets' in data.keys():
-                    lp_locked_perc = data['markets'][0]['lp']['lpLockedPct']
-                    if lp_locked_perc > 98.9:
-                        lp = True
-                        end_time = time.time()
-                        break
-                    else:
-                        print(f'lp not fully locked. Retrying in {retry_interval} second(s).')
-                        time.sleep(retry_interval)
-            else:
-                print(f'Request failed, Error code: {res.status_code}. Retrying in {retry_interval} second(s).')
-                time.sleep(retry_interval)
-        except requests.exceptions.RequestException as e:
-            print(f'Request error, Error code: {res.status_code}. Retrying in {retry_interval} second(s).')
-            print(e)
-            time.sleep(retry_interval)
-        except Exception as e:
-            print(f'Exception, Error code: {res.status_code}. Retrying in {retry_interval} second(s).')
-            print(e)
-            time.sleep(retry_interval)
-    
-    run_time = start_time - end_time
-
-    if lp:
-        return f'Deployer took {run_time} seconds to lock lp for {token_address}.'
+    report = await service.watch(token_address, lp_locked(98.9))
+    run_time = time.time() - start_time
+
+    if report:
+        return f'Deployer took {run_time:.0f} seconds to lock lp ({lp_locked_pct(report)}%) for {token_address}.'
     else:
-        return f'Rug checker failed to check if lp is locked for {token_address} after ~5 minutes.'
+        return f'Rug checker failed to check if lp is locked for {token_address} after ~{max_wait / 60:g} minutes.'
+
+async def check(watcher: LpLockWatcher, service: RugcheckService, token_address: str):
+    try:
+        result = await check_onchain(watcher, token_address)
+    except Exception as e:
+        print(f'Could not watch the LP of {token_address} on-chain ({e}), asking the rug checker.')
+        result = None
+    if result is None:
+        # Not in the pool index, or a pool without LP token (concentrated liquidity)
+        result = await check_rugcheck(service, token_address)
+    return result
+
+async def main():
+    if not token_addresses:
+        sys.exit(f'Usage: {sys.argv[0]} <token_address> [<token_address> ...]')
+    # Tokens in the pool index are followed over account subscriptions, the others are
+    # polled from the same loop, sharing the rug checker's rate limit
+    subscriptions = AccountSubscriptions(websocket_client, commitment=Confirmed)
+    watcher = LpLockWatcher(subscriptions, AccountBatcher(rpc_client(), commitment=Confirmed), timeout=max_wait)
+    service = RugcheckService(rug_checker_url, poll_interval=retry_interval, poll_timeout=max_wait)
+    subscriptions_task = asyncio.create_task(subscriptions.run())
+    try:
+        for result in asyncio.as_completed([check(watcher, service, token_address) for token_address in token_addresses]):
+            print(await result)
+    finally:
+        subscriptions_task.cancel()
+        await asyncio.gather(subscriptions_task, return_exceptions=True)
+        await watcher.close()
+        await service.close()
+        await close_clients()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    asyncio.run(main())
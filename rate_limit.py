@@ -0,0 +1,103 @@
+import time
+import random
+import asyncio
+import logging
+
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `burst`.
+
+    Waiters are served in arrival order, so a busy API can't starve a caller.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.waited = 0.0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= 1
+
+    def pause(self, seconds: float):
+        """Drain the bucket for `seconds`, e.g. when the API answered 429 Retry-After."""
+        self._refill()
+        # Concurrent 429s report the same window, they don't add up
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+def retry_after(res: httpx.Response) -> Optional[float]:
+    value = res.headers.get('Retry-After')
+    if not value:
+        # Telegram gives it in the body instead
+        try:
+            value = res.json()['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # Full jitter, clients retrying together don't hit the API again in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def send_with_retry(send: Callable[[], Awaitable[httpx.Response]],
+                          bucket: Optional[TokenBucket] = None,
+                          retries: int = 4,
+                          backoff: float = 1.0,
+                          max_backoff: float = 30.0,
+                          name: str = 'request') -> httpx.Response:
+    """Send a request through `bucket`, retrying 429s, 5xx and connection errors.
+
+    429s wait for their Retry-After (and hold back the whole bucket meanwhile),
+    everything else backs off with jitter. The last response is returned as is,
+    the last connection error is raised.
+    """
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            res = await send()
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt, backoff, max_backoff)
+            logging.warning(f'{name} failed ({e!r}), retrying in {delay:.1f}s')
+        else:
+            if res.status_code not in RETRY_STATUSES or attempt == retries:
+                return res
+            delay = retry_after(res) if res.status_code == 429 else None
+            if delay is None:
+                delay = backoff_delay(attempt, backoff, max_backoff)
+            elif bucket is not None:
+                # The next acquire waits it out, along with every other caller of this API
+                bucket.pause(delay)
+                logging.warning(f'{name} rate limited, retrying in {delay:.1f}s')
+                continue
+            logging.warning(f'{name} returned {res.status_code}, retrying in {delay:.1f}s')
+        await asyncio.sleep(delay)
@@ -0,0 +1,64 @@
+import base64
+import binascii
+import struct
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+RAY_LOG_PREFIX = 'Program log: ray_log: '
+
+# Raydium AMM v4 LogType::Init
+INIT_LOG_TYPE = 0
+# log_type u8, open_time u64, pc_decimals u8, coin_decimals u8, pc_lot_size u64,
+# coin_lot_size u64, pc_amount u64, coin_amount u64, market [u8; 32]
+INIT_LOG_LAYOUT = struct.Struct('<BQBBQQQQ32s')
+
+@dataclass
+class InitLog:
+    """Pool parameters Raydium emits in the `ray_log` line of an initialize2 transaction."""
+    open_time: int
+    pc_decimals: int
+    coin_decimals: int
+    pc_lot_size: int
+    coin_lot_size: int
+    pc_amount: int
+    coin_amount: int
+    market: Pubkey
+
+    @property
+    def price(self) -> float:
+        """Opening price of one coin token, in pc tokens."""
+        if not self.coin_amount:
+            return 0.0
+        return (self.pc_amount / 10 ** self.pc_decimals) / (self.coin_amount / 10 ** self.coin_decimals)
+
+def decode_ray_log(log: str) -> Optional[InitLog]:
+    if not log.startswith(RAY_LOG_PREFIX):
+        return None
+    try:
+        raw = base64.b64decode(log[len(RAY_LOG_PREFIX):])
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) < INIT_LOG_LAYOUT.size or raw[0] != INIT_LOG_TYPE:
+        return None
+    _, open_time, pc_decimals, coin_decimals, pc_lot_size, coin_lot_size, pc_amount, coin_amount, market = \
+        INIT_LOG_LAYOUT.unpack_from(raw)
+    return InitLog(
+        open_time=open_time,
+        pc_decimals=pc_decimals,
+        coin_decimals=coin_decimals,
+        pc_lot_size=pc_lot_size,
+        coin_lot_size=coin_lot_size,
+        pc_amount=pc_amount,
+        coin_amount=coin_amount,
+        market=Pubkey.from_bytes(market)
+    )
+
+def find_init_log(logs: List[str]) -> Optional[InitLog]:
+    for log in logs:
+        init_log = decode_ray_log(log)
+        if init_log is not None:
+            return init_log
+    return None
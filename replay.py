@@ -0,0 +1,290 @@
+import json
+import time
+import base64
+import asyncio
+import logging
+
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from solders.signature import Signature  # type: ignore
+from solders.rpc.responses import (  # type: ignore
+    GetAccountInfoResp, GetMultipleAccountsResp, GetTokenLargestAccountsResp, GetTransactionResp, RpcLogsResponse,
+    RpcResponseContext
+)
+
+# Requests that carry credentials in their URL (the Telegram bot token) are never written to disk
+DEFAULT_EXCLUDE = ('/sendMessage',)
+
+def account_to_dict(account: Optional[Account]) -> Optional[dict]:
+    if account is None:
+        return None
+    return {
+        'lamports': account.lamports,
+        'data': base64.b64encode(bytes(account.data)).decode(),
+        'owner': str(account.owner),
+        'executable': account.executable,
+        'rentEpoch': account.rent_epoch
+    }
+
+def account_from_dict(data: Optional[dict]) -> Optional[Account]:
+    if data is None:
+        return None
+    return Account(data['lamports'], base64.b64decode(data['data']), Pubkey.from_string(data['owner']),
+                   data['executable'], data['rentEpoch'])
+
+class Recorder:
+    """Appends what the bot sees to a JSON lines file for later replay.
+
+    One line per event, `t` being seconds since the recorder started:
+    `ws` log notifications, `transaction`, `account` and `largest` (getTokenLargestAccounts)
+    RPC responses and `http` API responses, each with the latency it was served with.
+    """
+
+    def __init__(self, path: str, exclude: Iterable[str] = DEFAULT_EXCLUDE):
+        self.path = path
+        self.exclude = tuple(exclude)
+        self.events = 0
+        self._file = open(path, 'a', encoding='utf-8')
+        self._started = time.monotonic()
+
+    def _write(self, kind: str, **fields):
+        fields = {'t': round(time.monotonic() - self._started, 6), 'kind': kind, **fields}
+        self._file.write(json.dumps(fields, separators=(',', ':')) + '\n')
+        self.events += 1
+
+    def record_ws(self, signature, value: Optional[RpcLogsResponse]):
+        if value is None:
+            self._write('ws', signature=str(signature), logs=None, err=None)
+        else:
+            self._write('ws', signature=str(signature), logs=list(value.logs),
+                        err=str(value.err) if value.err is not None else None)
+
+    def record_transaction(self, signature, resp: GetTransactionResp, latency: float):
+        self._write('transaction', signature=str(signature), latency=latency, response=resp.to_json())
+
+    def record_accounts(self, pubkeys, accounts, latency: float):
+        for pubkey, account in zip(pubkeys, accounts):
+            self._write('account', pubkey=str(pubkey), latency=latency, account=account_to_dict(account))
+
+    def record_largest_accounts(self, mint, resp: GetTokenLargestAccountsResp, latency: float):
+        self._write('largest', mint=str(mint), latency=latency, response=resp.to_json())
+
+    def wrap_rpc(self, client):
+        return RecordingClient(client, self)
+
+    def install_http(self, client: httpx.AsyncClient):
+        async def on_request(request: httpx.Request):
+            request.extensions['recorder_started'] = time.monotonic()
+
+        async def on_response(response: httpx.Response):
+            request = response.request
+            url = str(request.url)
+            if any(pattern in url for pattern in self.exclude):
+                return
+            await response.aread()
+            self._write(
+                'http',
+                method=request.method,
+                url=url,
+                body=request.content.decode('utf-8', 'replace'),
+                latency=time.monotonic() - request.extensions.get('recorder_started', time.monotonic()),
+                status=response.status_code,
+                headers={name: value for name, value in response.headers.items()
+                         if name.lower() in ('content-type', 'retry-after')},
+                content=base64.b64encode(response.content).decode()
+            )
+
+        client.event_hooks['request'].append(on_request)
+        client.event_hooks['response'].append(on_response)
+
+    def close(self):
+        self._file.close()
+        logging.info(f'Recorded {self.events} event(s) to {self.path}')
+
+class RecordingClient:
+    """Passes calls through to an AsyncClient, recording the responses replay needs."""
+
+    def __init__(self, client, recorder: Recorder):
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def get_transaction(self, signature, *args, **kwargs):
+        started = time.monotonic()
+        resp = await self._client.get_transaction(signature, *args, **kwargs)
+        self._recorder.record_transaction(signature, resp, time.monotonic() - started)
+        return resp
+
+    async def get_account_info(self, pubkey, *args, **kwargs):
+        started = time.monotonic()
+        resp = await self._client.get_account_info(pubkey, *args, **kwargs)
+        self._recorder.record_accounts([pubkey], [resp.value], time.monotonic() - started)
+        return resp
+
+    async def get_multiple_accounts(self, pubkeys, *args, **kwargs):
+        started = time.monotonic()
+        resp = await self._client.get_multiple_accounts(pubkeys, *args, **kwargs)
+        self._recorder.record_accounts(pubkeys, resp.value, time.monotonic() - started)
+        return resp
+
+    async def get_token_largest_accounts(self, mint, *args, **kwargs):
+        started = time.monotonic()
+        resp = await self._client.get_token_largest_accounts(mint, *args, **kwargs)
+        self._recorder.record_largest_accounts(mint, resp, time.monotonic() - started)
+        return resp
+
+class Recording:
+    """A recorder file loaded for replay."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.notifications: List[dict] = []
+        self.transactions: Dict[str, Tuple[float, str]] = {}
+        self.accounts: Dict[str, Tuple[float, Optional[dict]]] = {}
+        self.largest: Dict[str, Tuple[float, str]] = {}
+        self.http: Dict[Tuple[str, str, str], List[dict]] = {}
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    self.add(json.loads(line))
+
+    def add(self, event: dict):
+        kind = event['kind']
+        if kind == 'ws':
+            self.notifications.append(event)
+        elif kind == 'transaction':
+            # Retries of a transaction that wasn't confirmed yet are replaced by the one that was
+            previous = self.transactions.get(event['signature'])
+            if previous is None or '"result":null' not in event['response']:
+                self.transactions[event['signature']] = (event['latency'], event['response'])
+        elif kind == 'account':
+            self.accounts[event['pubkey']] = (event['latency'], event['account'])
+        elif kind == 'largest':
+            self.largest[event['mint']] = (event['latency'], event['response'])
+        elif kind == 'http':
+            self.http.setdefault((event['method'], event['url'], event['body']), []).append(event)
+
+    @property
+    def duration(self) -> float:
+        if not self.notifications:
+            return 0.0
+        return self.notifications[-1]['t'] - self.notifications[0]['t']
+
+    def __repr__(self):
+        return (f'Recording({self.path}: {len(self.notifications)} notification(s), {len(self.transactions)} transaction(s), '
+                f'{len(self.accounts)} account(s), {sum(map(len, self.http.values()))} HTTP response(s), {self.duration:.1f}s)')
+
+class _Latency:
+    def __init__(self, speed: float):
+        self.speed = speed
+
+    async def wait(self, latency: float):
+        # speed 0 replays as fast as possible, without the recorded latencies
+        if self.speed > 0 and latency > 0:
+            await asyncio.sleep(latency / self.speed)
+
+class ReplayClient(_Latency):
+    """Stands in for AsyncClient, serving recorded responses after their recorded latency / `speed`."""
+
+    def __init__(self, recording: Recording, speed: float = 1.0):
+        super().__init__(speed)
+        self.recording = recording
+        self.misses = 0
+
+    async def get_transaction(self, signature, *args, **kwargs) -> GetTransactionResp:
+        entry = self.recording.transactions.get(str(signature))
+        if entry is None:
+            self.misses += 1
+            return GetTransactionResp(None)
+        await self.wait(entry[0])
+        return GetTransactionResp.from_json(entry[1])
+
+    def _accounts(self, pubkeys) -> Tuple[float, List[Optional[Account]]]:
+        latency, accounts = 0.0, []
+        for pubkey in pubkeys:
+            entry = self.recording.accounts.get(str(pubkey))
+            if entry is None:
+                self.misses += 1
+                accounts.append(None)
+                continue
+            latency = max(latency, entry[0])
+            accounts.append(account_from_dict(entry[1]))
+        return latency, accounts
+
+    async def get_account_info(self, pubkey, *args, **kwargs) -> GetAccountInfoResp:
+        latency, accounts = self._accounts([pubkey])
+        await self.wait(latency)
+        return GetAccountInfoResp(accounts[0], RpcResponseContext(0))
+
+    async def get_multiple_accounts(self, pubkeys, *args, **kwargs) -> GetMultipleAccountsResp:
+        latency, accounts = self._accounts(pubkeys)
+        await self.wait(latency)
+        return GetMultipleAccountsResp(accounts, RpcResponseContext(0))
+
+    async def get_token_largest_accounts(self, mint, *args, **kwargs) -> GetTokenLargestAccountsResp:
+        entry = self.recording.largest.get(str(mint))
+        if entry is None:
+            self.misses += 1
+            return GetTokenLargestAccountsResp([], RpcResponseContext(0))
+        await self.wait(entry[0])
+        return GetTokenLargestAccountsResp.from_json(entry[1])
+
+    async def close(self):
+        pass
+
+class ReplayTransport(_Latency):
+    """httpx transport answering with recorded responses, in recorded order when a URL was
+    requested several times (the last one repeats). Telegram sends succeed, anything
+    else that wasn't recorded is a 404."""
+
+    def __init__(self, recording: Recording, speed: float = 1.0):
+        super().__init__(speed)
+        self.misses = 0
+        self._responses: Dict[Tuple[str, str, str], deque] = {
+            key: deque(events) for key, events in recording.http.items()
+        }
+        # Same request against another host (e.g. a different RUG_CHECKER_URL) still matches
+        self._by_path: Dict[Tuple[str, str, str], deque] = {
+            (method, httpx.URL(url).raw_path.decode(), body): responses
+            for (method, url, body), responses in self._responses.items()
+        }
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.content.decode('utf-8', 'replace')
+        responses = self._responses.get((request.method, str(request.url), body)) \
+            or self._by_path.get((request.method, request.url.raw_path.decode(), body))
+        if not responses:
+            if request.url.path.endswith('/sendMessage'):
+                return httpx.Response(200, json={'ok': True})
+            self.misses += 1
+            return httpx.Response(404, json={'error': 'not recorded'})
+        event = responses.popleft() if len(responses) > 1 else responses[0]
+        await self.wait(event['latency'])
+        return httpx.Response(event['status'], headers=event['headers'], content=base64.b64decode(event['content']))
+
+def replay_http_client(recording: Recording, speed: float = 1.0) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(ReplayTransport(recording, speed)))
+
+async def replay_notifications(recording: Recording,
+                               on_signature: Callable[[Signature, Optional[RpcLogsResponse]], Awaitable[None]],
+                               speed: float = 1.0):
+    """Feed the recorded log notifications to `on_signature` with their recorded spacing / `speed` (0: no spacing)."""
+    if not recording.notifications:
+        return
+    first = recording.notifications[0]['t']
+    started = time.monotonic()
+    for event in recording.notifications:
+        if speed > 0:
+            delay = (event['t'] - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        signature = Signature.from_string(event['signature'])
+        value = RpcLogsResponse(signature, None, event['logs']) if event['logs'] is not None else None
+        await on_signature(signature, value)
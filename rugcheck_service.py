@@ -0,0 +1,198 @@
+import time
+import asyncio
+import inspect
+import logging
+
+from typing import Any, Callable, Dict, Optional
+
+from clients import http_client
+from cache import TTLCache
+from rate_limit import TokenBucket, send_with_retry
+import metrics
+
+LP_LOCKED_THRESHOLD = 98.9
+
+def lp_locked_pct(report: dict) -> Optional[float]:
+    markets = report.get('markets') or []
+    if not markets or not markets[0].get('lp'):
+        return None
+    return markets[0]['lp'].get('lpLockedPct')
+
+def lp_locked(threshold: float = LP_LOCKED_THRESHOLD) -> Callable[[dict], bool]:
+    def condition(report: dict) -> bool:
+        pct = lp_locked_pct(report)
+        return pct is not None and pct > threshold
+    return condition
+
+class Watch:
+    __slots__ = ('token_address', 'condition', 'context', 'started', 'deadline', 'polls', 'future')
+
+    def __init__(self, token_address: str, condition: Callable[[dict], bool], context: Any,
+                 timeout: float, future: asyncio.Future):
+        self.token_address = token_address
+        self.condition = condition
+        self.context = context
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.polls = 0
+        self.future = future
+
+class RugcheckService:
+    """Rugcheck API client shared by every token the bot looks at.
+
+    Requests go through a token bucket (`rate` per second, bursts of `burst`),
+    429s honour Retry-After and other failures back off with jitter. Reports are
+    cached for `cache_ttl` seconds and concurrent lookups of a token share one
+    request.
+
+    `watch` registers a token to be re-checked every `poll_interval` seconds until
+    its report satisfies a condition (by default its LP being locked); a single
+    loop polls every watched token. `on_eligible(token_address, report, waited, context)`
+    is called when one does and `on_expired(token_address, context)` when it
+    doesn't within the timeout, both may be coroutines.
+    """
+
+    def __init__(self,
+                 url_template: str,
+                 rate: float = 2.0,
+                 burst: int = 5,
+                 retries: int = 4,
+                 backoff: float = 1.0,
+                 cache_ttl: float = 60.0,
+                 cache_size: int = 10_000,
+                 poll_interval: float = 5.0,
+                 poll_timeout: float = 300.0,
+                 on_eligible: Optional[Callable] = None,
+                 on_expired: Optional[Callable] = None):
+        self.url_template = url_template
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl, negative_ttl=min(cache_ttl, 10.0))
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self.on_eligible = on_eligible
+        self.on_expired = on_expired
+        self.requests = 0
+        self.eligible = 0
+        self.expired = 0
+        self._watches: Dict[str, Watch] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._callbacks = set()
+
+    def url(self, token_address) -> str:
+        return self.url_template.replace('<token_address>', str(token_address))
+
+    async def _fetch(self, token_address: str) -> Optional[dict]:
+        self.requests += 1
+        with metrics.timer('api.rugcheck'):
+            res = await send_with_retry(
+                lambda: http_client().get(self.url(token_address)),
+                self.bucket,
+                retries=self.retries,
+                backoff=self.backoff,
+                name=f'Rugcheck for {token_address}'
+            )
+        if res.status_code != 200:
+            logging.warning(f'Rugcheck API call failed for {token_address} | code: {res.status_code}')
+            return None
+        data = res.json()
+        if not data or 'error' in data:
+            logging.warning(f'Rugcheck has no report for {token_address}: {data}')
+            return None
+        return data
+
+    async def report(self, token_address, fresh: bool = False) -> Optional[dict]:
+        """The token's rugcheck report, None if the API has none. Connection errors are raised."""
+        key = str(token_address)
+        if fresh:
+            data = await self._fetch(key)
+            self.cache.set(key, data)
+            return data
+        return await self.cache.get_or_fetch(key, lambda: self._fetch(key))
+
+    def watch(self,
+              token_address,
+              condition: Callable[[dict], bool] = lp_locked(),
+              timeout: Optional[float] = None,
+              context: Any = None) -> asyncio.Future:
+        """Poll the token until `condition(report)` holds. The returned future resolves
+        to the report, or None once `timeout` (default `poll_timeout`) has passed."""
+        key = str(token_address)
+        if key in self._watches:
+            return self._watches[key].future
+        future = asyncio.get_running_loop().create_future()
+        self._watches[key] = Watch(key, condition, context, timeout or self.poll_timeout, future)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll(), name='rugcheck-poller')
+        return future
+
+    @property
+    def pending(self) -> int:
+        return len(self._watches)
+
+    async def _poll(self):
+        while self._watches:
+            started = time.monotonic()
+            await asyncio.gather(*(self._check(watch) for watch in list(self._watches.values())))
+            await asyncio.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+    async def _check(self, watch: Watch):
+        watch.polls += 1
+        try:
+            data = await self.report(watch.token_address, fresh=True)
+        except Exception as e:
+            logging.warning(f'Rugcheck poll for {watch.token_address} failed: {e}')
+            data = None
+        waited = time.monotonic() - watch.started
+        if data is not None and watch.condition(data):
+            self.eligible += 1
+            del self._watches[watch.token_address]
+            logging.info(f'{watch.token_address} became eligible after {waited:.1f}s ({watch.polls} poll(s))')
+            watch.future.set_result(data)
+            self._emit(self.on_eligible, watch.token_address, data, waited, watch.context)
+        elif time.monotonic() >= watch.deadline:
+            self.expired += 1
+            del self._watches[watch.token_address]
+            logging.info(f'{watch.token_address} not eligible after {waited:.1f}s ({watch.polls} poll(s)), giving up')
+            watch.future.set_result(None)
+            self._emit(self.on_expired, watch.token_address, watch.context)
+
+    def _emit(self, callback: Optional[Callable], *args):
+        if callback is None:
+            return
+        try:
+            result = callback(*args)
+        except Exception as e:
+            logging.error(f'Rugcheck event handler failed for {args[0]}: {e}')
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._callbacks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f'Rugcheck event handler failed: {task.exception()}')
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'pending': self.pending,
+            'eligible': self.eligible,
+            'expired': self.expired,
+            'rateLimitedFor': round(self.bucket.waited, 1),
+            'cache': self.cache.stats()
+        }
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        for watch in self._watches.values():
+            if not watch.future.done():
+                watch.future.cancel()
+        self._watches.clear()
+        await asyncio.gather(*self._callbacks, return_exceptions=True)
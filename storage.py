@@ -0,0 +1,131 @@
+import os
+import csv
+import asyncio
+import logging
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils import lock_file, unlock_file
+from log_config import console
+
+# Every token file has these columns in this order, whichever stage wrote the row
+TOKEN_FIELDS = [
+    'timestamp', 'address', 'symbol', 'name', 'isScam', 'totalSupply', 'creatorAddress',
+    'website', 'telegram', 'twitter', 'pairAddress', 'price', 'liquidity', 'fdv',
+    'risks', 'topHoldersSupplyPct', 'topHolders'
+]
+NUMERIC_FIELDS = ['totalSupply', 'price', 'liquidity', 'fdv']
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class TokenSink:
+    """Buffered writer of token rows to daily `{prefix}_{YYYY-MM-DD}.csv` files.
+
+    Rows are buffered in memory and written from a worker thread once `flush_size`
+    rows are pending or every `flush_interval` seconds. With `parquet` each flush
+    also writes a Parquet part under `{directory}/parquet/{prefix}/date=YYYY-MM-DD/`,
+    so `pandas.read_parquet(f'{directory}/parquet/{prefix}')` loads every day at once.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 prefix: str,
+                 flush_size: int = 100,
+                 flush_interval: float = 5.0,
+                 parquet: bool = False):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.parquet = parquet
+        if parquet and not parquet_available():
+            logging.error('Parquet output needs pyarrow (pip install pyarrow), writing CSV only')
+            self.parquet = False
+        self.rows_written = 0
+        self._buffer: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes = set()
+
+    def start(self):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_periodically(), name=f'sink-{self.prefix}')
+
+    def add(self, data: dict):
+        row = {field: data.get(field, '') for field in TOKEN_FIELDS}
+        self._buffer.append(row)
+        if len(self._buffer) >= self.flush_size:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def file_path(self, day: str) -> str:
+        return f'{self.directory}/{self.prefix}_{day}.csv'
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        async with self._lock:
+            try:
+                await asyncio.to_thread(self._write, rows)
+                self.rows_written += len(rows)
+            except Exception as e:
+                logging.error('Failed to write %s row(s) to %s: %s', len(rows), self.prefix, e)
+                console(f'Failed to write {len(rows)} row(s) to {self.prefix}:', e)
+                # Keep them for the next flush rather than losing detections
+                self._buffer[:0] = rows
+
+    def _write(self, rows: List[dict]):
+        by_day: Dict[str, List[dict]] = {}
+        for row in rows:
+            timestamp = row['timestamp']
+            day = timestamp.strftime('%Y-%m-%d') if isinstance(timestamp, datetime) else str(timestamp)[:10]
+            by_day.setdefault(day, []).append(row)
+
+        for day, day_rows in by_day.items():
+            file_path = self.file_path(day)
+            lock = lock_file(file_path)
+            try:
+                file_exists = os.path.isfile(file_path)
+                with open(file_path, 'a', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=TOKEN_FIELDS)
+                    if not file_exists:
+                        writer.writeheader()
+                    writer.writerows(day_rows)
+            finally:
+                unlock_file(lock)
+            if self.parquet:
+                self._write_parquet(day, day_rows)
+
+    def _write_parquet(self, day: str, rows: List[dict]):
+        import pandas as pd
+
+        frame = pd.DataFrame(rows, columns=TOKEN_FIELDS)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'], errors='coerce')
+        for field in NUMERIC_FIELDS:
+            frame[field] = pd.to_numeric(frame[field], errors='coerce')
+        for field in set(TOKEN_FIELDS) - set(NUMERIC_FIELDS) - {'timestamp'}:
+            frame[field] = frame[field].astype('string')
+        part_dir = f'{self.directory}/parquet/{self.prefix}/date={day}'
+        os.makedirs(part_dir, exist_ok=True)
+        frame.to_parquet(f"{part_dir}/part-{datetime.now().strftime('%H%M%S%f')}.parquet", index=False)
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,125 @@
+"""Local stand-ins for the Solana websocket RPC."""
+import json
+import base64
+import asyncio
+
+from typing import Dict, List
+
+import websockets
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from holders import TOKEN_ACCOUNT_LAYOUT
+
+TOKEN_PROGRAM = 'TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA'
+
+def token_account_data(amount: int) -> bytes:
+    return TOKEN_ACCOUNT_LAYOUT.pack(bytes(Pubkey.new_unique()), bytes(Pubkey.new_unique()), amount) + bytes(93)
+
+class FakeAccountServer:
+    """accountSubscribe/accountUnsubscribe over a local websocket, answering unsubscribes
+    with a bare `true` like the real RPC. `notify` pushes a token account change."""
+
+    def __init__(self):
+        self.connections = 0
+        self.subscribed: List[str] = []
+        self.unsubscribed: List[int] = []
+        self._subscriptions: Dict[str, int] = {}
+        self._websocket = None
+        self._server = None
+        self._next_id = 0
+
+    @property
+    def endpoint(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]
+        return f'ws://127.0.0.1:{port}'
+
+    async def __aenter__(self):
+        self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        self._websocket = websocket
+        self._subscriptions.clear()
+        async for raw in websocket:
+            request = json.loads(raw)
+            if request['method'] == 'accountSubscribe':
+                self._next_id += 1
+                account = request['params'][0]
+                self._subscriptions[account] = self._next_id
+                self.subscribed.append(account)
+                await websocket.send(json.dumps({'jsonrpc': '2.0', 'result': self._next_id, 'id': request['id']}))
+            elif request['method'] == 'accountUnsubscribe':
+                subscription = request['params'][0]
+                self.unsubscribed.append(subscription)
+                self._subscriptions = {account: id_ for account, id_ in self._subscriptions.items() if id_ != subscription}
+                await websocket.send(json.dumps({'jsonrpc': '2.0', 'result': True, 'id': request['id']}))
+
+    def is_subscribed(self, pubkey: Pubkey) -> bool:
+        return str(pubkey) in self._subscriptions
+
+    async def notify(self, pubkey: Pubkey, amount: int, slot: int):
+        value = {
+            'lamports': 2039280, 'data': [base64.b64encode(token_account_data(amount)).decode(), 'base64'],
+            'owner': TOKEN_PROGRAM, 'executable': False, 'rentEpoch': 0, 'space': 165
+        }
+        await self._websocket.send(json.dumps({
+            'jsonrpc': '2.0', 'method': 'accountNotification',
+            'params': {'result': {'context': {'slot': slot}, 'value': value}, 'subscription': self._subscriptions[str(pubkey)]}
+        }))
+
+class FakeLogsServer:
+    """logsSubscribe over a local websocket. Subscriptions are numbered from `first_id` in
+    request order; `notify` pushes a log notification on the n-th one and `drop` closes
+    the current connection."""
+
+    def __init__(self, first_id: int = 1):
+        self.first_id = first_id
+        self.connections = 0
+        self.subscriptions: List[int] = []
+        self._websocket = None
+        self._server = None
+
+    @property
+    def endpoint(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]
+        return f'ws://127.0.0.1:{port}'
+
+    async def __aenter__(self):
+        self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        self._websocket = websocket
+        self.subscriptions = []
+        async for raw in websocket:
+            request = json.loads(raw)
+            if request['method'] == 'logsSubscribe':
+                self.subscriptions.append(self.first_id + len(self.subscriptions))
+                await websocket.send(json.dumps({'jsonrpc': '2.0', 'result': self.subscriptions[-1], 'id': request['id']}))
+
+    async def notify(self, index: int, signature: str, slot: int, logs: List[str]):
+        await self._websocket.send(json.dumps({
+            'jsonrpc': '2.0', 'method': 'logsNotification',
+            'params': {'result': {'context': {'slot': slot}, 'value': {'signature': signature, 'err': None, 'logs': logs}},
+                       'subscription': self.subscriptions[index]}
+        }))
+
+    async def drop(self):
+        await self._websocket.close()
+
+async def wait_until(condition, timeout: float = 2.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
@@ -0,0 +1,33 @@
+import asyncio
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from account_subscriptions import AccountSubscriptions
+from fake_rpc import FakeAccountServer, wait_until
+from lp_watcher import token_account_amount
+
+def test_unsubscribe_keeps_the_connection():
+    async def scenario():
+        async with FakeAccountServer() as server:
+            subscriptions = AccountSubscriptions(server.endpoint)
+            kept, dropped = Pubkey.new_unique(), Pubkey.new_unique()
+            seen = []
+            subscriptions.subscribe(kept, lambda pubkey, account, slot: seen.append((token_account_amount(account), slot)))
+            subscriptions.subscribe(dropped, lambda *args: None)
+            task = asyncio.create_task(subscriptions.run())
+            try:
+                await wait_until(lambda: server.is_subscribed(kept) and server.is_subscribed(dropped))
+                subscriptions.unsubscribe(dropped)
+                await wait_until(lambda: server.unsubscribed)
+                await server.notify(kept, 42, slot=7)
+                await wait_until(lambda: seen)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            assert seen == [(42, 7)]
+            assert server.connections == 1
+            assert subscriptions.reconnects == 0
+            assert len(server.subscribed) == 2
+            assert len(subscriptions) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import json
+import time
+import asyncio
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from alerts import COALESCE_SEPARATOR, TelegramDispatcher
+from clients import close_clients
+from fake_rpc import wait_until
+
+class StubTelegram:
+    """sendMessage on a local HTTP server, recording (time, chat_id, text) of every request.
+    Queued `responses` (status, body) are answered first, then 200s."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append((time.monotonic(), body['chat_id'], body['text']))
+                status, reply = stub.responses.pop(0) if stub.responses else (200, {'ok': True})
+                raw = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def texts(self, chat_id: str):
+        return [text for _, chat, text in self.requests if chat == chat_id]
+
+    def times(self, chat_id: str):
+        return [at for at, chat, _ in self.requests if chat == chat_id]
+
+def dispatch(stub: StubTelegram, messages, **kwargs) -> TelegramDispatcher:
+    async def scenario():
+        dispatcher = TelegramDispatcher(stub.base_url, 'token', 'alerts', **kwargs)
+        try:
+            for chat_id, text in messages:
+                dispatcher.enqueue(text, chat_id)
+            await wait_until(lambda: dispatcher.depth == 0 and dispatcher.sent + dispatcher.failed == len(messages), timeout=5)
+            await dispatcher.close()
+        finally:
+            await close_clients()
+        return dispatcher
+
+    return asyncio.run(scenario())
+
+def test_each_chat_is_paced_on_its_own():
+    with StubTelegram() as stub:
+        dispatcher = dispatch(stub, [('busy', 'one'), ('busy', 'two'), ('busy', 'three'), ('quiet', 'alone')], rate=2, burst=1)
+    assert stub.texts('busy') == ['one', 'two', 'three']
+    assert stub.texts('quiet') == ['alone']
+    busy = stub.times('busy')
+    # 2 per second after the first, less the first request's connection setup
+    assert busy[2] - busy[0] >= 0.75
+    # The quiet chat doesn't wait behind the busy one
+    assert stub.times('quiet')[0] < busy[1]
+    assert dispatcher.stats()['sent'] == 4
+
+def test_bursts_are_coalesced_within_the_length_limit():
+    long_alerts = ['x' * 2500, 'y' * 2500]
+    with StubTelegram() as stub:
+        dispatcher = dispatch(stub, [(None, 'a'), (None, 'b'), (None, long_alerts[0]), (None, long_alerts[1]), (None, 'c')],
+                              coalesce_window=0.3, max_coalesce=5)
+    assert stub.texts('alerts') == [COALESCE_SEPARATOR.join(['a', 'b', long_alerts[0]]),
+                                    COALESCE_SEPARATOR.join([long_alerts[1], 'c'])]
+    assert all(len(text) <= 4096 for text in stub.texts('alerts'))
+    assert dispatcher.stats()['sent'] == 5
+    assert dispatcher.stats()['coalesced'] == 3
+
+def test_rate_limited_message_is_retried_after_retry_after():
+    with StubTelegram() as stub:
+        stub.responses.append((429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                                     'parameters': {'retry_after': 1}}))
+        dispatcher = dispatch(stub, [(None, 'alert')])
+    assert stub.texts('alerts') == ['alert', 'alert']
+    first, retry = stub.times('alerts')
+    assert retry - first >= 0.9
+    assert dispatcher.stats()['sent'] == 1
+    assert dispatcher.stats()['failed'] == 0
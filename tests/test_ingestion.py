@@ -0,0 +1,93 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from solders.signature import Signature  # type: ignore
+
+from dedup import SignatureDeduper
+from dexes import DEXES
+from fake_rpc import FakeLogsServer, wait_until
+from ingestion import MultiEndpointListener
+
+RAYDIUM_LOGS = ['Program log: initialize2: InitializeInstruction2 {}']
+
+class FakeRpc:
+    """getSignaturesForAddress answering with `statuses`, newest first."""
+
+    def __init__(self):
+        self.statuses = []
+        self.requests = 0
+
+    async def get_signatures_for_address(self, address, before=None, limit=None, commitment=None):
+        self.requests += 1
+        return SimpleNamespace(value=self.statuses)
+
+async def listening(listener: MultiEndpointListener, servers, scenario):
+    task = asyncio.create_task(listener.run())
+    try:
+        await wait_until(lambda: all(server.subscriptions for server in servers))
+        # Give the listener time to route the confirmed subscriptions
+        await asyncio.sleep(0.05)
+        await scenario()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+def test_each_signature_is_handled_once_whichever_endpoint_delivers_it():
+    async def scenario():
+        async with FakeLogsServer(first_id=10) as fast, FakeLogsServer(first_id=20) as slow:
+            signatures = [str(Signature.new_unique()) for _ in range(3)]
+            handled = []
+
+            async def on_signature(signature, value):
+                handled.append(str(signature))
+
+            listener = MultiEndpointListener([fast.endpoint, slow.endpoint], [DEXES['raydium']], 'processed',
+                                             SignatureDeduper(), on_signature)
+
+            async def race():
+                await fast.notify(0, signatures[0], 100, RAYDIUM_LOGS)
+                await slow.notify(0, signatures[1], 100, RAYDIUM_LOGS)
+                await wait_until(lambda: len(handled) == 2)
+                await slow.notify(0, signatures[0], 100, RAYDIUM_LOGS)
+                await fast.notify(0, signatures[1], 100, RAYDIUM_LOGS)
+                # Not a pool creation
+                await fast.notify(0, signatures[2], 101, ['Program log: swap'])
+                await wait_until(lambda: listener.stats[fast.endpoint].notifications + listener.stats[slow.endpoint].notifications == 4)
+
+            await listening(listener, (fast, slow), race)
+            assert handled == signatures[:2]
+            assert listener.stats[fast.endpoint].first_arrivals == 1
+            assert listener.stats[slow.endpoint].first_arrivals == 1
+            assert listener.last_slot == 101
+
+    asyncio.run(scenario())
+
+def test_reconnect_backfills_from_the_last_slot_seen():
+    async def scenario():
+        async with FakeLogsServer() as server:
+            seen, same_slot, later, older = (str(Signature.new_unique()) for _ in range(4))
+            handled = []
+
+            async def on_signature(signature, value):
+                handled.append(str(signature))
+
+            rpc = FakeRpc()
+            rpc.statuses = [SimpleNamespace(signature=Signature.from_string(signature), slot=slot, err=None)
+                            for signature, slot in ((later, 101), (same_slot, 100), (seen, 100), (older, 99))]
+            listener = MultiEndpointListener([server.endpoint], [DEXES['raydium']], 'processed',
+                                             SignatureDeduper(), on_signature, rpc_client=rpc)
+
+            async def gap():
+                await server.notify(0, seen, 100, RAYDIUM_LOGS)
+                await wait_until(lambda: handled)
+                await server.drop()
+                await wait_until(lambda: len(handled) == 3)
+
+            await listening(listener, (server,), gap)
+            assert handled == [seen, same_slot, later]
+            assert server.connections == 2
+            assert rpc.requests == 1
+            assert listener.stats[server.endpoint].reconnects == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from pool_index import PoolIndex
+
+def make_pool(deployer: Pubkey) -> SimpleNamespace:
+    return SimpleNamespace(pair=Pubkey.new_unique(), base_mint=Pubkey.new_unique(), quote_mint=Pubkey.new_unique(),
+                           lp_mint=None, deployer=deployer, open_time=0)
+
+def test_a_pool_marked_rugged_twice_counts_one_rug():
+    index = PoolIndex(':memory:')
+    deployer = Pubkey.new_unique()
+    first, second = make_pool(deployer), make_pool(deployer)
+    for pool in (first, second):
+        index.record_pool(pool)
+    # The LP watcher and the pool tracker can both see the same rug
+    index.mark_outcome(first.pair, 'rugged', deployer=deployer)
+    index.mark_outcome(first.pair, 'rugged', deployer=deployer)
+    assert index.deployer(deployer).rugs == 1
+    index.mark_outcome(second.pair, 'rugged', deployer=deployer)
+    assert index.deployer(deployer).rugs == 2
+    assert index.deployer(deployer).launches == 2
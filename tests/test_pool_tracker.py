@@ -0,0 +1,59 @@
+import asyncio
+
+from solders.account import Account  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+
+from account_subscriptions import AccountSubscriptions
+from fake_rpc import TOKEN_PROGRAM, FakeAccountServer, token_account_data, wait_until
+from pool_tracker import LIQUIDITY_REMOVED, PoolTracker
+from tx_decoder import DecodedPool
+
+def make_pool() -> DecodedPool:
+    return DecodedPool(pair=Pubkey.new_unique(), base_mint=Pubkey.new_unique(), quote_mint=Pubkey.new_unique(), lp_mint=None,
+                       base_vault=Pubkey.new_unique(), quote_vault=Pubkey.new_unique(), deployer=Pubkey.new_unique(),
+                       open_time=0, base_reserve=0, quote_reserve=0, base_decimals=6, quote_decimals=9)
+
+class Vaults:
+    """Account batcher answering with fixed token account balances."""
+
+    def __init__(self):
+        self.amounts = {}
+
+    async def get_account(self, pubkey: Pubkey):
+        return Account(2039280, token_account_data(self.amounts[pubkey]), Pubkey.from_string(TOKEN_PROGRAM), False, 0)
+
+def test_untracking_keeps_the_other_pools_subscribed():
+    async def scenario():
+        async with FakeAccountServer() as server:
+            subscriptions = AccountSubscriptions(server.endpoint)
+            vaults = Vaults()
+            events = []
+            tracker = PoolTracker(subscriptions, vaults, max_pools=4, history=8,
+                                  on_event=lambda tracked, event, details: events.append((tracked.pool.pair, event)))
+            rugged, kept = make_pool(), make_pool()
+            for pool in (rugged, kept):
+                vaults.amounts[pool.base_vault] = 1_000 * 10 ** 6
+                vaults.amounts[pool.quote_vault] = 10 * 10 ** 9
+                assert await tracker.track(pool) is not None
+            task = asyncio.create_task(subscriptions.run())
+            try:
+                await wait_until(lambda: all(server.is_subscribed(vault) for pool in (rugged, kept)
+                                             for vault in (pool.base_vault, pool.quote_vault)))
+                # Liquidity pulled, the pool is dropped and both its vaults unsubscribed
+                await server.notify(rugged.base_vault, 10 * 10 ** 6, slot=2)
+                await server.notify(rugged.quote_vault, 10 ** 8, slot=2)
+                await wait_until(lambda: len(server.unsubscribed) == 2)
+                # A swap on the other pool
+                await server.notify(kept.base_vault, 900 * 10 ** 6, slot=3)
+                await server.notify(kept.quote_vault, 11 * 10 ** 9, slot=3)
+                await wait_until(lambda: tracker.counts[tracker.rows[kept.pair]] == 2)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await tracker.close()
+            assert events == [(rugged.pair, LIQUIDITY_REMOVED)]
+            assert server.connections == 1
+            assert subscriptions.reconnects == 0
+            assert len(server.subscribed) == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,301 @@
+import struct
+import hashlib
+import base58
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.responses import GetTransactionResp # type: ignore
+from solders.transaction_status import UiPartiallyDecodedInstruction, ParsedInstruction # type: ignore
+
+from utils import instructions_with_program_id
+
+TOKEN_PROGRAM_ID = Pubkey.from_string('TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA')
+WSOL_MINT = Pubkey.from_string('So11111111111111111111111111111111111111112')
+
+# Raydium AMM v4 initialize2 account indexes
+AMM_ID = 4
+LP_MINT = 7
+COIN_MINT = 8
+PC_MINT = 9
+POOL_COIN_VAULT = 10
+POOL_PC_VAULT = 11
+USER_WALLET = 17
+
+INITIALIZE2_DISCRIMINATOR = 1
+# discriminator u8, nonce u8, open_time u64, init_pc_amount u64, init_coin_amount u64
+INITIALIZE2_LAYOUT = struct.Struct('<BBQQQ')
+
+def anchor_discriminator(name: str) -> bytes:
+    """How Anchor programs tag an instruction: the first 8 bytes of sha256('global:<name>')."""
+    return hashlib.sha256(f'global:{name}'.encode()).digest()[:8]
+
+# Raydium CPMM initialize: creator, amm_config, authority, pool_state, token_0_mint, token_1_mint,
+# lp_mint, creator_token_0, creator_token_1, creator_lp_token, token_0_vault, token_1_vault, ...
+CPMM_INITIALIZE = anchor_discriminator('initialize')
+# discriminator [u8; 8], init_amount_0 u64, init_amount_1 u64, open_time u64
+CPMM_INITIALIZE_LAYOUT = struct.Struct('<8sQQQ')
+
+# Raydium CLMM create_pool: pool_creator, amm_config, pool_state, token_mint_0, token_mint_1,
+# token_vault_0, token_vault_1, observation_state, tick_array_bitmap, ...
+CLMM_CREATE_POOL = anchor_discriminator('create_pool')
+# discriminator [u8; 8], sqrt_price_x64 u128, open_time u64
+CLMM_CREATE_POOL_LAYOUT = struct.Struct('<8s16sQ')
+
+# PumpSwap create_pool: pool, global_config, creator, base_mint, quote_mint, lp_mint,
+# user_base_token_account, user_quote_token_account, user_pool_token_account,
+# pool_base_token_account, pool_quote_token_account, ...
+PUMPSWAP_CREATE_POOL = anchor_discriminator('create_pool')
+# discriminator [u8; 8], index u16, base_amount_in u64, quote_amount_in u64, then coin_creator
+# [u8; 32] in pools migrated from pump.fun
+PUMPSWAP_CREATE_POOL_LAYOUT = struct.Struct('<8sHQQ')
+
+# Meteora DLMM initialize_lb_pair: lb_pair, bin_array_bitmap_extension, token_mint_x, token_mint_y,
+# reserve_x, reserve_y, oracle, preset_parameter, funder, ...
+DLMM_INITIALIZE_LB_PAIR = anchor_discriminator('initialize_lb_pair')
+# discriminator [u8; 8], active_id i32, bin_step u16
+DLMM_INITIALIZE_LB_PAIR_LAYOUT = struct.Struct('<8siH')
+
+@dataclass
+class DecodedPool:
+    """Pool state at creation, in raw token units unless stated otherwise.
+
+    `base` is the launched token and `quote` the token it is paired with (usually WSOL),
+    whatever order the DEX stored them in (coin/pc, token 0/1, x/y).
+    """
+    pair: Pubkey
+    base_mint: Pubkey
+    quote_mint: Pubkey
+    lp_mint: Optional[Pubkey]
+    base_vault: Pubkey
+    quote_vault: Pubkey
+    deployer: Pubkey
+    open_time: int
+    base_reserve: int
+    quote_reserve: int
+    base_decimals: Optional[int] = None
+    quote_decimals: Optional[int] = None
+    base_supply: Optional[int] = None
+    lp_supply: Optional[int] = None
+    # Quote tokens per base token the pool was created at, for concentrated liquidity pools
+    # which can be created before any liquidity is added
+    initial_price: Optional[float] = None
+
+    @property
+    def base_reserve_ui(self) -> float:
+        return self.base_reserve / 10 ** (self.base_decimals or 0)
+
+    @property
+    def quote_reserve_ui(self) -> float:
+        return self.quote_reserve / 10 ** (self.quote_decimals or 0)
+
+    @property
+    def price(self) -> float:
+        """Opening price of one base token, in quote tokens."""
+        if self.initial_price is not None:
+            return self.initial_price
+        return self.quote_reserve_ui / self.base_reserve_ui if self.base_reserve else 0.0
+
+    @property
+    def liquidity(self) -> float:
+        """Total pool liquidity, in quote tokens (both sides valued at the opening price)."""
+        return self.quote_reserve_ui + self.base_reserve_ui * self.price
+
+    @property
+    def base_supply_ui(self) -> Optional[float]:
+        if self.base_supply is None or self.base_decimals is None:
+            return None
+        return self.base_supply / 10 ** self.base_decimals
+
+def instruction_data(instruction: UiPartiallyDecodedInstruction) -> bytes:
+    data = instruction.data
+    return base58.b58decode(data) if isinstance(data, str) else bytes(data)
+
+def decode_initialize2_data(data: Union[str, bytes]) -> Optional[dict]:
+    raw = base58.b58decode(data) if isinstance(data, str) else data
+    if len(raw) < INITIALIZE2_LAYOUT.size or raw[0] != INITIALIZE2_DISCRIMINATOR:
+        return None
+    _, nonce, open_time, init_pc_amount, init_coin_amount = INITIALIZE2_LAYOUT.unpack_from(raw)
+    return {
+        'nonce': nonce,
+        'openTime': open_time,
+        'initPcAmount': init_pc_amount,
+        'initCoinAmount': init_coin_amount
+    }
+
+def program_instructions(transaction: GetTransactionResp,
+                         program_id: Pubkey) -> Iterator[UiPartiallyDecodedInstruction]:
+    """Instructions of `program_id`, top level first then those it was invoked with through CPI."""
+    tx = transaction.value.transaction
+    instructions = list(tx.transaction.message.instructions)
+    for inner in tx.meta.inner_instructions or []:
+        instructions.extend(inner.instructions)
+    for instruction in instructions_with_program_id(instructions, program_id):
+        if isinstance(instruction, UiPartiallyDecodedInstruction):
+            yield instruction
+
+def post_token_balances(transaction: GetTransactionResp) -> Dict[Pubkey, tuple]:
+    """Post-transaction token balances keyed by token account: (mint, raw amount, decimals)."""
+    tx = transaction.value.transaction
+    account_keys = [account.pubkey for account in tx.transaction.message.account_keys]
+    balances = {}
+    for balance in tx.meta.post_token_balances or []:
+        amount = balance.ui_token_amount
+        balances[account_keys[balance.account_index]] = (balance.mint, int(amount.amount), amount.decimals)
+    return balances
+
+def minted_amounts(transaction: GetTransactionResp) -> Dict[Pubkey, int]:
+    """Total raw amount minted per mint by the transaction's inner `mintTo` instructions."""
+    minted: Dict[Pubkey, int] = {}
+    for inner in transaction.value.transaction.meta.inner_instructions or []:
+        for instruction in instructions_with_program_id(inner.instructions, TOKEN_PROGRAM_ID):
+            if not isinstance(instruction, ParsedInstruction):
+                continue
+            parsed = instruction.parsed
+            if parsed.get('type') not in ('mintTo', 'mintToChecked'):
+                continue
+            info = parsed['info']
+            mint = Pubkey.from_string(info['mint'])
+            amount = info['amount'] if 'amount' in info else info['tokenAmount']['amount']
+            minted[mint] = minted.get(mint, 0) + int(amount)
+    return minted
+
+def build_pool(transaction: GetTransactionResp,
+               pair: Pubkey,
+               deployer: Pubkey,
+               first: Tuple[Pubkey, Pubkey, int],
+               second: Tuple[Pubkey, Pubkey, int],
+               lp_mint: Optional[Pubkey] = None,
+               open_time: int = 0,
+               raw_price: Optional[float] = None) -> DecodedPool:
+    """A DecodedPool from the pool's two sides as the DEX orders them, each (mint, vault, amount
+    deposited according to the instruction).
+
+    Reserves come from the vaults' post balances (falling back to the deposited amounts);
+    supplies are only known when minted by this transaction. `raw_price` is the price of the
+    first token in raw units of the second, as concentrated liquidity pools store it.
+    """
+    balances = post_token_balances(transaction)
+    minted = minted_amounts(transaction)
+
+    def side(mint: Pubkey, vault: Pubkey, fallback: int):
+        if vault in balances:
+            _, amount, decimals = balances[vault]
+            return mint, vault, amount, decimals
+        return mint, vault, fallback, (9 if mint == WSOL_MINT else None)
+
+    first, second = side(*first), side(*second)
+    flipped = first[0] == WSOL_MINT
+    base, quote = (second, first) if flipped else (first, second)
+
+    initial_price = None
+    if raw_price is not None and raw_price > 0 and base[3] is not None and quote[3] is not None:
+        price = 1 / raw_price if flipped else raw_price
+        initial_price = price * 10 ** (base[3] - quote[3])
+
+    return DecodedPool(
+        pair=pair,
+        base_mint=base[0],
+        quote_mint=quote[0],
+        lp_mint=lp_mint,
+        base_vault=base[1],
+        quote_vault=quote[1],
+        deployer=deployer,
+        open_time=open_time,
+        base_reserve=base[2],
+        quote_reserve=quote[2],
+        base_decimals=base[3],
+        quote_decimals=quote[3],
+        base_supply=minted.get(base[0]),
+        lp_supply=minted.get(lp_mint) if lp_mint is not None else None,
+        initial_price=initial_price
+    )
+
+def decode_pool(transaction: GetTransactionResp, instruction: UiPartiallyDecodedInstruction) -> Optional[DecodedPool]:
+    """Decode a Raydium AMM v4 initialize2 instruction plus the balances it left behind."""
+    data = decode_initialize2_data(instruction.data)
+    if data is None:
+        return None
+    accounts = instruction.accounts
+    return build_pool(
+        transaction,
+        pair=accounts[AMM_ID],
+        deployer=accounts[USER_WALLET],
+        first=(accounts[COIN_MINT], accounts[POOL_COIN_VAULT], data['initCoinAmount']),
+        second=(accounts[PC_MINT], accounts[POOL_PC_VAULT], data['initPcAmount']),
+        lp_mint=accounts[LP_MINT],
+        open_time=data['openTime']
+    )
+
+def decode_cpmm_pool(transaction: GetTransactionResp, instruction: UiPartiallyDecodedInstruction) -> Optional[DecodedPool]:
+    """Decode a Raydium CPMM initialize instruction."""
+    raw = instruction_data(instruction)
+    if len(raw) < CPMM_INITIALIZE_LAYOUT.size or raw[:8] != CPMM_INITIALIZE:
+        return None
+    _, amount_0, amount_1, open_time = CPMM_INITIALIZE_LAYOUT.unpack_from(raw)
+    accounts = instruction.accounts
+    return build_pool(
+        transaction,
+        pair=accounts[3],
+        deployer=accounts[0],
+        first=(accounts[4], accounts[10], amount_0),
+        second=(accounts[5], accounts[11], amount_1),
+        lp_mint=accounts[6],
+        open_time=open_time
+    )
+
+def decode_clmm_pool(transaction: GetTransactionResp, instruction: UiPartiallyDecodedInstruction) -> Optional[DecodedPool]:
+    """Decode a Raydium CLMM create_pool instruction. Liquidity is added by separate position
+    instructions, so the reserves are zero unless those ran in the same transaction."""
+    raw = instruction_data(instruction)
+    if len(raw) < CLMM_CREATE_POOL_LAYOUT.size or raw[:8] != CLMM_CREATE_POOL:
+        return None
+    _, sqrt_price_x64, open_time = CLMM_CREATE_POOL_LAYOUT.unpack_from(raw)
+    accounts = instruction.accounts
+    return build_pool(
+        transaction,
+        pair=accounts[2],
+        deployer=accounts[0],
+        first=(accounts[3], accounts[5], 0),
+        second=(accounts[4], accounts[6], 0),
+        open_time=open_time,
+        raw_price=(int.from_bytes(sqrt_price_x64, 'little') / 2 ** 64) ** 2
+    )
+
+def decode_pumpswap_pool(transaction: GetTransactionResp, instruction: UiPartiallyDecodedInstruction) -> Optional[DecodedPool]:
+    """Decode a PumpSwap create_pool instruction, which pump.fun invokes when a bonding curve
+    completes. The deployer is the coin creator when the instruction carries it."""
+    raw = instruction_data(instruction)
+    if len(raw) < PUMPSWAP_CREATE_POOL_LAYOUT.size or raw[:8] != PUMPSWAP_CREATE_POOL:
+        return None
+    _, _, base_amount, quote_amount = PUMPSWAP_CREATE_POOL_LAYOUT.unpack_from(raw)
+    accounts = instruction.accounts
+    deployer = accounts[2]
+    end = PUMPSWAP_CREATE_POOL_LAYOUT.size + 32
+    if len(raw) >= end and any(raw[PUMPSWAP_CREATE_POOL_LAYOUT.size:end]):
+        deployer = Pubkey.from_bytes(raw[PUMPSWAP_CREATE_POOL_LAYOUT.size:end])
+    return build_pool(
+        transaction,
+        pair=accounts[0],
+        deployer=deployer,
+        first=(accounts[3], accounts[9], base_amount),
+        second=(accounts[4], accounts[10], quote_amount),
+        lp_mint=accounts[5]
+    )
+
+def decode_dlmm_pool(transaction: GetTransactionResp, instruction: UiPartiallyDecodedInstruction) -> Optional[DecodedPool]:
+    """Decode a Meteora DLMM initialize_lb_pair instruction, priced from its active bin."""
+    raw = instruction_data(instruction)
+    if len(raw) < DLMM_INITIALIZE_LB_PAIR_LAYOUT.size or raw[:8] != DLMM_INITIALIZE_LB_PAIR:
+        return None
+    _, active_id, bin_step = DLMM_INITIALIZE_LB_PAIR_LAYOUT.unpack_from(raw)
+    accounts = instruction.accounts
+    return build_pool(
+        transaction,
+        pair=accounts[0],
+        deployer=accounts[8],
+        first=(accounts[2], accounts[4], 0),
+        second=(accounts[3], accounts[5], 0),
+        raw_price=(1 + bin_step / 10_000) ** active_id
+    )
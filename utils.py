@@ -1,112 +1,124 @@
 import os
-import struct
-import base58
-from portalocker import Lock, unlock
-import csv
-import requests
+import asyncio
+from portalocker import Lock
 import re
+import time
+import json
+import logging
+from functools import lru_cache
 
-from solana.rpc.websocket_api import SolanaWsClientProtocol
-from solana.rpc.commitment import Commitment
+import httpx
+
+from clients import http_client
+import metrics
+from cache import TTLCache
+from metadata_parser import parse_metadata
+from log_config import console
+from ban_words import BanWordMatcher, DEFAULT_BAN_WORDS_FILE
 
 from solders.pubkey import Pubkey  # type: ignore
-from solders.signature import Signature  # type: ignore
-from solders.rpc.config import RpcTransactionLogsFilterMentions # type: ignore
-from solders.rpc.responses import SubscriptionResult # type: ignore
-from solders.rpc.config import RpcTransactionLogsFilterMentions # type: ignore
-from solders.rpc.responses import RpcLogsResponse, SubscriptionResult, LogsNotification, GetTransactionResp # type: ignore
+from solders.rpc.responses import GetTransactionResp # type: ignore
 from solders.transaction_status import UiPartiallyDecodedInstruction, ParsedInstruction # type: ignore
 
-from typing import AsyncIterator, List, Union
-from pip._vendor.typing_extensions import Iterator
+from typing import Iterator, List, Optional, Union
 
 METADATA_PROGRAM_ID = "metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bt518x1s"
-
-def lock_file(file_path: str):
+METADATA_PROGRAM_PUBKEY = Pubkey.from_string(METADATA_PROGRAM_ID)
+
+# Deployers relaunch the same token over and over, so metadata and off-chain JSON are cached
+metadata_cache = TTLCache(
+    maxsize=int(os.environ.get('METADATA_CACHE_SIZE', 10_000)),
+    ttl=float(os.environ.get('METADATA_CACHE_TTL', 3600)),
+    negative_ttl=float(os.environ.get('METADATA_NEGATIVE_TTL', 30))
+)
+uri_cache = TTLCache(
+    maxsize=int(os.environ.get('URI_CACHE_SIZE', 10_000)),
+    ttl=float(os.environ.get('METADATA_CACHE_TTL', 3600)),
+    negative_ttl=float(os.environ.get('METADATA_NEGATIVE_TTL', 30))
+)
+ban_word_matcher = BanWordMatcher(
+    path=os.environ.get('BAN_WORDS_FILE') or DEFAULT_BAN_WORDS_FILE,
+    homoglyphs=os.environ.get('BAN_WORDS_HOMOGLYPHS', 'true').lower() == 'true',
+    leet=os.environ.get('BAN_WORDS_LEET', 'false').lower() == 'true'
+)
+
+uri_fetch_timeout = float(os.environ.get('URI_FETCH_TIMEOUT', 5))
+uri_max_bytes = int(os.environ.get('URI_MAX_BYTES', 256 * 1024))
+
+def lock_file(file_path: str) -> Lock:
     lock_file_path = file_path + ".lock"
     lock = Lock(lock_file_path)
     lock.acquire()
+    return lock
 
-def unlock_file(file_path: str):
-    lock_file_path = file_path + ".lock"
-    with open(lock_file_path, "a") as lock_file:
-        unlock(lock_file)
-
-def contains_word_from_list(symbol: str):
-    ban_words = [
-        "Dog", "Wif", "Hat", "Rico", 'SOL', "Toshi"
-        "Trump", "Biden", "Putin", "SBF", "Cat", 'Pepe',
-        "Brett", "Normie", "Test", "Help", "Hope", "MAGA",
-        "Baby", "Shib", "Musk", "Elon", "Pink", "Ansem",
-        "Mew", "Boden", "WALLY", "Garfield", "Bonk", "boden",
-        "tremp", "Drake", "Meow", "May", "Grumpy", "Slurp"
-    ]
-    # Convert input_string to lowercase for case-insensitive comparison
-    input_string_lower = symbol.lower()
-    # Check if any word from the list is present in the input string
-    for word in ban_words:
-        if word.lower() in input_string_lower:
-            return True
-    return False
-
-def save_token_address(data: dict, file_path: str):
-    file_exists = os.path.isfile(file_path)
-
-    with open(file_path, 'a') as file:
-        writer = csv.DictWriter(file, fieldnames=data.keys())
-
-        if not file_exists:
-            writer.writeheader()
-
-        writer.writerow(data)
+def unlock_file(lock: Lock):
+    # Releasing the Lock that acquired it, a fresh handle on the lock file would not own the lock
+    lock.release()
 
+def contains_word_from_list(*texts: str):
+    # Checks every given text (name, symbol...) against the ban list in a single pass
+    return ban_word_matcher.match(*texts) is not None
+
+@lru_cache(maxsize=10_000)
 def get_metadata_account(mint_key: Pubkey):
     return Pubkey.find_program_address(
-        [b'metadata', bytes(Pubkey.from_string(METADATA_PROGRAM_ID)), bytes(mint_key)],
-        Pubkey.from_string(METADATA_PROGRAM_ID)
+        [b'metadata', bytes(METADATA_PROGRAM_PUBKEY), bytes(mint_key)],
+        METADATA_PROGRAM_PUBKEY
     )[0]
 
-def unpack_metadata_account(data, type_):
-    assert(data[0] == 4)
-
-    i = 1
-    source_account = base58.b58encode(bytes(struct.unpack('<' + "B"*32, data[i:i+32])))
-    i += 32
-    mint_account = base58.b58encode(bytes(struct.unpack('<' + "B"*32, data[i:i+32])))
-    i += 32
-    name_len = struct.unpack('<I', data[i:i+4])[0]
-    i += 4
-    name = struct.unpack('<' + "B"*name_len, data[i:i+name_len])
-    i += name_len
-    symbol_len = struct.unpack('<I', data[i:i+4])[0]
-    i += 4
-    symbol = struct.unpack('<' + "B"*symbol_len, data[i:i+symbol_len])
-    i += symbol_len
-    uri_len = struct.unpack('<I', data[i:i+4])[0]
-    i += 4
-    uri = struct.unpack('<' + "B"*uri_len, data[i:i+uri_len])
-    uri = bytes(uri).decode("utf-8").strip("\x00")
-
-    data_ = requests.get(uri).json()
+async def _read_capped(uri: str) -> Optional[bytes]:
+    async with http_client().stream('GET', uri, follow_redirects=True) as res:
+        if res.status_code != 200:
+            logging.warning(f'Metadata URI {uri} returned {res.status_code}')
+            return None
+        body = bytearray()
+        async for chunk in res.aiter_bytes():
+            body += chunk
+            if len(body) > uri_max_bytes:
+                logging.warning(f'Metadata URI {uri} is larger than {uri_max_bytes} bytes, ignoring it')
+                return None
+        return bytes(body)
+
+async def _download_uri_json(uri: str) -> Optional[dict]:
+    try:
+        with metrics.timer('api.metadata_uri'):
+            body = await asyncio.wait_for(_read_capped(uri), uri_fetch_timeout)
+        data = json.loads(body) if body is not None else None
+        return data if isinstance(data, dict) else None
+    except (asyncio.TimeoutError, httpx.HTTPError, ValueError) as e:
+        logging.warning(f'Failed to fetch metadata URI {uri}: {e!r}')
+        return None
+
+async def fetch_uri_json(uri: str) -> dict:
+    """Off-chain metadata JSON, or an empty dict if it can't be fetched within the time/size limits."""
+    if not uri:
+        return {}
+    return await uri_cache.get_or_fetch(uri, lambda: _download_uri_json(uri)) or {}
+
+async def unpack_metadata_account(data, type_):
+    return await _metadata_fields(parse_metadata(data), type_)
+
+async def _metadata_fields(parsed, type_):
+    data_ = await fetch_uri_json(parsed.uri)
 
     # links = extract_links(data_.get('description', None))
-    links = find_urls(data_.get('description', None))
+    links = find_urls(data_.get('description') or '')
 
     if type_ == 'raydium':
         metadata = {
-        "symbol": bytes(symbol).decode("utf-8").strip("\x00"),
-        "name": bytes(name).decode("utf-8").strip("\x00"),
+        "symbol": parsed.symbol,
+        "name": parsed.name,
         "isScam": "",
         "totalSupply": "",
-        "creatorAddress": source_account.decode('utf-8'),
+        "creatorAddress": str(parsed.update_authority),
         "website": data_.get('website', links['website']),
         "telegram": data_.get('telegram', links['telegram']),
         "twitter": data_.get('twitter', links['twitter'])
     }
     elif type_ == 'pump.fun':
         metadata = {
-        "symbol": bytes(symbol).decode("utf-8").strip("\x00"),
-        "name": bytes(name).decode("utf-8").strip("\x00"),
+        "symbol": parsed.symbol,
+        "name": parsed.name,
         "website": data_.get('website', links['website']),
         "telegram": data_.get('telegram', links['telegram']),
         "twitter": data_.get('twitter', links['twitter'])
@@ -116,17 +128,31 @@ def unpack_metadata_account(data, type_):
 
     return metadata
 
-def get_metadata(client, mint_key: Pubkey, type_):
+async def _fetch_onchain_metadata(client, mint_key: Pubkey):
     metadata_account = get_metadata_account(mint_key)
-    try:
-        data = client.get_account_info(metadata_account).value.data
-        # print(data)
-        # data = base64.b64decode(client.get_account_info(metadata_account).value.data)
-        metadata = unpack_metadata_account(data, type_)
-        return metadata
-    except AttributeError as e:
-        print('No metadata for', mint_key, ':', client.get_account_info(metadata_account))
+    account_info = await client.get_account_info(metadata_account)
+    if account_info.value is None:
+        logging.warning('No metadata for %s: %s', mint_key, account_info)
+        console('No metadata for', mint_key, ':', account_info)
         return None
+    # print(data)
+    # data = base64.b64decode(client.get_account_info(metadata_account).value.data)
+    return parse_metadata(account_info.value.data)
+
+async def get_onchain_metadata(client, mint_key: Pubkey):
+    """The parsed metadata account (name, symbol, uri...) without downloading its URI."""
+    return await metadata_cache.get_or_fetch((mint_key, 'onchain'), lambda: _fetch_onchain_metadata(client, mint_key))
+
+async def _fetch_metadata(client, mint_key: Pubkey, type_):
+    parsed = await get_onchain_metadata(client, mint_key)
+    if parsed is None:
+        return None
+    return await _metadata_fields(parsed, type_)
+
+async def get_metadata(client, mint_key: Pubkey, type_):
+    metadata = await metadata_cache.get_or_fetch((mint_key, type_), lambda: _fetch_metadata(client, mint_key, type_))
+    # Callers add their own fields to the result, keep the cached copy pristine
+    return dict(metadata) if metadata is not None else None
 
 def find_urls(string):
     links = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!.*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', string)
@@ -171,18 +197,19 @@ def extract_links(text):
 
     return extracted_links
 
-def get_pyth_solana_price():
-    res = requests.get('https://hermes.pyth.network/v2/updates/price/latest?ids%5B%5D=0xef0d8b6fda2ceba41da15d4095d1da392a0d2f8ed0c6c7bc0f4cfac8c280b56d')
+_sol_price = {'price': 0.0, 'updated': 0.0}
+
+async def get_pyth_solana_price(max_age: float = 30.0):
+    # Every pool needs SOL/USD to value its reserves, a recent quote is good enough
+    if time.monotonic() - _sol_price['updated'] < max_age:
+        return _sol_price['price']
+    with metrics.timer('api.pyth'):
+        res = await http_client().get('https://hermes.pyth.network/v2/updates/price/latest?ids%5B%5D=0xef0d8b6fda2ceba41da15d4095d1da392a0d2f8ed0c6c7bc0f4cfac8c280b56d')
     data = res.json()['parsed'][0]['price']['price']
     price = int(data) / 10_000_0000
+    _sol_price.update(price=price, updated=time.monotonic())
     return price
 
-def get_msg_value(msg: List[LogsNotification]) -> RpcLogsResponse:
-    return msg[0].result.value
-
-def get_subscription_id(response: SubscriptionResult) -> int:
-    return response[0].result
-
 def get_instructions(
         transaction: GetTransactionResp
 ) -> List[Union[UiPartiallyDecodedInstruction, ParsedInstruction]]:
@@ -199,23 +226,3 @@ def instructions_with_program_id(
 ) -> Iterator[Union[UiPartiallyDecodedInstruction, ParsedInstruction]]:
     return (instruction for instruction in instructions
             if instruction.program_id == program_id)
-
-async def subscribe_to_logs(websocket: SolanaWsClientProtocol,
-                            mentions: RpcTransactionLogsFilterMentions,
-                            commitment: Commitment) -> int:
-    await websocket.logs_subscribe(
-        filter_=mentions,
-        commitment=commitment
-    )
-    first_resp = await websocket.recv()
-    return get_subscription_id(first_resp)  # type: ignore
-
-async def process_messages(websocket: SolanaWsClientProtocol,
-                           instruction: str) -> AsyncIterator[Signature]:
-    """Async generator, main websocket's loop"""
-    async for msg in websocket:
-        value = get_msg_value(msg)
-        for log in value.logs:
-            if instruction not in log:
-                continue
-            yield value.signature
\ No newline at end of file